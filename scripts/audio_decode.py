@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Audio Decode - Fast decoding, mono downmix and resampling to an analysis rate
+Decodes through libsndfile wherever it can read the file (WAV, FLAC, OGG,
+MP3), downmixes block by block without materializing the multichannel
+signal, and optionally resamples to a lower analysis rate with a
+selectable resampler quality
+"""
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+# Resampler quality names -> librosa res_type
+RESAMPLERS = {
+    "vhq": "soxr_vhq",
+    "hq": "soxr_hq",
+    "mq": "soxr_mq",
+    "lq": "soxr_lq",
+    "polyphase": "polyphase",
+}
+DEFAULT_RESAMPLER = "hq"
+
+DECODERS = ("auto", "soundfile", "audioread")
+
+# Frames decoded per read when downmixing
+BLOCK_FRAMES = 1 << 18
+
+def block_reads_exact(audio_file):
+    """
+    Whether libsndfile decodes this open SoundFile identically when it is
+    read in blocks or after a seek
+
+    Its MPEG decoder does not: samples around every block boundary or seek
+    target come out damaged, so MP3s must be decoded in a single read.
+    """
+    return not audio_file.subtype.startswith("MPEG")
+
+def read_mono(audio_path):
+    """
+    Decode a file with libsndfile and downmix it to mono float32
+
+    Channels are averaged one block at a time straight into the output
+    array, so peak memory is the mono signal plus one block (formats that
+    cannot be read in blocks exactly are decoded in one read first).
+
+    Returns:
+        tuple: (y, native sample rate)
+    """
+    with sf.SoundFile(audio_path) as audio_file:
+        n_frames = audio_file.frames
+        if audio_file.channels == 1:
+            return audio_file.read(dtype='float32'), audio_file.samplerate
+        if not block_reads_exact(audio_file):
+            return audio_file.read(dtype='float32').mean(axis=1), audio_file.samplerate
+        y = np.empty(n_frames, dtype=np.float32)
+        block = np.empty((min(BLOCK_FRAMES, n_frames), audio_file.channels), dtype=np.float32)
+        position = 0
+        while position < n_frames:
+            data = audio_file.read(out=block)
+            if len(data) == 0:
+                break
+            np.mean(data, axis=1, out=y[position:position + len(data)])
+            position += len(data)
+        return y[:position], audio_file.samplerate
+
+def read_mono_audioread(audio_path):
+    """
+    Decode a file through audioread (ffmpeg, GStreamer or Core Audio) and
+    downmix it to mono float32
+
+    Returns:
+        tuple: (y, native sample rate)
+    """
+    import audioread
+    with audioread.audio_open(str(audio_path)) as audio_file:
+        native_sr, channels = audio_file.samplerate, audio_file.channels
+        y = np.concatenate([librosa.util.buf_to_float(buf, dtype=np.float32) for buf in audio_file] or [np.empty(0, np.float32)])
+    if channels > 1:
+        y = y.reshape(-1, channels).mean(axis=1)
+    return y, native_sr
+
+def decode_audio(audio_path, sr=None, resampler=DEFAULT_RESAMPLER, decoder="auto"):
+    """
+    Decode an audio file to a mono float32 signal at the analysis rate
+
+    With sr=None and the default decoder the samples are identical to
+    librosa.load(audio_path, sr=None).
+
+    Args:
+        audio_path: Path to audio file
+        sr: Analysis sample rate in Hz, or None for the file's native rate
+        resampler: Resampler quality, one of RESAMPLERS
+        decoder: "soundfile" (libsndfile), "audioread" (the generic path
+            librosa falls back to, e.g. for AAC/M4A), or "auto" to try them
+            in that order
+
+    Returns:
+        tuple: (y, sr)
+    """
+    if decoder not in DECODERS:
+        raise ValueError(f"Unknown decoder '{decoder}', expected one of {DECODERS}")
+    if resampler not in RESAMPLERS:
+        raise ValueError(f"Unknown resampler '{resampler}', expected one of {tuple(RESAMPLERS)}")
+
+    y = None
+    if decoder in ("auto", "soundfile"):
+        try:
+            y, native_sr = read_mono(audio_path)
+        except sf.SoundFileRuntimeError:
+            if decoder == "soundfile":
+                raise
+    if y is None:
+        y, native_sr = read_mono_audioread(audio_path)
+
+    if sr is None or sr == native_sr:
+        return y, native_sr
+    return librosa.resample(y, orig_sr=native_sr, target_sr=sr, res_type=RESAMPLERS[resampler]), sr
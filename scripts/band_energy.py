@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Band Energy - Energy timelines of named frequency bands from one spectrogram
+Resolves a table of frequency bands to STFT bin ranges once and turns them
+into a band-averaging matrix, so every band's per-frame mean magnitude
+comes out of a single matrix product over the spectrogram
+"""
+
+import argparse
+from functools import lru_cache
+
+import librosa
+import numpy as np
+
+# Frequency bands in Hz (low, high), both edges inclusive: the phonetic
+# bands, then the rhythm section bands of the skill doc and
+# references/frequency_ranges.md
+BANDS = {
+    "sibilant": (4000, 10000),     # s, sh, z, ch
+    "fricative": (2000, 6000),     # f, v, th, h
+    "nasal": (200, 1500),          # m, n, l, r
+    "sub_bass": (20, 60),
+    "kick": (60, 100),
+    "bass": (100, 250),
+    "snare_body": (150, 250),
+    "snare_crack": (2000, 6000),
+    "hi_hat": (6000, 20000),
+    "floor_tom": (80, 120),
+    "mid_tom": (120, 200),
+    "high_tom": (200, 400)
+}
+
+BAND_NAMES = tuple(BANDS)
+
+@lru_cache(maxsize=None)
+def _band_bins(sr, n_fft, bands):
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+    low, high = np.array([band for _, band in bands], dtype=np.float64).T
+    return np.searchsorted(freqs, low, side="left"), np.searchsorted(freqs, high, side="right")
+
+def band_bins(sr, n_fft, bands=BANDS):
+    """
+    STFT bin ranges of a band table
+
+    Bins whose center frequency lies within a band, edges included, form
+    the half-open range [start, stop); a band above the Nyquist frequency
+    gets an empty range. Resolved once per sample rate, FFT size and table.
+
+    Returns:
+        tuple: (starts, stops) arrays in the order of bands
+    """
+    return _band_bins(int(sr), int(n_fft), tuple(bands.items()))
+
+@lru_cache(maxsize=None)
+def _band_weights(sr, n_fft, bands):
+    starts, stops = _band_bins(sr, n_fft, bands)
+    weights = np.zeros((len(starts), 1 + n_fft // 2), dtype=np.float32)
+    for row, (start, stop) in enumerate(zip(starts, stops)):
+        weights[row, start:stop] = 1 / max(stop - start, 1)
+    return weights
+
+def band_weights(sr, n_fft, bands=BANDS):
+    """
+    (bands, bins) matrix whose rows average each band's bin range
+
+    Built once per sample rate, FFT size and table.
+    """
+    return _band_weights(int(sr), int(n_fft), tuple(bands.items()))
+
+def band_energies(magnitude, sr, n_fft, bands=BANDS):
+    """
+    Per-frame mean magnitude of every band
+
+    One matrix product with band_weights reads the spectrogram once for
+    all bands, instead of a masked copy and a mean per band. Bands with no
+    bins below the Nyquist frequency are all zero.
+
+    Args:
+        magnitude: (bins, frames) STFT magnitude
+        sr, n_fft: Sample rate and FFT size the spectrogram was computed with
+        bands: Band name -> (low_hz, high_hz)
+
+    Returns:
+        np.ndarray: (len(bands), frames) float32, rows in the order of bands
+    """
+    return band_weights(sr, n_fft, bands) @ np.asarray(magnitude, dtype=np.float32)
+
+def parse_band(text):
+    """argparse type for name=low-high bands, e.g. kick=60-100"""
+    try:
+        name, edges = text.split("=", 1)
+        low, high = (float(edge) for edge in edges.split("-", 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected name=low-high in Hz, got '{text}'")
+    if not 0 <= low < high:
+        raise argparse.ArgumentTypeError(f"band '{name}' needs 0 <= low < high")
+    return name, (low, high)
+
+if __name__ == "__main__":
+    from feature_options import add_feature_arguments, feature_store_from_args
+    from frame_export import EXPORT_FORMATS, frame_columns, write_frames
+
+    parser = argparse.ArgumentParser(description="Per-frame energy of frequency bands (default: "
+                                                 + ", ".join(BAND_NAMES) + ")")
+    parser.add_argument("audio_file")
+    parser.add_argument("output", nargs="?", default="band_energy", help="output path without extension")
+    parser.add_argument("--band", type=parse_band, action="append", default=[],
+                        help="custom band name=low-high in Hz, e.g. vocal_presence=2000-5000 (repeatable; "
+                             "replaces the default table)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="npz")
+    add_feature_arguments(parser)
+    args = parser.parse_args()
+
+    bands = dict(args.band) or BANDS
+    features = feature_store_from_args(args.audio_file, args, ("band_energies",) if bands is BANDS else ("magnitude",))
+    if bands is BANDS:
+        energies = features.band_energies
+    elif args.stream:
+        parser.error("custom bands need the full spectrogram and cannot be combined with --stream")
+    else:
+        energies = band_energies(features.magnitude, features.sr, features.n_fft, bands)
+    times = librosa.frames_to_time(np.arange(energies.shape[1]), sr=features.sr, hop_length=features.hop_length)
+    write_frames(args.output, frame_columns(times, **dict(zip(bands, energies))), args.format)
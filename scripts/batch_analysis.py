@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Batch Analysis - Analyze a whole catalog of tracks across a process pool
+Scans directories and file lists for audio, runs one analysis per track in
+parallel worker processes, isolates per-track failures and records progress
+in a manifest so an interrupted run resumes where it stopped
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import contextlib
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from workers import WORKER_ENVIRONMENT, default_workers
+
+AUDIO_EXTENSIONS = {".wav", ".flac", ".mp3", ".ogg", ".m4a", ".aiff", ".aif", ".aac", ".opus"}
+
+MANIFEST_NAME = "manifest.jsonl"
+
+# Module and entry point of each single analyzer
+ANALYZERS = {
+    "spectral": ("spectral_analysis", "analyze_audio"),
+    "emotional": ("emotional_cadence", "analyze_emotional_cadence"),
+    "phonetic": ("phonetic_analysis", "analyze_phonetic_patterns"),
+    "drums": ("drum_onsets", "analyze_drum_onsets"),
+    "tempo": ("tempo_stability", "analyze_tempo_stability"),
+}
+
+def find_tracks(sources):
+    """
+    Collect audio files from directories (searched recursively), text files
+    listing one path per line, and individual audio files
+
+    Returns:
+        list: Unique absolute paths in a stable order
+    """
+    tracks = []
+    for source in sources:
+        source = Path(source)
+        if source.is_dir():
+            tracks += sorted(p for p in source.rglob("*") if p.suffix.lower() in AUDIO_EXTENSIONS and p.is_file())
+        elif source.suffix.lower() in AUDIO_EXTENSIONS:
+            tracks.append(source)
+        else:
+            with open(source) as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        tracks.append(source.parent / line if not Path(line).is_absolute() else Path(line))
+
+    seen = set()
+    unique = []
+    for track in tracks:
+        track = str(track.resolve())
+        if track not in seen:
+            seen.add(track)
+            unique.append(track)
+    return unique
+
+def track_id(audio_path):
+    """Output directory name for a track: its stem plus a short hash of its path"""
+    digest = hashlib.blake2b(audio_path.encode(), digest_size=4).hexdigest()
+    return f"{Path(audio_path).stem}-{digest}"
+
+def load_manifest(manifest_path):
+    """
+    Latest manifest entry per track
+
+    The manifest is append-only JSON lines, so a run killed mid-write leaves
+    at most one truncated last line, which is ignored.
+    """
+    entries = {}
+    if Path(manifest_path).exists():
+        with open(manifest_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                entries[entry["path"]] = entry
+    return entries
+
+def analyze_track(audio_path, track_dir, analysis="comprehensive", cache_dir=None, stream=False,
+                  analysis_sr=None, resampler="hq", decoder="auto", pitch_method=None, quality="standard",
+                  segment_workers=1, plot=True, decimate=False, export=None):
+    """
+    Run one analysis on one track inside a worker process
+
+    The analyzers' console output goes to log.txt in the track directory.
+    Exceptions are caught and reported so one bad file never stops the batch.
+    The remaining options are those of comprehensive_analysis.
+
+    Returns:
+        dict: Manifest entry for the track
+    """
+    start = time.perf_counter()
+    track_dir = Path(track_dir)
+    track_dir.mkdir(parents=True, exist_ok=True)
+    entry = {"path": audio_path, "output": str(track_dir)}
+
+    with open(track_dir / "log.txt", "w") as log, contextlib.redirect_stdout(log):
+        try:
+            if analysis == "comprehensive":
+                from comphrehensive_analysis import comprehensive_analysis
+                summary = comprehensive_analysis(audio_path, str(track_dir), cache_dir=cache_dir, stream=stream,
+                                                 plot=plot, decimate=decimate, export=export,
+                                                 analysis_sr=analysis_sr, resampler=resampler, decoder=decoder,
+                                                 pitch_method=pitch_method, quality=quality,
+                                                 segment_workers=segment_workers)
+                if "errors" in summary:
+                    raise RuntimeError("; ".join(f"{name}: {error}" for name, error in summary["errors"].items()))
+            else:
+                import importlib
+                from feature_options import build_feature_store
+                module_name, function_name = ANALYZERS[analysis]
+                module = importlib.import_module(module_name)
+                features = build_feature_store(audio_path, cache_dir, stream, analysis_sr, resampler, decoder,
+                                               wanted=module.FEATURES, pitch_method=pitch_method, quality=quality,
+                                               segment_workers=segment_workers)
+                if stream and analysis == "spectral":
+                    plot = False  # The spectrogram figure needs the whole spectrogram
+                getattr(module, function_name)(audio_path, str(track_dir), features=features,
+                                               plot=plot, decimate=decimate, export=export)
+            entry["status"] = "done"
+        except Exception as e:
+            print(f"Analysis failed: {e!r}")
+            entry["status"] = "failed"
+            entry["error"] = f"{type(e).__name__}: {e}"
+
+    entry["seconds"] = round(time.perf_counter() - start, 3)
+    return entry
+
+def batch_analysis(sources, output_dir="batch_analysis", analysis="comprehensive", workers=None,
+                   retry_failed=False, **options):
+    """
+    Analyze every track found in sources across a pool of worker processes
+
+    Each finished track is appended to manifest.jsonl in output_dir as soon
+    as it completes. Tracks already marked done are skipped when the batch
+    is run again, so an interrupted run picks up where it stopped; failed
+    tracks are skipped too unless retry_failed is set. When a worker dies
+    outright (e.g. killed for running out of memory) the pool is restarted
+    and the tracks that were in flight are re-run one at a time, so only
+    the track that brings a worker down is marked failed.
+
+    Args:
+        sources: Directories, list files and/or audio files
+        output_dir: Directory for the manifest and one subdirectory per track
+        analysis: "comprehensive" or one of the single analyzers
+        workers: Worker processes (default: available cores)
+        retry_failed: Re-run tracks that failed in a previous run
+        options: Per-track options passed to analyze_track: cache_dir (a
+            FeatureCache directory shared by all workers), stream,
+            analysis_sr, resampler, decoder, pitch_method, quality,
+            segment_workers (processes per track, on top of the batch's own),
+            plot, decimate and export
+
+    Returns:
+        dict: Counts of done, failed and skipped tracks plus wall time
+    """
+    if analysis != "comprehensive" and analysis not in ANALYZERS:
+        raise ValueError(f"Unknown analysis '{analysis}'")
+    if options.get("cache_dir") and options.get("stream"):
+        raise ValueError("cache_dir and stream cannot be combined")
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_path / MANIFEST_NAME
+
+    # 1. WORK LIST
+    tracks = find_tracks(sources)
+    previous = load_manifest(manifest_path)
+    finished = {"done"} if retry_failed else {"done", "failed"}
+    todo = [t for t in tracks if previous.get(t, {}).get("status") not in finished]
+
+    workers = workers or default_workers()
+    print(f"Found {len(tracks)} tracks, {len(tracks) - len(todo)} already in manifest, "
+          f"{len(todo)} to analyze with {workers} workers")
+
+    # 2. PROCESS POOL
+    for name, value in WORKER_ENVIRONMENT.items():
+        os.environ.setdefault(name, value)
+
+    counts = {"done": 0, "failed": 0, "skipped": len(tracks) - len(todo)}
+    start = time.perf_counter()
+    queue = list(reversed(todo))
+
+    with open(manifest_path, "a") as manifest:
+        def record(entry):
+            manifest.write(json.dumps(entry) + "\n")
+            manifest.flush()
+            counts[entry["status"]] += 1
+            finished_count = counts["done"] + counts["failed"]
+            status = "✓" if entry["status"] == "done" else "✗"
+            print(f"[{finished_count}/{len(todo)}] {status} {entry['path']} ({entry['seconds']:.1f}s)")
+
+        # Tracks that were in flight when a worker process died; each is
+        # re-run on its own so a crash is only ever blamed on its cause
+        suspects = []
+
+        while queue or suspects:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                running = {}
+                try:
+                    while queue or suspects or running:
+                        if suspects:
+                            pending = [] if running else [suspects.pop()]
+                        else:
+                            # Keep a bounded number of tracks in flight so huge
+                            # catalogs do not create one future per file up front
+                            pending = [queue.pop() for _ in range(min(len(queue), 2 * workers - len(running)))]
+                        for audio_path in pending:
+                            track_dir = output_path / track_id(audio_path)
+                            future = pool.submit(analyze_track, audio_path, str(track_dir), analysis, **options)
+                            running[future] = (audio_path, track_dir)
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            record(future.result())
+                            del running[future]
+                except BrokenProcessPool as e:
+                    unfinished = []
+                    for future, (audio_path, track_dir) in running.items():
+                        if future.done() and future.exception() is None:
+                            record(future.result())
+                        else:
+                            unfinished.append((audio_path, track_dir))
+                    if len(unfinished) == 1:
+                        audio_path, track_dir = unfinished[0]
+                        record({"path": audio_path, "output": str(track_dir), "status": "failed",
+                                "error": f"worker process died: {e}", "seconds": 0.0})
+                    else:
+                        suspects += [audio_path for audio_path, track_dir in unfinished]
+
+    counts["seconds"] = round(time.perf_counter() - start, 3)
+    analyzed = counts["done"] + counts["failed"]
+    rate = analyzed / counts["seconds"] if counts["seconds"] else 0.0
+    print(f"\nBatch complete: {counts['done']} done, {counts['failed']} failed, "
+          f"{counts['skipped']} skipped in {counts['seconds']:.1f}s ({rate:.2f} tracks/s)")
+    print(f"Manifest: {manifest_path}")
+
+    return counts
+
+if __name__ == "__main__":
+    from feature_options import add_feature_arguments
+    from plot_rendering import add_plot_arguments
+    from frame_export import add_export_arguments
+
+    parser = argparse.ArgumentParser(description="Analyze a catalog of tracks in parallel with a resumable manifest")
+    parser.add_argument("sources", nargs="+", help="audio directories, text files listing tracks, or audio files")
+    parser.add_argument("-o", "--output-dir", default="batch_analysis")
+    parser.add_argument("--analysis", default="comprehensive", choices=["comprehensive", *ANALYZERS])
+    parser.add_argument("-j", "--workers", type=int, help="worker processes (default: available cores)")
+    parser.add_argument("--retry-failed", action="store_true", help="re-run tracks that failed in a previous run")
+    add_feature_arguments(parser)
+    add_plot_arguments(parser)
+    add_export_arguments(parser)
+    args = parser.parse_args()
+
+    counts = batch_analysis(args.sources, args.output_dir, args.analysis, args.workers,
+                            retry_failed=args.retry_failed, cache_dir=args.cache_dir, stream=args.stream,
+                            analysis_sr=args.analysis_sr, resampler=args.resampler, decoder=args.decoder,
+                            pitch_method=args.pitch_method, quality=args.quality,
+                            segment_workers=args.segment_workers, plot=args.plots, decimate=args.decimate_plots, export=args.export_frames)
+    sys.exit(1 if counts["failed"] else 0)
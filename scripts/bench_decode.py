@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Decode Settings Benchmark - Speed and feature drift of each analysis rate
+Runs the three analyzers on a track at its native rate and at each
+requested analysis rate and resampler quality, and reports how much time
+each setting saves and how far every report metric drifts from the native
+result
+"""
+
+import os
+import json
+import time
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+
+import numpy as np
+
+from audio_decode import RESAMPLERS
+from feature_store import FeatureStore
+from spectral_analysis import analyze_audio
+from emotional_cadence import analyze_emotional_cadence
+from phonetic_analysis import analyze_phonetic_patterns
+
+# Report fields that change with the analysis rate by definition
+IGNORED_METRICS = {"spectral.sample_rate"}
+
+def report_metrics(report, prefix=""):
+    """
+    Flatten a report to {dotted.path: number}
+
+    Lists of events contribute their length rather than their contents,
+    since event times cannot be paired up reliably across settings.
+    """
+    metrics = {}
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(report_metrics(value, path + "."))
+        elif isinstance(value, list):
+            metrics[path + ".count"] = float(len(value))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and path not in IGNORED_METRICS:
+            metrics[path] = float(value)
+    return metrics
+
+def run_setting(audio_path, analysis_sr=None, resampler="hq"):
+    """
+    Analyze a track with one decode setting
+
+    Returns:
+        tuple: (decode seconds, total seconds, flattened metrics)
+    """
+    features = FeatureStore(audio_path, analysis_sr=analysis_sr, resampler=resampler)
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        features.get("audio")
+        decode_seconds = time.perf_counter() - start
+        reports = {
+            "spectral": analyze_audio(audio_path, f"{output_dir}/s", features=features, plot=False),
+            "emotional": analyze_emotional_cadence(audio_path, f"{output_dir}/e", features=features, plot=False),
+            "phonetic": analyze_phonetic_patterns(audio_path, f"{output_dir}/p", features=features, plot=False),
+        }
+        total_seconds = time.perf_counter() - start
+    for report in reports.values():
+        # Stage timings and memory are not accuracy metrics
+        for field in ("file", "output_files", "profile"):
+            report.pop(field, None)
+    return decode_seconds, total_seconds, report_metrics(reports)
+
+def metric_drift(reference, metrics):
+    """Relative difference of every metric from the reference run"""
+    drift = {}
+    for path, value in reference.items():
+        if path in metrics:
+            drift[path] = abs(metrics[path] - value) / max(abs(value), 1e-9)
+    return drift
+
+def benchmark_decode(audio_path, rates=(22050, 16000), resamplers=("hq", "lq")):
+    """
+    Compare decode settings on one track against the native-rate analysis
+
+    Returns:
+        list: One dict per setting with timings, speedup and drift statistics
+    """
+    settings = [(None, None)] + [(rate, resampler) for rate in rates for resampler in resamplers]
+    rows = []
+    reference = None
+    # The first run pays for JIT compilation and cold caches, so time a
+    # second native run as the reference
+    for analysis_sr, resampler in [(None, None)] + settings:
+        # Keep the analyzers' progress output off the table
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            decode_seconds, total_seconds, metrics = run_setting(audio_path, analysis_sr, resampler or "hq")
+        if reference is None:
+            reference = metrics
+            continue
+        if analysis_sr is None:
+            reference_seconds = total_seconds
+        drift = metric_drift(reference, metrics)
+        worst = max(drift, key=drift.get)
+        rows.append({
+            "analysis_sr": analysis_sr or "native",
+            "resampler": resampler or "-",
+            "decode_seconds": round(decode_seconds, 3),
+            "total_seconds": round(total_seconds, 3),
+            "speedup": round(reference_seconds / total_seconds, 2),
+            "median_drift": float(np.median(list(drift.values()))),
+            "max_drift": drift[worst],
+            "max_drift_metric": worst
+        })
+    return rows
+
+def print_table(rows):
+    """Print benchmark rows as an aligned table"""
+    print(f"{'rate':>8} {'resampler':>10} {'decode (s)':>11} {'total (s)':>10} {'speedup':>8} "
+          f"{'median drift':>13} {'max drift':>10}  worst metric")
+    for row in rows:
+        print(f"{row['analysis_sr']:>8} {row['resampler']:>10} {row['decode_seconds']:>11.3f} {row['total_seconds']:>10.3f} "
+              f"{row['speedup']:>7.2f}x {row['median_drift']:>12.2%} {row['max_drift']:>9.2%}  {row['max_drift_metric']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Speed and feature drift of analysis sample rates and resampler qualities")
+    parser.add_argument("audio_file")
+    parser.add_argument("--rates", type=int, nargs="+", default=[22050, 16000], help="analysis rates to compare with the native rate")
+    parser.add_argument("--resamplers", nargs="+", choices=tuple(RESAMPLERS), default=["hq", "lq"])
+    parser.add_argument("--json", help="also write the table to this JSON file")
+    args = parser.parse_args()
+
+    rows = benchmark_decode(args.audio_file, args.rates, args.resamplers)
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
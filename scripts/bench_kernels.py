@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Kernel Microbenchmark - Per-frame Python loops vs. vectorized array kernels
+Times the original loop implementations of the pitch, tension and phonetic
+timeline steps against the array kernels that replaced them, on synthetic
+frame data sized like 10- and 60-minute tracks, and checks that both
+produce the same outputs
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from feature_store import HOP_LENGTH, N_FFT
+from spectral_analysis import mean_voiced_pitch
+from emotional_cadence import chroma_tension, tension_transitions
+from phonetic_analysis import phonetic_timeline
+
+def dominant_pitch(pitches, magnitudes_pitch):
+    """
+    Per-frame pitch of the strongest piptrack candidate (0 where none was found)
+
+    The vectorized kernel the store used until pitch_track.peak_pitch, which
+    finds the same pitch without piptrack's full matrices, replaced it
+    """
+    index = magnitudes_pitch.argmax(axis=0)
+    pitch = pitches[index, np.arange(pitches.shape[1])]
+    return np.where(pitch > 0, pitch, 0)
+
+# Reference implementations: the per-frame loops the kernels replaced
+
+def loop_dominant_pitch(pitches, magnitudes_pitch):
+    pitch_timeline = []
+    for t in range(pitches.shape[1]):
+        index = magnitudes_pitch[:, t].argmax()
+        pitch = pitches[index, t]
+        pitch_timeline.append(pitch if pitch > 0 else 0)
+    return np.array(pitch_timeline)
+
+def loop_mean_voiced_pitch(pitch_timeline):
+    return float(np.mean([p for p in pitch_timeline if p > 0] or [0]))
+
+def loop_chroma_tension(chroma):
+    tension_timeline = []
+    for frame in range(chroma.shape[1]):
+        variance = np.var(chroma[:, frame])
+        spread = np.std(chroma[:, frame])
+        tension_timeline.append(variance * spread)
+    return np.array(tension_timeline)
+
+def loop_tension_transitions(tension_normalized, tension_times):
+    tension_drops = []
+    for i in range(1, len(tension_normalized)):
+        if tension_normalized[i-1] - tension_normalized[i] > 0.15:
+            tension_drops.append({
+                "time": float(tension_times[i]),
+                "magnitude": float(tension_normalized[i-1] - tension_normalized[i])
+            })
+    tension_rises = []
+    for i in range(1, len(tension_normalized)):
+        if tension_normalized[i] - tension_normalized[i-1] > 0.15:
+            tension_rises.append({
+                "time": float(tension_times[i]),
+                "magnitude": float(tension_normalized[i] - tension_normalized[i-1])
+            })
+    return tension_drops[:10], tension_rises[:10]
+
+def loop_phonetic_timeline(times, sibilance, fricative, nasal_liquid):
+    timeline = []
+    for i, t in enumerate(times):
+        if i < len(fricative) and i < len(nasal_liquid):
+            timeline.append({
+                "time": float(t),
+                "sibilance": float(sibilance[i]),
+                "fricative": float(fricative[i]),
+                "nasal_liquid": float(nasal_liquid[i])
+            })
+    return timeline
+
+def rows_from_columns(columns):
+    """Convert phonetic timeline columns back to the old list-of-dicts form"""
+    names = list(columns)
+    return [
+        {name: float(columns[name][i]) for name in names}
+        for i in range(len(columns["time"]))
+    ]
+
+def synthetic_frames(minutes, sr, rng):
+    """Frame-level inputs shaped like the real features of a track of this length"""
+    n_frames = 1 + int(minutes * 60 * sr) // HOP_LENGTH
+    n_bins = 1 + N_FFT // 2
+
+    # piptrack output is sparse: a handful of pitch candidates per frame
+    magnitudes_pitch = np.zeros((n_bins, n_frames), dtype=np.float32)
+    pitches = np.zeros((n_bins, n_frames), dtype=np.float32)
+    for _ in range(4):
+        rows = rng.integers(5, 200, n_frames)
+        cols = np.arange(n_frames)
+        magnitudes_pitch[rows, cols] = rng.random(n_frames, dtype=np.float32)
+        pitches[rows, cols] = rows * sr / N_FFT
+    silent = rng.random(n_frames) < 0.1
+    magnitudes_pitch[:, silent] = 0
+    pitches[:, silent] = 0
+
+    chroma = rng.random((12, n_frames), dtype=np.float32)
+    tension = rng.random(n_frames, dtype=np.float32)
+    times = np.arange(n_frames) * HOP_LENGTH / sr
+    bands = [rng.random(n_frames, dtype=np.float32) for _ in range(3)]
+
+    return {
+        "n_frames": n_frames,
+        "pitches": pitches,
+        "magnitudes_pitch": magnitudes_pitch,
+        "chroma": chroma,
+        "tension": tension,
+        "times": times,
+        "bands": bands
+    }
+
+def best_time(fn, repeat):
+    """Best wall time of repeat calls, and the result of the last call"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def run_benchmark(minutes_list=(10, 60), sr=22050, repeat=3, seed=0):
+    """
+    Benchmark every kernel against its loop at each track length
+
+    Returns:
+        list: One dict per (kernel, minutes) with loop and kernel timings
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+
+    for minutes in minutes_list:
+        data = synthetic_frames(minutes, sr, rng)
+        pitch_timeline = dominant_pitch(data["pitches"], data["magnitudes_pitch"])
+
+        cases = [
+            ("dominant_pitch",
+             lambda: loop_dominant_pitch(data["pitches"], data["magnitudes_pitch"]),
+             lambda: dominant_pitch(data["pitches"], data["magnitudes_pitch"]),
+             np.array_equal),
+            ("mean_voiced_pitch",
+             lambda: loop_mean_voiced_pitch(pitch_timeline),
+             lambda: mean_voiced_pitch(pitch_timeline),
+             lambda a, b: a == b),
+            # Column-wise float32 reductions sum in a different order than
+            # per-frame ones, so tension agrees to float32 rounding only
+            ("chroma_tension",
+             lambda: loop_chroma_tension(data["chroma"]),
+             lambda: chroma_tension(data["chroma"]),
+             lambda a, b: np.allclose(a, b, rtol=1e-6, atol=0)),
+            ("tension_transitions",
+             lambda: loop_tension_transitions(data["tension"], data["times"]),
+             lambda: tension_transitions(data["tension"], data["times"]),
+             lambda a, b: a == b),
+            ("phonetic_timeline",
+             lambda: loop_phonetic_timeline(data["times"], *data["bands"]),
+             lambda: phonetic_timeline(data["times"], *data["bands"]),
+             lambda a, b: a == rows_from_columns(b)),
+        ]
+
+        for name, loop_fn, kernel_fn, same in cases:
+            loop_time, loop_result = best_time(loop_fn, repeat)
+            kernel_time, kernel_result = best_time(kernel_fn, repeat)
+            rows.append({
+                "kernel": name,
+                "minutes": minutes,
+                "frames": data["n_frames"],
+                "loop_seconds": loop_time,
+                "kernel_seconds": kernel_time,
+                "speedup": loop_time / max(kernel_time, 1e-9),
+                "matches": bool(same(loop_result, kernel_result))
+            })
+        del data
+
+    return rows
+
+def print_table(rows):
+    """Print benchmark rows as an aligned table"""
+    print(f"{'kernel':<22}{'minutes':>8}{'frames':>10}{'loop (s)':>12}{'kernel (s)':>12}{'speedup':>10}  matches")
+    for row in rows:
+        print(f"{row['kernel']:<22}{row['minutes']:>8g}{row['frames']:>10}"
+              f"{row['loop_seconds']:>12.4f}{row['kernel_seconds']:>12.5f}{row['speedup']:>9.0f}x  {row['matches']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmark of the vectorized per-frame kernels")
+    parser.add_argument("--minutes", type=float, nargs="+", default=[10, 60], help="track lengths to simulate")
+    parser.add_argument("--sr", type=int, default=22050, help="sample rate used to size the frame arrays")
+    parser.add_argument("--repeat", type=int, default=3, help="timing repetitions (best is reported)")
+    args = parser.parse_args()
+
+    print_table(run_benchmark(args.minutes, args.sr, args.repeat))
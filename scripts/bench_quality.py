@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Quality Tier Benchmark - Speed and metric drift of each analysis quality tier
+Runs the three analyzers on the synthetic reference fixtures (and any given
+tracks) under every feature_options.QUALITY_TIERS tier, and reports how much
+time each tier saves against standard and how far every report metric moves
+from the standard result
+"""
+
+import os
+import json
+import time
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+
+import numpy as np
+
+from bench_decode import report_metrics, metric_drift
+from bench_suite import FIXTURE_KINDS, ensure_fixture, parse_duration
+from feature_options import QUALITY_TIERS, build_feature_store
+from spectral_analysis import analyze_audio
+from emotional_cadence import analyze_emotional_cadence
+from phonetic_analysis import analyze_phonetic_patterns
+
+REFERENCE_TIER = "standard"
+
+def run_tier(audio_path, quality):
+    """
+    Analyze a track with one quality tier
+
+    Returns:
+        tuple: (total seconds, flattened metrics)
+    """
+    features = build_feature_store(audio_path, quality=quality)
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        reports = {
+            "spectral": analyze_audio(audio_path, f"{output_dir}/s", features=features, plot=False),
+            "emotional": analyze_emotional_cadence(audio_path, f"{output_dir}/e", features=features, plot=False),
+            "phonetic": analyze_phonetic_patterns(audio_path, f"{output_dir}/p", features=features, plot=False),
+        }
+        total_seconds = time.perf_counter() - start
+    for report in reports.values():
+        for field in ("file", "output_files", "profile", "sample_rate"):
+            report.pop(field, None)
+    return total_seconds, report_metrics(reports)
+
+def benchmark_quality(tracks, tiers=tuple(QUALITY_TIERS)):
+    """
+    Compare quality tiers on each track against the standard tier
+
+    Returns:
+        tuple: (rows, drift): one row per track and tier with timings,
+        speedup and drift statistics, and {tier: {metric: worst drift over
+        all tracks}}
+    """
+    rows = []
+    drift_by_tier = {tier: {} for tier in tiers if tier != REFERENCE_TIER}
+    for track in tracks:
+        # The first run pays for JIT compilation and cold caches, so the
+        # reference is a second standard run
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            run_tier(track, REFERENCE_TIER)
+            reference_seconds, reference = run_tier(track, REFERENCE_TIER)
+        for tier in tiers:
+            if tier == REFERENCE_TIER:
+                total_seconds, metrics = reference_seconds, reference
+            else:
+                with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                    total_seconds, metrics = run_tier(track, tier)
+            drift = metric_drift(reference, metrics)
+            worst = max(drift, key=drift.get)
+            for path, value in drift.items():
+                if tier in drift_by_tier:
+                    drift_by_tier[tier][path] = max(drift_by_tier[tier].get(path, 0.0), value)
+            rows.append({
+                "track": os.path.basename(track),
+                "quality": tier,
+                "total_seconds": round(total_seconds, 3),
+                "speedup": round(reference_seconds / total_seconds, 2),
+                "median_drift": float(np.median(list(drift.values()))),
+                "max_drift": drift[worst],
+                "max_drift_metric": worst
+            })
+    return rows, drift_by_tier
+
+def print_tables(rows, drift_by_tier):
+    """Print the per-track summary and the worst drift of every metric per tier"""
+    print(f"{'track':<24} {'quality':>9} {'total (s)':>10} {'speedup':>8} {'median drift':>13} {'max drift':>10}  worst metric")
+    for row in rows:
+        print(f"{row['track']:<24} {row['quality']:>9} {row['total_seconds']:>10.3f} {row['speedup']:>7.2f}x "
+              f"{row['median_drift']:>12.2%} {row['max_drift']:>9.2%}  {row['max_drift_metric']}")
+
+    tiers = list(drift_by_tier)
+    metrics = sorted({path for drift in drift_by_tier.values() for path in drift})
+    print(f"\n{'metric (worst drift over all tracks)':<56}" + "".join(f"{tier:>10}" for tier in tiers))
+    for path in metrics:
+        print(f"{path:<56}" + "".join(f"{drift_by_tier[tier].get(path, float('nan')):>10.1%}" for tier in tiers))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Speed and metric drift of the analysis quality tiers")
+    parser.add_argument("audio_files", nargs="*", help="tracks to measure in addition to the reference fixtures")
+    parser.add_argument("--duration", type=parse_duration, default=60,
+                        help="length of the reference fixtures, e.g. 30s or 2m (default: 1m)")
+    parser.add_argument("--fixtures", nargs="*", choices=FIXTURE_KINDS, default=list(FIXTURE_KINDS),
+                        help="reference fixtures to measure (none with --fixtures alone)")
+    parser.add_argument("--fixtures-dir", default="bench_fixtures", help="where generated fixtures are kept between runs")
+    parser.add_argument("--tiers", nargs="+", choices=tuple(QUALITY_TIERS), default=list(QUALITY_TIERS))
+    parser.add_argument("--json", help="also write both tables to this JSON file")
+    args = parser.parse_args()
+
+    tracks = [str(ensure_fixture(args.fixtures_dir, kind, args.duration)) for kind in args.fixtures]
+    rows, drift_by_tier = benchmark_quality(tracks + args.audio_files, args.tiers)
+    print_tables(rows, drift_by_tier)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rows": rows, "drift": drift_by_tier}, f, indent=2)
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite - Scaling of the analyzers on synthetic audio
+Generates deterministic synthetic tracks (sine chords, click tracks at a
+known tempo, sibilant and plosive noise bursts) at durations from seconds
+to hours, measures wall time, CPU time and peak RSS of every analyzer
+stage by stage, and compares the results with a stored baseline to catch
+performance regressions
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from pathlib import Path
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+from stage_profile import reset_peak_rss, peak_rss_mb
+
+FIXTURE_KINDS = ("chords", "clicks", "bursts")
+ANALYZER_NAMES = ("spectral", "emotional", "phonetic", "comprehensive")
+METRICS = ("wall_seconds", "cpu_seconds", "peak_rss_mb")
+
+# Fixtures are synthesized and written this many seconds at a time
+FIXTURE_BLOCK_SECONDS = 60
+
+# Chord progression of the chords fixture (I - vi - IV - V in C), in Hz
+CHORD_PROGRESSION = (
+    (261.63, 329.63, 392.00),
+    (220.00, 261.63, 329.63),
+    (174.61, 220.00, 261.63),
+    (196.00, 246.94, 293.66),
+)
+CHORD_SECONDS = 2.0
+CLICK_BPM = 120
+BURST_INTERVAL_SECONDS = 0.5
+
+# Length of the track each measurement process warms up on
+WARMUP_SECONDS = 2
+
+# A stage only counts as a regression when it also grew by at least this
+# much, so millisecond stages do not trip the tolerance on timer noise
+REGRESSION_FLOOR = {"wall_seconds": 0.05, "cpu_seconds": 0.05, "peak_rss_mb": 16.0}
+
+def parse_duration(text):
+    """Seconds from '45', '10s', '5m' or '2h'"""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smh]?)", text.strip().lower())
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid duration '{text}', expected e.g. 10s, 5m or 2h")
+    return float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+
+def format_duration(seconds):
+    """Short label for a duration, e.g. 10s, 5m, 2h"""
+    for unit, size in (("h", 3600), ("m", 60)):
+        if seconds >= size and seconds % size == 0:
+            return f"{int(seconds // size)}{unit}"
+    return f"{seconds:g}s"
+
+# 1. SYNTHETIC FIXTURES
+
+def chords_block(start, n, sr):
+    """Sustained three-note chords with two overtones per note, changing every CHORD_SECONDS"""
+    t = (start + np.arange(n)) / sr
+    chord_index = (t // CHORD_SECONDS).astype(int) % len(CHORD_PROGRESSION)
+    # Soft attack and decay inside each chord
+    phase = (t % CHORD_SECONDS) / CHORD_SECONDS
+    envelope = np.minimum(phase * 20, 1) * (1 - 0.5 * phase)
+    block = np.zeros(n)
+    for chord_number, chord in enumerate(CHORD_PROGRESSION):
+        mask = chord_index == chord_number
+        if not mask.any():
+            continue
+        for frequency in chord:
+            for harmonic, weight in ((1, 1.0), (2, 0.4), (3, 0.2)):
+                block[mask] += weight * np.sin(2 * np.pi * frequency * harmonic * t[mask])
+    return 0.12 * envelope * block
+
+def clicks_block(start, n, sr):
+    """Decaying 1.5 kHz clicks at CLICK_BPM with an accented downbeat every four beats"""
+    beat_samples = 60 / CLICK_BPM * sr
+    click_length = int(0.03 * sr)
+    click_t = np.arange(click_length) / sr
+    click = np.sin(2 * np.pi * 1500 * click_t) * np.exp(-click_t * 200)
+    block = np.zeros(n)
+    first_beat = max(0, int(np.ceil((start - click_length) / beat_samples)))
+    beat = first_beat
+    while beat * beat_samples < start + n:
+        onset = int(round(beat * beat_samples)) - start
+        gain = 0.8 if beat % 4 == 0 else 0.5
+        lo, hi = max(onset, 0), min(onset + click_length, n)
+        if hi > lo:
+            block[lo:hi] += gain * click[lo - onset:hi - onset]
+        beat += 1
+    return block
+
+def noise_burst(rng, length, band, sr):
+    """White noise band-limited to band (low_hz, high_hz) and normalized to unit peak"""
+    spectrum = np.fft.rfft(rng.standard_normal(length))
+    frequencies = np.fft.rfftfreq(length, 1 / sr)
+    spectrum[(frequencies < band[0]) | (frequencies > band[1])] = 0
+    burst = np.fft.irfft(spectrum, length)
+    return burst / (np.abs(burst).max() + 1e-12)
+
+def bursts_block(start, n, sr, seed=0):
+    """
+    Alternating noise bursts every BURST_INTERVAL_SECONDS over a quiet hum:
+    150 ms sibilant-band (4-10 kHz) hisses and 15 ms broadband plosive
+    pops. Each burst is drawn from its own seeded generator, so the signal
+    does not depend on the block size it is generated with.
+    """
+    t = (start + np.arange(n)) / sr
+    block = 0.05 * np.sin(2 * np.pi * 110 * t)
+    interval = int(BURST_INTERVAL_SECONDS * sr)
+    longest = int(0.15 * sr)
+    first = max(0, (start - longest) // interval)
+    for index in range(first, (start + n) // interval + 1):
+        rng = np.random.default_rng((seed, index))
+        if index % 2 == 0:
+            burst = 0.4 * noise_burst(rng, longest, (4000, min(10000, sr / 2)), sr) * np.hanning(longest)
+        else:
+            length = int(0.015 * sr)
+            burst = 0.7 * noise_burst(rng, length, (50, sr / 2), sr) * np.exp(-np.arange(length) / (0.003 * sr))
+        # Jitter each burst by up to 50 ms so onsets are not perfectly periodic
+        onset = index * interval + int(rng.integers(0, int(0.05 * sr))) - start
+        lo, hi = max(onset, 0), min(onset + len(burst), n)
+        if hi > lo:
+            block[lo:hi] += burst[lo - onset:hi - onset]
+    return block
+
+FIXTURE_GENERATORS = {"chords": chords_block, "clicks": clicks_block, "bursts": bursts_block}
+
+def fixture_path(fixtures_dir, kind, duration, sr):
+    return Path(fixtures_dir) / f"{kind}_{format_duration(duration)}_{sr}.wav"
+
+def ensure_fixture(fixtures_dir, kind, duration, sr=44100):
+    """
+    Write a synthetic fixture as 16-bit mono WAV unless it already exists
+
+    Fixtures are generated block by block, so even a two-hour track never
+    has to fit in memory, and the same arguments always produce the same
+    samples.
+
+    Returns:
+        Path: The fixture file
+    """
+    path = fixture_path(fixtures_dir, kind, duration, sr)
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    generate = FIXTURE_GENERATORS[kind]
+    n_samples = int(duration * sr)
+    block_samples = FIXTURE_BLOCK_SECONDS * sr
+    partial = path.with_suffix(".partial.wav")
+    with sf.SoundFile(partial, "w", samplerate=sr, channels=1, subtype="PCM_16") as out:
+        for start in range(0, n_samples, block_samples):
+            block = generate(start, min(block_samples, n_samples - start), sr)
+            out.write(np.clip(block, -1, 1).astype(np.float32))
+    partial.rename(path)
+    return path
+
+# 2. MEASUREMENT
+
+class StageTimer:
+    """Records wall time, CPU time and peak RSS of consecutive named stages"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, function, *args, **kwargs):
+        reset_peak_rss()
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = function(*args, **kwargs)
+        self.stages[name] = {
+            "wall_seconds": time.perf_counter() - wall,
+            "cpu_seconds": time.process_time() - cpu,
+            "peak_rss_mb": peak_rss_mb()
+        }
+        return result
+
+    def results(self):
+        """
+        The recorded stages plus their total (peak RSS is the largest stage
+        peak). The one-time startup stage is not part of the total.
+        """
+        stages = [stage for name, stage in self.stages.items() if name != "startup"]
+        total = {metric: sum(stage[metric] for stage in stages) for metric in METRICS[:2]}
+        total["peak_rss_mb"] = max(stage["peak_rss_mb"] for stage in stages)
+        return {**self.stages, "total": total}
+
+def run_stages(timer, analyzer, audio_path, output_dir, stream=False, analysis_sr=None, decimate=True):
+    """Run one analyzer on one track, timing each stage with timer"""
+    import importlib
+    from plot_rendering import find_deferred, render_saved_figure
+    from feature_options import build_feature_store
+    from batch_analysis import ANALYZERS
+
+    if analyzer == "comprehensive":
+        from comphrehensive_analysis import comprehensive_analysis
+        timer.run("analysis", comprehensive_analysis, audio_path, output_dir, stream=stream,
+                  analysis_sr=analysis_sr, plot="deferred", decimate=decimate)
+    else:
+        module_name, function_name = ANALYZERS[analyzer]
+        module = importlib.import_module(module_name)
+        features = build_feature_store(audio_path, stream=stream, analysis_sr=analysis_sr, wanted=module.FEATURES)
+        if not stream:
+            timer.run("decode", features.get, "audio")
+        timer.run("features", lambda: [features.get(name) for name in module.FEATURES])
+        plot = "none" if stream and analyzer == "spectral" else "deferred"
+        timer.run("analysis", getattr(module, function_name), audio_path, output_dir, features=features,
+                  plot=plot, decimate=decimate)
+        del features
+    deferred = find_deferred([output_dir])
+    if deferred:
+        timer.run("render", lambda: [render_saved_figure(path) for path in deferred])
+
+def measure_analyzer(analyzer, audio_path, warmup_path=None, stream=False, analysis_sr=None, decimate=True):
+    """
+    Run one analyzer on one track and measure each of its stages
+
+    Meant to run in a fresh process, so imports and caches of one
+    measurement never leak into the next. Single analyzers are split into
+    decode, features (every feature the analyzer declares), analysis and
+    render; the comprehensive analysis shares one feature store across
+    three analyzers, so it is measured as analysis and render. When
+    warmup_path is given the analyzer first runs on that short track, and
+    the imports and JIT compilation it pays for are reported as a separate
+    startup stage instead of inflating the first measured stage.
+
+    Returns:
+        dict: Stage name -> {wall_seconds, cpu_seconds, peak_rss_mb}
+    """
+    timer = StageTimer()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        if warmup_path:
+            warmup = StageTimer()
+            with tempfile.TemporaryDirectory() as output_dir:
+                timer.run("startup", run_stages, warmup, analyzer, warmup_path, output_dir,
+                          stream, analysis_sr, decimate)
+            # The warm-up's own stages reset the peak counter as they go
+            timer.stages["startup"]["peak_rss_mb"] = max(stage["peak_rss_mb"] for stage in warmup.stages.values())
+        with tempfile.TemporaryDirectory() as output_dir:
+            run_stages(timer, analyzer, audio_path, output_dir, stream, analysis_sr, decimate)
+    return timer.results()
+
+def run_isolated(function, *args, **kwargs):
+    """Call function in a freshly spawned process and return its result"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(function, *args, **kwargs).result()
+
+def run_suite(fixtures_dir, kinds=FIXTURE_KINDS, durations=(10, 60, 600), analyzers=ANALYZER_NAMES,
+              fixture_sr=44100, stream=False, analysis_sr=None, decimate=True, repeat=1):
+    """
+    Measure every analyzer on every fixture
+
+    With repeat > 1 each metric keeps its smallest value over the repeats,
+    which is the least noisy estimate of the cost itself.
+
+    Returns:
+        dict: "<kind>/<duration>/<analyzer>" -> stage results
+    """
+    results = {}
+    for duration in durations:
+        for kind in kinds:
+            print(f"Generating {kind} fixture ({format_duration(duration)})...", flush=True)
+            audio_path = ensure_fixture(fixtures_dir, kind, duration, fixture_sr)
+            warmup_path = ensure_fixture(fixtures_dir, kind, WARMUP_SECONDS, fixture_sr)
+            for analyzer in analyzers:
+                key = f"{kind}/{format_duration(duration)}/{analyzer}"
+                runs = [run_isolated(measure_analyzer, analyzer, str(audio_path), str(warmup_path), stream,
+                                     analysis_sr, decimate) for _ in range(repeat)]
+                results[key] = {
+                    stage: {metric: round(min(run[stage][metric] for run in runs), 4) for metric in METRICS}
+                    for stage in runs[0]
+                }
+                total = results[key]["total"]
+                print(f"  {key:<32} {total['wall_seconds']:>9.2f} s wall {total['cpu_seconds']:>9.2f} s CPU "
+                      f"{total['peak_rss_mb']:>8.0f} MB peak", flush=True)
+    return results
+
+# 3. BASELINES
+
+def save_baseline(path, results, settings):
+    """Store results with the machine and settings they were measured with"""
+    baseline = {
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "processor": platform.processor(), "cpu_count": os.cpu_count()},
+        "settings": settings,
+        "results": results
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+    print(f"Saved baseline: {path}")
+
+def compare_baseline(baseline, results, tolerance=0.25):
+    """
+    Compare results with a baseline, stage by stage
+
+    A metric regresses when it grew by more than tolerance (a fraction of
+    the baseline value) and by more than REGRESSION_FLOOR.
+
+    Returns:
+        list: One row per (benchmark, stage, metric) present in both
+    """
+    rows = []
+    for key, stages in results.items():
+        for stage, metrics in stages.items():
+            reference = baseline["results"].get(key, {}).get(stage)
+            if reference is None:
+                continue
+            for metric in METRICS:
+                old, new = reference[metric], metrics[metric]
+                ratio = new / old if old > 0 else float("inf") if new > 0 else 1.0
+                rows.append({
+                    "benchmark": key, "stage": stage, "metric": metric,
+                    "baseline": old, "current": new, "ratio": ratio,
+                    "regression": ratio > 1 + tolerance and new - old > REGRESSION_FLOOR[metric]
+                })
+    return rows
+
+def print_comparison(rows):
+    """Print every stage total and every regression"""
+    print(f"\n{'benchmark':<32} {'stage':<9} {'metric':<12} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for row in rows:
+        if row["stage"] == "total" or row["regression"]:
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(f"{row['benchmark']:<32} {row['stage']:<9} {row['metric']:<12} {row['baseline']:>10.2f} "
+                  f"{row['current']:>10.2f} {row['ratio']:>6.2f}x{flag}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the analyzers on synthetic audio and compare with a baseline")
+    parser.add_argument("--durations", type=parse_duration, nargs="+", default=[10, 60, 600],
+                        help="fixture durations, e.g. 10s 60s 10m 2h (default: 10s 1m 10m)")
+    parser.add_argument("--fixtures", nargs="+", choices=FIXTURE_KINDS, default=list(FIXTURE_KINDS))
+    parser.add_argument("--analyzers", nargs="+", choices=ANALYZER_NAMES, default=list(ANALYZER_NAMES))
+    parser.add_argument("--fixture-sr", type=int, default=44100, help="sample rate of the generated fixtures")
+    parser.add_argument("--fixtures-dir", default="bench_fixtures", help="where generated fixtures are kept between runs")
+    parser.add_argument("--stream", action="store_true", help="analyze with the bounded-memory streaming store")
+    parser.add_argument("--sr", type=int, dest="analysis_sr", help="analysis sample rate (default: native)")
+    parser.add_argument("--full-plots", action="store_true", help="render figures without pixel-width decimation")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per benchmark; the fastest is kept")
+    parser.add_argument("--baseline", help="compare with this baseline file and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed growth over the baseline (default: 0.25)")
+    parser.add_argument("--save-baseline", help="store the results as a baseline file")
+    args = parser.parse_args()
+
+    settings = {"fixture_sr": args.fixture_sr, "stream": args.stream, "analysis_sr": args.analysis_sr,
+                "decimate": not args.full_plots, "repeat": args.repeat}
+    results = run_suite(args.fixtures_dir, args.fixtures, args.durations, args.analyzers, args.fixture_sr,
+                        args.stream, args.analysis_sr, not args.full_plots, args.repeat)
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results, settings)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["settings"] != settings:
+            print(f"Warning: baseline was measured with {baseline['settings']}")
+        rows = compare_baseline(baseline, results, args.tolerance)
+        print_comparison(rows)
+        regressions = [row for row in rows if row["regression"]]
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+        sys.exit(1 if regressions else 0)
@@ -4,14 +4,48 @@ Comprehensive Music Analysis - Integrated spectral, emotional, and phonetic anal
 Provides complete mathematical "listening" experience
 """
 
-import sys
 import json
+import argparse
+import importlib
 from pathlib import Path
 import subprocess
 
-def comprehensive_analysis(audio_path, output_dir="comprehensive_analysis"):
+def comprehensive_analysis(audio_path, output_dir="comprehensive_analysis", in_process=True, cache_dir=None, stream=False,
+                           plot=True, decimate=False, export=None, analysis_sr=None, resampler="hq", decoder="auto",
+                           pitch_method=None, quality="standard", segment_workers=1, profile_hooks=(),
+                           profile_stages=None):
     """
     Run all analysis scripts and compile integrated report
+
+    By default the three analyzers run in this process and share one
+    FeatureStore, so the track is decoded once and shared features (STFT
+    magnitude, onset envelope, RMS, chroma) are computed once and released
+    as soon as no remaining analyzer declares them. With
+    in_process=False each analyzer runs as its own python3 subprocess and
+    its JSON report is read back from disk.
+
+    cache_dir enables the on-disk FeatureCache in either mode, so features
+    of a previously analyzed track are loaded instead of recomputed.
+    stream=True reads the track in blocks with bounded memory instead; the
+    spectral analyzer then skips its full-resolution spectrogram figure.
+    analysis_sr, resampler and decoder select how the track is decoded (see
+    audio_decode.py); pitch_method selects the pitch tracker (see
+    pitch_track.py). quality picks a feature_options.QUALITY_TIERS tier of
+    analysis rate, FFT size, chroma transform, pitch tracker and HPSS;
+    analysis_sr and pitch_method override its settings when given.
+    segment_workers splits the STFT, chroma and HPSS of a long track across
+    processes (see segment_parallel.py; 0 for every available core).
+
+    plot and decimate choose how the analyzers' figures are rendered
+    (see plot_rendering.py); export="npz" or "parquet" makes every analyzer
+    also write its per-frame timelines (see frame_export.py).
+
+    Every analyzer report carries a profile section with the wall time, CPU
+    time and peak memory of its stages (see stage_profile.py). In-process,
+    a shared feature is charged to the first analyzer that asks for it.
+    profile_hooks and profile_stages run cProfile or tracemalloc inside the
+    chosen stages of every analyzer. The integrated summary's profile lists
+    each analyzer's totals.
     """
     output_path = Path(output_dir)
     output_path.mkdir(exist_ok=True)
@@ -22,76 +56,103 @@ def comprehensive_analysis(audio_path, output_dir="comprehensive_analysis"):
     print(f"File: {audio_path}")
     print()
     
-    # Get the script directory
-    script_dir = Path(__file__).parent
-    
     results = {
         "audio_file": str(audio_path),
         "analyses": {}
     }
     
+    if cache_dir and stream:
+        raise ValueError("cache_dir and stream cannot be combined")
+    
+    from feature_options import build_feature_store, feature_script_args
+    
+    # Options forwarded to the analysis scripts in subprocess mode
+    script_args = feature_script_args(cache_dir, stream, analysis_sr, resampler, decoder, pitch_method, quality,
+                                      segment_workers)
+    if plot is not True:
+        script_args += ["--plots", plot or "none"]
+    if decimate:
+        script_args += ["--decimate-plots"]
+    if export:
+        script_args += ["--export-frames", export]
+    for hook in profile_hooks:
+        script_args += ["--profile-hook", hook]
+    for stage in profile_stages or ():
+        script_args += ["--profile-stage", stage]
+    
+    features = None
+    if in_process:
+        from stage_profile import StageProfiler
+        features = build_feature_store(audio_path, cache_dir, stream, analysis_sr, resampler, decoder,
+                                       pitch_method=pitch_method, quality=quality, segment_workers=segment_workers)
+
+        def new_profiler():
+            return StageProfiler(hooks=profile_hooks, hook_stages=profile_stages)
+    
     # 1. SPECTRAL ANALYSIS
     print("\n[1/3] Running Spectral Analysis...")
     print("-" * 60)
     try:
         spectral_dir = output_path / "spectral"
-        subprocess.run([
-            "python3",
-            str(script_dir / "spectral_analysis.py"),
-            audio_path,
-            str(spectral_dir)
-        ], check=True)
-        
-        # Load spectral results
-        with open(spectral_dir / "analysis_report.json") as f:
-            results["analyses"]["spectral"] = json.load(f)
+        if in_process:
+            from spectral_analysis import analyze_audio
+            results["analyses"]["spectral"] = analyze_audio(
+                audio_path, str(spectral_dir), features=features, plot=False if stream else plot, decimate=decimate,
+                export=export, profiler=new_profiler()
+            )
+            release_features(features, "emotional_cadence", "phonetic_analysis")
+        else:
+            results["analyses"]["spectral"] = run_analysis_script(
+                "spectral_analysis.py", audio_path, spectral_dir, "analysis_report.json", script_args
+            )
         
         print("✓ Spectral analysis complete")
     except Exception as e:
         print(f"✗ Spectral analysis failed: {e}")
-        results["analyses"]["spectral"] = {"error": str(e)}
+        results["analyses"]["spectral"] = {"error": str(e) or type(e).__name__}
     
     # 2. EMOTIONAL CADENCE
     print("\n[2/3] Running Emotional Cadence Analysis...")
     print("-" * 60)
     try:
         emotional_dir = output_path / "emotional"
-        subprocess.run([
-            "python3",
-            str(script_dir / "emotional_cadence.py"),
-            audio_path,
-            str(emotional_dir)
-        ], check=True)
-        
-        # Load emotional results
-        with open(emotional_dir / "emotional_report.json") as f:
-            results["analyses"]["emotional"] = json.load(f)
+        if in_process:
+            from emotional_cadence import analyze_emotional_cadence
+            results["analyses"]["emotional"] = analyze_emotional_cadence(
+                audio_path, str(emotional_dir), features=features, plot=plot, decimate=decimate, export=export,
+                profiler=new_profiler()
+            )
+            release_features(features, "phonetic_analysis")
+        else:
+            results["analyses"]["emotional"] = run_analysis_script(
+                "emotional_cadence.py", audio_path, emotional_dir, "emotional_report.json", script_args
+            )
         
         print("✓ Emotional cadence analysis complete")
     except Exception as e:
         print(f"✗ Emotional cadence analysis failed: {e}")
-        results["analyses"]["emotional"] = {"error": str(e)}
+        results["analyses"]["emotional"] = {"error": str(e) or type(e).__name__}
     
     # 3. PHONETIC PATTERNS
     print("\n[3/3] Running Phonetic Pattern Analysis...")
     print("-" * 60)
     try:
         phonetic_dir = output_path / "phonetic"
-        subprocess.run([
-            "python3",
-            str(script_dir / "phonetic_analysis.py"),
-            audio_path,
-            str(phonetic_dir)
-        ], check=True)
-        
-        # Load phonetic results
-        with open(phonetic_dir / "phonetic_report.json") as f:
-            results["analyses"]["phonetic"] = json.load(f)
+        if in_process:
+            from phonetic_analysis import analyze_phonetic_patterns
+            results["analyses"]["phonetic"] = analyze_phonetic_patterns(
+                audio_path, str(phonetic_dir), features=features, plot=plot, decimate=decimate, export=export,
+                profiler=new_profiler()
+            )
+        else:
+            results["analyses"]["phonetic"] = run_analysis_script(
+                "phonetic_analysis.py", audio_path, phonetic_dir, "phonetic_report.json", script_args
+            )
         
         print("✓ Phonetic pattern analysis complete")
     except Exception as e:
         print(f"✗ Phonetic pattern analysis failed: {e}")
-        results["analyses"]["phonetic"] = {"error": str(e)}
+        results["analyses"]["phonetic"] = {"error": str(e) or type(e).__name__}
     
     # 4. CREATE INTEGRATED SUMMARY
     print("\n" + "=" * 60)
@@ -99,6 +160,10 @@ def comprehensive_analysis(audio_path, output_dir="comprehensive_analysis"):
     print("=" * 60)
     
     summary = create_integrated_summary(results)
+    errors = {name: analysis["error"] for name, analysis in results["analyses"].items() if "error" in analysis}
+    if errors:
+        summary["errors"] = errors
+    summary["profile"] = summarize_profiles(results)
     
     # Save summary
     summary_path = output_path / "integrated_summary.json"
@@ -113,6 +178,50 @@ def comprehensive_analysis(audio_path, output_dir="comprehensive_analysis"):
     
     return summary
 
+def release_features(features, *remaining_modules):
+    """
+    Free shared features that none of the remaining analyzers consume
+    """
+    keep = set()
+    for module_name in remaining_modules:
+        try:
+            keep.update(importlib.import_module(module_name).FEATURES)
+        except ImportError:
+            continue  # That analyzer reports its own failure when it runs
+    features.release(keep)
+
+def summarize_profiles(results):
+    """
+    Per-analyzer profile totals and their sum (peak RSS is the largest
+    analyzer peak)
+    """
+    totals = {name: analysis["profile"]["total"] for name, analysis in results["analyses"].items()
+              if "profile" in analysis}
+    profile = {"analyses": totals}
+    if totals:
+        profile["total"] = {
+            "wall_seconds": round(sum(total["wall_seconds"] for total in totals.values()), 4),
+            "cpu_seconds": round(sum(total["cpu_seconds"] for total in totals.values()), 4),
+            "peak_rss_mb": max(total["peak_rss_mb"] for total in totals.values())
+        }
+    return profile
+
+def run_analysis_script(script_name, audio_path, analysis_dir, report_name, script_args=()):
+    """
+    Run one analysis script as a python3 subprocess and load its JSON report
+    """
+    script_dir = Path(__file__).parent
+    subprocess.run([
+        "python3",
+        str(script_dir / script_name),
+        audio_path,
+        str(analysis_dir),
+        *script_args
+    ], check=True)
+    
+    with open(Path(analysis_dir) / report_name) as f:
+        return json.load(f)
+
 def create_integrated_summary(results):
     """
     Synthesize insights from all analyses
@@ -266,13 +375,34 @@ def print_summary(summary):
         print("\n🌟 OVERALL IMPRESSION:")
         for impression in exp["overall_impression"]:
             print(f"   • {impression}")
+    
+    totals = summary.get("profile", {}).get("analyses", {})
+    if totals:
+        print("\n⏱  PROFILE:")
+        for name, total in totals.items():
+            print(f"   {name}: {total['wall_seconds']:.2f}s wall, {total['cpu_seconds']:.2f}s CPU, "
+                  f"{total['peak_rss_mb']:.0f} MB peak")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python comprehensive_analysis.py <audio_file> [output_dir]")
-        sys.exit(1)
+    from feature_options import add_feature_arguments
+    from plot_rendering import add_plot_arguments
+    from frame_export import add_export_arguments
+    from stage_profile import add_profile_arguments
     
-    audio_file = sys.argv[1]
-    output_dir = sys.argv[2] if len(sys.argv) > 2 else "comprehensive_analysis"
+    parser = argparse.ArgumentParser(description="Integrated spectral, emotional, and phonetic analysis")
+    parser.add_argument("audio_file")
+    parser.add_argument("output_dir", nargs="?", default="comprehensive_analysis")
+    parser.add_argument("--subprocess", action="store_true",
+                        help="run each analyzer as a separate python3 process instead of sharing features in-process")
+    add_feature_arguments(parser)
+    add_plot_arguments(parser)
+    add_export_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
     
-    comprehensive_analysis(audio_file, output_dir)
+    comprehensive_analysis(args.audio_file, args.output_dir, in_process=not args.subprocess,
+                           cache_dir=args.cache_dir, stream=args.stream,
+                           plot=args.plots, decimate=args.decimate_plots, export=args.export_frames,
+                           analysis_sr=args.analysis_sr, resampler=args.resampler, decoder=args.decoder,
+                           pitch_method=args.pitch_method, quality=args.quality,
+                           segment_workers=args.segment_workers, profile_hooks=args.profile_hooks, profile_stages=args.profile_stages)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Drum Onsets - Kick, snare and hi-hat transients from band energies
+Detects onsets separately in the kick, snare and hi-hat bands from one pass
+of the band-energy filterbank, with novelty and peak picking vectorized
+across all lanes at once
+"""
+
+import json
+import argparse
+from pathlib import Path
+
+import librosa
+import numpy as np
+import matplotlib.pyplot as plt
+from scipy.ndimage import maximum_filter1d, uniform_filter1d
+
+from band_energy import BAND_NAMES
+from feature_store import FeatureStore
+from feature_options import add_feature_arguments, feature_store_from_args
+from frame_export import frame_columns, frame_flags, write_frames, add_export_arguments
+from plot_rendering import FIGURE_SIZE, DPI, plot_mode, emit_figure, decimate_line, add_plot_arguments
+from stage_profile import StageProfiler, add_profile_arguments, profiler_from_args
+
+# Shared features consumed by analyze_drum_onsets
+FEATURES = ("band_energies",)
+
+# Lanes and the band_energy.BANDS bands they listen to; a lane with several
+# bands only fires when all of them rise together (the snare's body and crack)
+LANES = {
+    "kick": ("kick",),
+    "snare": ("snare_body", "snare_crack"),
+    "hi_hat": ("hi_hat",)
+}
+
+LANE_NAMES = tuple(LANES)
+
+# Band energies are log-compressed relative to each band's maximum with this
+# gain; stronger compression lifts the bleed of other drums into a lane
+COMPRESSION = 1.0
+
+# Onsets in one lane are at least this far apart (sixteenths at 250 BPM)
+MIN_ONSET_SECONDS = 0.06
+
+# Novelty must exceed its local mean over this window by THRESHOLD_DELTA of
+# the lane's standard deviation
+THRESHOLD_SECONDS = 1.0
+THRESHOLD_DELTA = 0.5
+
+# Onsets weaker than this fraction of their lane's strongest are dropped as
+# bleed from the other drums
+MIN_STRENGTH = 0.3
+
+def lane_novelty(band_energies):
+    """
+    Onset novelty of every lane
+
+    Each band's energy is log-compressed, its positive frame-to-frame rise
+    (from silence before the first frame) taken as its flux, and the bands
+    of a lane combined by their geometric mean, all as whole-array
+    operations over the bands.
+
+    Args:
+        band_energies: (len(BAND_NAMES), frames) from FeatureStore.band_energies
+
+    Returns:
+        np.ndarray: (len(LANES), frames) novelty, rows in LANE_NAMES order
+    """
+    energies = np.asarray(band_energies, dtype=np.float64)
+    compressed = np.log1p(COMPRESSION * energies / (energies.max(axis=1, keepdims=True) + 1e-10))
+    flux = np.maximum(0, np.diff(compressed, axis=1, prepend=0))
+
+    # Average the log flux of each lane's bands with a (lanes, bands) membership matrix
+    membership = np.zeros((len(LANES), len(BAND_NAMES)))
+    for lane, bands in enumerate(LANES.values()):
+        membership[lane, [BAND_NAMES.index(band) for band in bands]] = 1 / len(bands)
+    return np.exp(membership @ np.log(flux + 1e-10)) - 1e-10
+
+def pick_onsets(novelty, frames_per_second):
+    """
+    Onset frames of every lane
+
+    A frame is an onset when it is the maximum of its lane within
+    MIN_ONSET_SECONDS, exceeds the adaptive threshold and reaches
+    MIN_STRENGTH of the lane's maximum; plateaus keep their first frame.
+
+    Returns:
+        tuple: (lane indices, frame indices) of every onset, sorted by lane then frame
+    """
+    distance = max(1, int(round(MIN_ONSET_SECONDS * frames_per_second)))
+    local_max = novelty == maximum_filter1d(novelty, size=2 * distance + 1, axis=1, mode='constant')
+    threshold = (uniform_filter1d(novelty, size=max(1, int(THRESHOLD_SECONDS * frames_per_second)), axis=1)
+                 + THRESHOLD_DELTA * novelty.std(axis=1, keepdims=True))
+    strong = novelty >= MIN_STRENGTH * novelty.max(axis=1, keepdims=True)
+    lanes, frames = np.nonzero(local_max & (novelty > threshold) & strong & (novelty > 0))
+    keep = np.ones(len(frames), dtype=bool)
+    keep[1:] = (lanes[1:] != lanes[:-1]) | (np.diff(frames) > distance)
+    return lanes[keep], frames[keep]
+
+def drum_figure_arrays(times, novelty, onset_lanes, onset_times, decimate=False):
+    """
+    The (lanes, frames) novelty render_drum_figure draws with each lane's
+    times, reduced to its min/max envelope at the figure's pixel width with
+    decimate
+    """
+    lines = [decimate_line(times, values) if decimate else (times, values) for values in novelty]
+    return {"lane_times": np.stack([line[0] for line in lines]), "novelty": np.stack([line[1] for line in lines]),
+            "onset_lanes": onset_lanes, "onset_times": onset_times}
+
+def render_drum_figure(plot_path, lane_times, novelty, onset_lanes, onset_times):
+    """Draw each lane's novelty with its onsets, and the onset raster, to plot_path, from drum_figure_arrays"""
+    fig, axes = plt.subplots(len(LANE_NAMES) + 1, 1, figsize=FIGURE_SIZE, sharex=True)
+    colors = ('darkred', 'navy', 'darkgoldenrod')
+    for lane, (ax, name, color) in enumerate(zip(axes, LANE_NAMES, colors)):
+        ax.plot(lane_times[lane], novelty[lane], color=color, linewidth=0.8)
+        hits = onset_times[onset_lanes == lane]
+        ax.vlines(hits, 0, novelty[lane].max(), color=color, alpha=0.25, linewidth=0.8)
+        ax.set_title(f'{name.replace("_", "-").title()} Novelty ({len(hits)} onsets)')
+        ax.set_ylabel('Novelty')
+        ax.grid(True, alpha=0.3)
+    axes[-1].eventplot([onset_times[onset_lanes == lane] for lane in range(len(LANE_NAMES))],
+                       colors=colors, lineoffsets=range(len(LANE_NAMES)), linelengths=0.8)
+    axes[-1].set_yticks(range(len(LANE_NAMES)))
+    axes[-1].set_yticklabels(LANE_NAMES)
+    axes[-1].set_title('Drum Lanes')
+    axes[-1].set_xlabel('Time (s)')
+    plt.tight_layout()
+    plt.savefig(plot_path, dpi=DPI, bbox_inches='tight')
+    print(f"Saved drum onset plot: {plot_path}")
+    plt.close()
+
+def analyze_drum_onsets(audio_path, output_dir="drum_analysis", features=None, plot=True, decimate=False,
+                        export=None, profiler=None):
+    """
+    Detect kick, snare and hi-hat onsets
+
+    Args:
+        audio_path: Path to audio file
+        output_dir: Directory to save outputs
+        features: Optional FeatureStore shared with other analyzers of the same track
+        plot: True/"inline" to render the drum lane figure, "deferred" to
+            save its arrays for plot_rendering.py, False/"none" to skip it
+        decimate: Downsample the figure's timelines to its pixel width
+        export: "npz" or "parquet" to also write every lane's novelty and
+            onset flags (drum_frames.*), None to skip it
+        profiler: Optional StageProfiler that measures the analysis; its
+            stages are added to the report's profile section
+
+    Returns:
+        dict: Onset times and strengths per lane
+    """
+    output_path = Path(output_dir)
+    output_path.mkdir(exist_ok=True)
+
+    if features is None:
+        features = FeatureStore(audio_path)
+    if profiler is None:
+        profiler = StageProfiler()
+    features.profiler = profiler
+    duration = features.duration
+
+    print(f"Detecting drum onsets: {audio_path}")
+
+    # 1. LANE NOVELTY
+    band_energies = features.band_energies
+    frames_per_second = features.sr / features.hop_length
+    with profiler.stage("drum_onsets"):
+        novelty = lane_novelty(band_energies)
+
+        # 2. PEAK PICKING
+        onset_lanes, onset_frames = pick_onsets(novelty, frames_per_second)
+    times = librosa.frames_to_time(np.arange(novelty.shape[1]), sr=features.sr, hop_length=features.hop_length)
+    onset_times = times[onset_frames]
+    # Strength relative to the lane's loudest onset
+    strengths = novelty[onset_lanes, onset_frames] / (novelty.max(axis=1)[onset_lanes] + 1e-10)
+
+    # 3. VISUALIZATION AND EXPORT
+    output_files = {}
+    if plot_mode(plot) != "none":
+        with profiler.stage("plot"):
+            output_files["visualization"] = emit_figure(
+                render_drum_figure, output_path / "drum_onsets.png", plot, decimate, drum_figure_arrays,
+                times=times, novelty=novelty, onset_lanes=onset_lanes, onset_times=onset_times
+            )
+    if export:
+        with profiler.stage("export"):
+            columns = {}
+            for lane, name in enumerate(LANE_NAMES):
+                columns[f"{name}_novelty"] = novelty[lane]
+                columns[f"{name}_onset"] = frame_flags(novelty.shape[1], onset_frames[onset_lanes == lane])
+            output_files["frames"] = write_frames(output_path / "drum_frames", frame_columns(times, **columns), export)
+
+    # 4. COMPILE RESULTS
+    lanes = {}
+    for lane, name in enumerate(LANE_NAMES):
+        mask = onset_lanes == lane
+        lanes[name] = {
+            "bands": list(LANES[name]),
+            "count": int(mask.sum()),
+            "per_second": float(mask.sum() / duration) if duration else 0.0,
+            "onsets": [{"time": float(t), "strength": float(s)} for t, s in zip(onset_times[mask], strengths[mask])]
+        }
+    results = {
+        "file": str(audio_path),
+        "duration_seconds": float(duration),
+        "lanes": lanes,
+        "output_files": output_files,
+        "profile": profiler.report(output_path)
+    }
+
+    json_path = output_path / "drum_report.json"
+    with open(json_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved drum onset analysis: {json_path}")
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kick, snare and hi-hat onset detection of an audio file")
+    parser.add_argument("audio_file")
+    parser.add_argument("output_dir", nargs="?", default="drum_analysis")
+    add_feature_arguments(parser)
+    add_plot_arguments(parser)
+    add_export_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    features = feature_store_from_args(args.audio_file, args, FEATURES)
+    analyze_drum_onsets(args.audio_file, args.output_dir, features=features,
+                        plot=args.plots, decimate=args.decimate_plots, export=args.export_frames,
+                        profiler=profiler_from_args(args))
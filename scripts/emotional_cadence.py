@@ -8,18 +8,36 @@ import librosa
 import numpy as np
 import matplotlib.pyplot as plt
 import json
+import argparse
 from pathlib import Path
 from scipy import signal
+from feature_store import FeatureStore
+from feature_options import add_feature_arguments, feature_store_from_args
+from frame_export import frame_columns, frame_flags, write_frames, add_export_arguments
+from plot_rendering import FIGURE_SIZE, DPI, plot_mode, emit_figure, decimate_line, add_plot_arguments
+from stage_profile import StageProfiler, add_profile_arguments, profiler_from_args
 import warnings
 warnings.filterwarnings('ignore')
 
-def analyze_emotional_cadence(audio_path, output_dir="emotional_analysis"):
+# Shared features consumed by analyze_emotional_cadence
+FEATURES = ("rms", "chroma", "onset_env")
+
+def analyze_emotional_cadence(audio_path, output_dir="emotional_analysis", features=None, plot=True, decimate=False,
+                              export=None, profiler=None):
     """
     Analyze emotional progression through intensity and harmonic patterns
     
     Args:
         audio_path: Path to audio file
         output_dir: Directory to save outputs
+        features: Optional FeatureStore shared with other analyzers of the same track
+        plot: True/"inline" to render the emotional cadence figure, "deferred"
+            to save its arrays for plot_rendering.py, False/"none" to skip it
+        decimate: Downsample the figure's timelines to its pixel width
+        export: "npz" or "parquet" to also write every per-frame timeline
+            (emotional_frames.*), None to skip it
+        profiler: Optional StageProfiler that measures the analysis; its
+            stages are added to the report's profile section
     
     Returns:
         dict: Emotional cadence analysis with tension/resolution markers
@@ -28,45 +46,35 @@ def analyze_emotional_cadence(audio_path, output_dir="emotional_analysis"):
     output_path.mkdir(exist_ok=True)
     
     # Load audio
-    y, sr = librosa.load(audio_path, sr=None)
-    duration = len(y) / sr
+    if features is None:
+        features = FeatureStore(audio_path)
+    if profiler is None:
+        profiler = StageProfiler()
+    features.profiler = profiler
+    sr = features.sr
+    hop_length = features.hop_length
+    duration = features.duration
     
     print(f"Analyzing emotional cadence: {audio_path}")
     
     # 1. INTENSITY TRACKING
     # RMS energy (overall loudness/intensity)
-    rms = librosa.feature.rms(y=y, hop_length=512)[0]
-    rms_times = librosa.times_like(rms, sr=sr, hop_length=512)
+    rms = features.rms
+    rms_times = librosa.times_like(rms, sr=sr, hop_length=hop_length)
     
     # Smooth intensity for macro trends
-    window_size = max(3, len(rms) // 100)
-    if window_size % 2 == 0:
-        window_size += 1
-    intensity_smooth = signal.savgol_filter(rms, window_size, 2)
+    intensity_smooth = smooth_intensity(rms)
     
     # Calculate intensity gradient (rate of change)
     intensity_gradient = np.gradient(intensity_smooth)
     
     # 2. TENSION DETECTION (Dissonance)
-    # Use harmonic-percussive separation
-    y_harmonic, y_percussive = librosa.effects.hpss(y)
-    
     # Chromagram for harmonic analysis
-    chroma = librosa.feature.chroma_cqt(y=y, sr=sr, hop_length=512)
+    chroma = features.chroma
     
     # Calculate dissonance over time
-    tension_timeline = []
-    for frame in range(chroma.shape[1]):
-        # Variance in pitch classes indicates dissonance/tension
-        variance = np.var(chroma[:, frame])
-        # Spread of energy across frequencies
-        spread = np.std(chroma[:, frame])
-        # Combined tension metric
-        tension = variance * spread
-        tension_timeline.append(tension)
-    
-    tension_timeline = np.array(tension_timeline)
-    tension_times = librosa.times_like(tension_timeline, sr=sr, hop_length=512)
+    tension_timeline = chroma_tension(chroma)
+    tension_times = librosa.times_like(tension_timeline, sr=sr, hop_length=hop_length)
     
     # Normalize tension
     tension_normalized = (tension_timeline - tension_timeline.min()) / (tension_timeline.max() - tension_timeline.min() + 1e-10)
@@ -76,55 +84,143 @@ def analyze_emotional_cadence(audio_path, output_dir="emotional_analysis"):
     consonance_timeline = 1 - tension_normalized
     
     # 4. SPECTRAL FLUX (Measure of change in spectrum)
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr, hop_length=512)
-    onset_times = librosa.times_like(onset_env, sr=sr, hop_length=512)
+    onset_env = features.onset_env
+    onset_times = librosa.times_like(onset_env, sr=sr, hop_length=hop_length)
     
     # 5. EMOTIONAL PEAKS AND VALLEYS
     # Find significant intensity peaks (climaxes)
     from scipy.signal import find_peaks
     
-    peaks, peak_properties = find_peaks(intensity_smooth, height=np.percentile(intensity_smooth, 75), distance=sr//512)
+    peaks, peak_properties = find_peaks(intensity_smooth, height=np.percentile(intensity_smooth, 75), distance=sr//hop_length)
     peak_times = rms_times[peaks]
     peak_intensities = intensity_smooth[peaks]
     
     # Find valleys (calm moments)
-    valleys, valley_properties = find_peaks(-intensity_smooth, height=-np.percentile(intensity_smooth, 25), distance=sr//512)
+    valleys, valley_properties = find_peaks(-intensity_smooth, height=-np.percentile(intensity_smooth, 25), distance=sr//hop_length)
     valley_times = rms_times[valleys]
     valley_intensities = intensity_smooth[valleys]
     
     # 6. TENSION/RESOLUTION TRANSITIONS
-    # Find moments of major tension release
-    tension_drops = []
-    for i in range(1, len(tension_normalized)):
-        if tension_normalized[i-1] - tension_normalized[i] > 0.15:  # Significant drop
-            tension_drops.append({
-                "time": float(tension_times[i]),
-                "magnitude": float(tension_normalized[i-1] - tension_normalized[i])
-            })
-    
-    # Find moments of tension buildup
-    tension_rises = []
-    for i in range(1, len(tension_normalized)):
-        if tension_normalized[i] - tension_normalized[i-1] > 0.15:  # Significant rise
-            tension_rises.append({
-                "time": float(tension_times[i]),
-                "magnitude": float(tension_normalized[i] - tension_normalized[i-1])
-            })
+    # Find moments of major tension release and of tension buildup
+    tension_drops, tension_rises = tension_transitions(tension_normalized, tension_times)
     
     # 7. EMOTIONAL ARC CLASSIFICATION
     # Overall trajectory
-    early_intensity = np.mean(intensity_smooth[:len(intensity_smooth)//3])
-    mid_intensity = np.mean(intensity_smooth[len(intensity_smooth)//3:2*len(intensity_smooth)//3])
-    late_intensity = np.mean(intensity_smooth[2*len(intensity_smooth)//3:])
+    early_intensity, mid_intensity, late_intensity = intensity_thirds(intensity_smooth)
     
     arc_type = classify_emotional_arc(early_intensity, mid_intensity, late_intensity)
     
     # 8. CREATE VISUALIZATION
-    fig, axes = plt.subplots(4, 1, figsize=(14, 12))
+    output_files = {}
+    if plot_mode(plot) != "none":
+        with profiler.stage("plot"):
+            output_files["visualization"] = emit_figure(
+                render_emotional_figure, output_path / "emotional_cadence.png", plot, decimate,
+                emotional_figure_arrays,
+                rms_times=rms_times, rms=rms, intensity_smooth=intensity_smooth,
+                intensity_gradient=intensity_gradient,
+                peak_times=peak_times, peak_intensities=peak_intensities,
+                valley_times=valley_times, valley_intensities=valley_intensities,
+                tension_times=tension_times, tension_normalized=tension_normalized,
+                consonance_timeline=consonance_timeline, onset_times=onset_times, onset_env=onset_env
+            )
+    
+    # Every frame-level timeline; tension_change carries all the releases and
+    # buildups that the report's event lists truncate
+    if export:
+        with profiler.stage("export"):
+            frames = frame_columns(
+                rms_times,
+                rms=rms, intensity_smooth=intensity_smooth, intensity_gradient=intensity_gradient,
+                tension=tension_normalized, consonance=consonance_timeline,
+                tension_change=np.diff(tension_normalized, prepend=tension_normalized[:1]),
+                onset_strength=onset_env,
+                peak=frame_flags(len(rms), peaks), valley=frame_flags(len(rms), valleys)
+            )
+            output_files["frames"] = write_frames(output_path / "emotional_frames", frames, export)
+        
+    # 9. COMPILE RESULTS
+    results = {
+        "file": str(audio_path),
+        "duration_seconds": float(duration),
+        "emotional_arc": {
+            "type": arc_type,
+            "early_intensity": float(early_intensity),
+            "mid_intensity": float(mid_intensity),
+            "late_intensity": float(late_intensity)
+        },
+        "intensity_metrics": {
+            "mean": float(np.mean(intensity_smooth)),
+            "max": float(np.max(intensity_smooth)),
+            "min": float(np.min(intensity_smooth)),
+            "dynamic_range": float(np.max(intensity_smooth) - np.min(intensity_smooth)),
+            "variance": float(np.var(intensity_smooth))
+        },
+        "tension_metrics": {
+            "mean_tension": float(np.mean(tension_normalized)),
+            "max_tension": float(np.max(tension_normalized)),
+            "mean_consonance": float(np.mean(consonance_timeline))
+        },
+        "emotional_moments": {
+            "peaks": [{"time": float(t), "intensity": float(i)} for t, i in zip(peak_times, peak_intensities)],
+            "valleys": [{"time": float(t), "intensity": float(i)} for t, i in zip(valley_times, valley_intensities)],
+            "tension_releases": tension_drops,
+            "tension_buildups": tension_rises
+        },
+        "output_files": output_files,
+        "profile": profiler.report(output_path)
+    }
+    
+    # Save JSON report
+    json_path = output_path / "emotional_report.json"
+    with open(json_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved emotional analysis: {json_path}")
+    
+    return results
+
+def emotional_figure_arrays(rms_times, rms, intensity_smooth, intensity_gradient,
+                            peak_times, peak_intensities, valley_times, valley_intensities,
+                            tension_times, tension_normalized, consonance_timeline,
+                            onset_times, onset_env, decimate=False):
+    """
+    The timelines render_emotional_figure draws, each with its own times
+    
+    With decimate, every timeline is reduced to its min/max envelope at the
+    figure's pixel width; peak and valley markers are kept.
+    """
+    raw_times, smooth_times, gradient_times = rms_times, rms_times, rms_times
+    consonance_times = tension_times
+    if decimate:
+        raw_times, rms = decimate_line(rms_times, rms)
+        smooth_times, intensity_smooth = decimate_line(rms_times, intensity_smooth)
+        gradient_times, intensity_gradient = decimate_line(rms_times, intensity_gradient)
+        consonance_times, consonance_timeline = decimate_line(tension_times, consonance_timeline)
+        tension_times, tension_normalized = decimate_line(tension_times, tension_normalized)
+        onset_times, onset_env = decimate_line(onset_times, onset_env)
+    return {
+        "raw_times": raw_times, "rms": rms, "smooth_times": smooth_times, "intensity_smooth": intensity_smooth,
+        "gradient_times": gradient_times, "intensity_gradient": intensity_gradient,
+        "peak_times": peak_times, "peak_intensities": peak_intensities,
+        "valley_times": valley_times, "valley_intensities": valley_intensities,
+        "tension_times": tension_times, "tension_normalized": tension_normalized,
+        "consonance_times": consonance_times, "consonance_timeline": consonance_timeline,
+        "onset_times": onset_times, "onset_env": onset_env
+    }
+
+def render_emotional_figure(plot_path, raw_times, rms, smooth_times, intensity_smooth, gradient_times,
+                            intensity_gradient, peak_times, peak_intensities, valley_times, valley_intensities,
+                            tension_times, tension_normalized, consonance_times, consonance_timeline,
+                            onset_times, onset_env):
+    """
+    Draw the intensity, tension, gradient and flux panels to plot_path
+    from emotional_figure_arrays
+    """
+    fig, axes = plt.subplots(4, 1, figsize=FIGURE_SIZE)
     
     # Intensity over time
-    axes[0].plot(rms_times, rms, alpha=0.3, label='Raw Intensity', color='gray')
-    axes[0].plot(rms_times, intensity_smooth, label='Smoothed Intensity', color='blue', linewidth=2)
+    axes[0].plot(raw_times, rms, alpha=0.3, label='Raw Intensity', color='gray')
+    axes[0].plot(smooth_times, intensity_smooth, label='Smoothed Intensity', color='blue', linewidth=2)
     axes[0].scatter(peak_times, peak_intensities, color='red', s=100, zorder=5, label='Peaks', marker='^')
     axes[0].scatter(valley_times, valley_intensities, color='green', s=100, zorder=5, label='Valleys', marker='v')
     axes[0].set_title('Intensity Timeline (Emotional Energy)')
@@ -134,14 +230,14 @@ def analyze_emotional_cadence(audio_path, output_dir="emotional_analysis"):
     
     # Tension/Consonance over time
     axes[1].fill_between(tension_times, 0, tension_normalized, alpha=0.5, color='red', label='Tension')
-    axes[1].fill_between(tension_times, 0, consonance_timeline, alpha=0.5, color='green', label='Consonance')
+    axes[1].fill_between(consonance_times, 0, consonance_timeline, alpha=0.5, color='green', label='Consonance')
     axes[1].set_title('Tension vs Consonance (Harmonic Stability)')
     axes[1].set_ylabel('Level (0-1)')
     axes[1].legend()
     axes[1].grid(True, alpha=0.3)
     
     # Rate of change (emotional dynamics)
-    axes[2].plot(rms_times, intensity_gradient, color='purple', linewidth=1.5)
+    axes[2].plot(gradient_times, intensity_gradient, color='purple', linewidth=1.5)
     axes[2].axhline(y=0, color='black', linestyle='--', alpha=0.3)
     axes[2].set_title('Intensity Gradient (Rate of Emotional Change)')
     axes[2].set_ylabel('Gradient')
@@ -156,51 +252,58 @@ def analyze_emotional_cadence(audio_path, output_dir="emotional_analysis"):
     
     plt.tight_layout()
     
-    plot_path = output_path / "emotional_cadence.png"
-    plt.savefig(plot_path, dpi=150, bbox_inches='tight')
+    plt.savefig(plot_path, dpi=DPI, bbox_inches='tight')
     print(f"Saved emotional cadence plot: {plot_path}")
     plt.close()
+
+def smooth_intensity(rms):
+    """
+    RMS intensity smoothed for macro trends (Savitzky-Golay over about 1%
+    of the track)
+    """
+    window_size = max(3, len(rms) // 100)
+    if window_size % 2 == 0:
+        window_size += 1
+    return signal.savgol_filter(rms, window_size, 2)
+
+def intensity_thirds(intensity_smooth):
+    """
+    Mean intensity of the first, middle and last third of the track
+    """
+    n = len(intensity_smooth)
+    return (np.mean(intensity_smooth[:n//3]), np.mean(intensity_smooth[n//3:2*n//3]),
+            np.mean(intensity_smooth[2*n//3:]))
+
+def chroma_tension(chroma):
+    """
+    Per-frame harmonic tension from a chromagram
     
-    # 9. COMPILE RESULTS
-    results = {
-        "file": str(audio_path),
-        "duration_seconds": float(duration),
-        "emotional_arc": {
-            "type": arc_type,
-            "early_intensity": float(early_intensity),
-            "mid_intensity": float(mid_intensity),
-            "late_intensity": float(late_intensity)
-        },
-        "intensity_metrics": {
-            "mean": float(np.mean(intensity_smooth)),
-            "max": float(np.max(intensity_smooth)),
-            "min": float(np.min(intensity_smooth)),
-            "dynamic_range": float(np.max(intensity_smooth) - np.min(intensity_smooth)),
-            "variance": float(np.var(intensity_smooth))
-        },
-        "tension_metrics": {
-            "mean_tension": float(np.mean(tension_normalized)),
-            "max_tension": float(np.max(tension_normalized)),
-            "mean_consonance": float(np.mean(consonance_timeline))
-        },
-        "emotional_moments": {
-            "peaks": [{"time": float(t), "intensity": float(i)} for t, i in zip(peak_times, peak_intensities)],
-            "valleys": [{"time": float(t), "intensity": float(i)} for t, i in zip(valley_times, valley_intensities)],
-            "tension_releases": tension_drops[:10],  # Top 10
-            "tension_buildups": tension_rises[:10]    # Top 10
-        },
-        "output_files": {
-            "visualization": str(plot_path)
-        }
-    }
+    Variance across pitch classes indicates dissonance/tension and their
+    standard deviation the spread of energy across frequencies; the tension
+    metric is their product.
+    """
+    variance = np.var(chroma, axis=0)
+    spread = np.sqrt(variance)
+    return variance * spread
+
+def tension_transitions(tension_normalized, tension_times, threshold=0.15, limit=10):
+    """
+    Find the first significant frame-to-frame tension drops and rises
     
-    # Save JSON report
-    json_path = output_path / "emotional_report.json"
-    with open(json_path, 'w') as f:
-        json.dump(results, f, indent=2)
-    print(f"Saved emotional analysis: {json_path}")
+    Returns:
+        tuple: (releases, buildups), each a list of at most limit
+        {"time", "magnitude"} dicts in time order
+    """
+    change = np.diff(tension_normalized)
     
-    return results
+    def events(delta):
+        frames = np.flatnonzero(delta > threshold)[:limit]
+        return [
+            {"time": float(tension_times[i + 1]), "magnitude": float(delta[i])}
+            for i in frames
+        ]
+    
+    return events(-change), events(change)
 
 def classify_emotional_arc(early, mid, late):
     """
@@ -222,13 +325,16 @@ def classify_emotional_arc(early, mid, late):
         return "Complex/Variable (mixed patterns)"
 
 if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) < 2:
-        print("Usage: python emotional_cadence.py <audio_file> [output_dir]")
-        sys.exit(1)
-    
-    audio_file = sys.argv[1]
-    output_dir = sys.argv[2] if len(sys.argv) > 2 else "emotional_analysis"
-    
-    analyze_emotional_cadence(audio_file, output_dir)
+    parser = argparse.ArgumentParser(description="Emotional cadence analysis of an audio file")
+    parser.add_argument("audio_file")
+    parser.add_argument("output_dir", nargs="?", default="emotional_analysis")
+    add_feature_arguments(parser)
+    add_plot_arguments(parser)
+    add_export_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    
+    features = feature_store_from_args(args.audio_file, args, FEATURES)
+    analyze_emotional_cadence(args.audio_file, args.output_dir, features=features,
+                              plot=args.plots, decimate=args.decimate_plots, export=args.export_frames,
+                              profiler=profiler_from_args(args))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Feature Cache - Content-addressed on-disk store for intermediate audio features
+Keeps frame-level arrays as memory-mappable .npy files keyed by a hash of the
+audio content and the analysis parameters, so re-analyzing a known track
+skips the expensive feature extraction
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# Bump whenever a cached feature is computed differently, so stale entries are never reused
+FEATURE_VERSION = 1
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "mgi_features"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+class FeatureCache:
+    """
+    Size-bounded LRU cache of per-track feature arrays
+
+    Each entry is a directory named by its key holding one <feature>.npy per
+    cached array plus an info.json with track metadata. Reading an entry
+    refreshes its modification time; when the cache grows past max_bytes the
+    least recently used entries are removed.
+
+    Args:
+        cache_dir: Root directory of the cache
+        max_bytes: Upper bound on the total size of all entries
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def key(self, audio_path, **params):
+        """
+        Build the cache key for a track
+
+        The key covers the audio content (not its path or timestamps), every
+        analysis parameter passed in and FEATURE_VERSION.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        with open(audio_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        params = dict(params, version=FEATURE_VERSION)
+        digest.update(json.dumps(params, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def load(self, key, name):
+        """Return the cached array memory-mapped read-only, or None on a miss"""
+        path = self.cache_dir / key / f"{name}.npy"
+        try:
+            array = np.load(path, mmap_mode='r')
+        except (FileNotFoundError, ValueError):
+            return None
+        self._touch(key)
+        return array
+
+    def save(self, key, name, array):
+        """Atomically write one array into the entry and enforce the size bound"""
+        entry = self.cache_dir / key
+        entry.mkdir(exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=entry, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, entry / f"{name}.npy")
+        self.evict(keep=key)
+
+    def load_info(self, key):
+        """Return the cached track metadata dict, or None on a miss"""
+        try:
+            with open(self.cache_dir / key / "info.json") as f:
+                info = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        self._touch(key)
+        return info
+
+    def save_info(self, key, info):
+        """Atomically write the track metadata for an entry"""
+        entry = self.cache_dir / key
+        entry.mkdir(exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=entry, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(info, f)
+        os.replace(tmp_path, entry / "info.json")
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        total = 0
+        for entry in self.cache_dir.iterdir():
+            if not entry.is_dir():
+                continue
+            try:
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+            except FileNotFoundError:
+                continue  # Removed concurrently by another process
+            total += size
+
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            if entry.name == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def _touch(self, key):
+        try:
+            os.utime(self.cache_dir / key)
+        except FileNotFoundError:
+            pass
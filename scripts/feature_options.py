@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Feature Options - Command-line options shared by the analysis scripts
+Builds the right feature store (cached, streaming or plain) from parsed
+arguments so every script exposes the same switches
+"""
+
+from audio_decode import RESAMPLERS, DEFAULT_RESAMPLER, DECODERS
+from feature_store import FeatureStore, N_FFT
+from feature_cache import FeatureCache
+from pitch_track import PITCH_METHODS
+from streaming_store import StreamingFeatureStore
+
+# Analysis quality tiers: every setting that drives the cost of the shared
+# features, as FeatureStore arguments. standard is the stores' default;
+# fast halves the analysis rate and FFT size (the hop stays the stores'
+# 512 samples in every tier, so fast frames are twice as long in time) and
+# folds chroma from the existing STFT; accurate doubles the FFT size, runs
+# pYIN and takes chroma from the harmonic part of an HPSS split.
+# bench_quality.py measures what each tier costs and how far it moves every
+# reported metric.
+QUALITY_TIERS = {
+    "fast": {"analysis_sr": 22050, "n_fft": 1024, "chroma_method": "stft", "pitch_method": "peak",
+             "harmonic": False},
+    "standard": {"analysis_sr": None, "n_fft": N_FFT, "chroma_method": "cqt", "pitch_method": "peak",
+                 "harmonic": False},
+    "accurate": {"analysis_sr": None, "n_fft": 4096, "chroma_method": "cqt", "pitch_method": "pyin",
+                 "harmonic": True},
+}
+
+def add_feature_arguments(parser):
+    """Add the feature store options to an argparse parser"""
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--cache-dir", help="persist intermediate features in this directory and reuse them")
+    source.add_argument("--stream", action="store_true",
+                        help="read the audio in blocks so memory stays bounded on very long recordings")
+    parser.add_argument("--sr", type=int, dest="analysis_sr",
+                        help="analysis sample rate in Hz, e.g. 22050 (default: the file's native rate)")
+    parser.add_argument("--resampler", choices=tuple(RESAMPLERS), default=DEFAULT_RESAMPLER,
+                        help="resampler quality used with --sr")
+    parser.add_argument("--decoder", choices=DECODERS, default="auto",
+                        help="audio decoder (auto: libsndfile, falling back to audioread)")
+    parser.add_argument("--pitch", choices=PITCH_METHODS, dest="pitch_method",
+                        help="pitch tracker (peak: dominant spectral peak; pyin: slower, more accurate "
+                             "pYIN run over chunks, in parallel with --segment-workers; default: the quality tier's)")
+    parser.add_argument("--quality", choices=tuple(QUALITY_TIERS), default="standard",
+                        help="analysis quality tier: analysis rate, FFT size, chroma transform, pitch "
+                             "tracker and HPSS together (--sr and --pitch override the tier's)")
+    parser.add_argument("--segment-workers", type=int, default=1, metavar="N",
+                        help="split long tracks into overlapping one-minute segments and compute the STFT, "
+                             "constant-Q chroma, HPSS and pYIN chunks across N processes (0: every available core)")
+
+def build_feature_store(audio_path, cache_dir=None, stream=False, analysis_sr=None,
+                        resampler=DEFAULT_RESAMPLER, decoder="auto", wanted=None, pitch_method=None,
+                        quality="standard", segment_workers=1):
+    """
+    Build a feature store for one track
+
+    wanted names the features the caller will use, so streaming mode only
+    computes those. quality selects a QUALITY_TIERS entry; analysis_sr and
+    pitch_method, when given, override the tier's. segment_workers=0 uses
+    every available core. Streaming reads the file natively in blocks, so
+    it cannot be combined with a cache, an analysis rate, another decoder,
+    pYIN or segments, which need the whole signal, or a tier other than
+    standard.
+    """
+    if quality not in QUALITY_TIERS:
+        raise ValueError(f"Unknown quality tier '{quality}' (expected one of {', '.join(QUALITY_TIERS)})")
+    settings = dict(QUALITY_TIERS[quality])
+    if analysis_sr:
+        settings["analysis_sr"] = analysis_sr
+    if pitch_method:
+        settings["pitch_method"] = pitch_method
+    if stream:
+        if (cache_dir or analysis_sr or decoder != "auto" or settings != QUALITY_TIERS["standard"]
+                or segment_workers != 1):
+            raise ValueError("streaming cannot be combined with a cache directory, analysis rate, decoder choice, "
+                             "pYIN pitch, segment workers or a quality tier other than standard")
+        return StreamingFeatureStore(audio_path, wanted=wanted)
+    cache = FeatureCache(cache_dir) if cache_dir else None
+    return FeatureStore(audio_path, cache=cache, resampler=resampler, decoder=decoder,
+                        segment_workers=segment_workers or None, **settings)
+
+def feature_store_from_args(audio_path, args, wanted=None):
+    """Build the feature store selected by the parsed options"""
+    return build_feature_store(audio_path, args.cache_dir, args.stream, args.analysis_sr,
+                               args.resampler, args.decoder, wanted=wanted, pitch_method=args.pitch_method,
+                               quality=args.quality, segment_workers=args.segment_workers)
+
+def feature_script_args(cache_dir=None, stream=False, analysis_sr=None, resampler=DEFAULT_RESAMPLER, decoder="auto",
+                        pitch_method=None, quality="standard", segment_workers=1):
+    """Command-line switches that reproduce these options in an analysis script"""
+    script_args = []
+    if cache_dir:
+        script_args += ["--cache-dir", str(cache_dir)]
+    if stream:
+        script_args += ["--stream"]
+    if analysis_sr:
+        script_args += ["--sr", str(analysis_sr), "--resampler", resampler]
+    if decoder != "auto":
+        script_args += ["--decoder", decoder]
+    if pitch_method:
+        script_args += ["--pitch", pitch_method]
+    if quality != "standard":
+        script_args += ["--quality", quality]
+    if segment_workers != 1:
+        script_args += ["--segment-workers", str(segment_workers)]
+    return script_args
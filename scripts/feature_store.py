@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Feature Store - Shared per-track audio features
+Declares the features the analyzers consume as a dependency graph whose nodes
+are evaluated lazily and memoized, so a track is decoded once, each shared
+feature is computed once, and features no analyzer asks for cost nothing
+"""
+
+import librosa
+import numpy as np
+from functools import cached_property, partial
+
+from audio_decode import decode_audio, DEFAULT_RESAMPLER
+from band_energy import BAND_NAMES, band_energies
+from pitch_track import PITCH_METHODS, peak_pitch, pyin_pitch, spectral_tuning
+from segment_parallel import (
+    CHROMA_BINS_PER_OCTAVE, HPSS_HOP_LENGTH, parallel_frames, parallel_samples,
+    stft_magnitude, stft_margin, cqt_chroma, cqt_margin, harmonic_percussive, hpss_margin
+)
+from stage_profile import profile_stage
+from tempogram import local_tempo
+
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MFCC = 20
+
+# Chromagram transforms: constant-Q from the signal, or folded from the STFT
+CHROMA_METHODS = ("cqt", "stft")
+
+class feature:
+    """
+    Declare a node of the feature graph
+
+    The decorated method receives the store followed by the values of the
+    nodes named in requires, in order. persist=True marks frame-level arrays
+    that are stored in the FeatureCache when the store has one.
+    """
+
+    def __init__(self, *requires, persist=False):
+        self.requires = requires
+        self.persist = persist
+
+    def __call__(self, compute):
+        self.compute = compute
+        self.__doc__ = compute.__doc__
+        return self
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        if "GRAPH" not in owner.__dict__:
+            owner.GRAPH = {}
+        owner.GRAPH[name] = self
+
+    def __get__(self, store, owner=None):
+        if store is None:
+            return self
+        return store.get(self.name)
+
+class FeatureStore:
+    """
+    Lazily computed, memoized features for a single audio file
+
+    Each feature is computed the first time an analyzer asks for it and
+    reused by every later analyzer working on the same track. With a
+    FeatureCache, persisted features are loaded from disk before their
+    inputs are touched, so the audio is only decoded when something is
+    missing from the cache. While profiler is set to a StageProfiler, each
+    feature computation is measured as a stage named after the feature.
+
+    Args:
+        audio_path: Path to audio file
+        hop_length: Hop size in samples shared by all frame-level features
+        cache: Optional FeatureCache for persisting features across runs
+        analysis_sr: Sample rate the track is resampled to before analysis
+            (default: its native rate)
+        resampler: Resampler quality used when analysis_sr differs from the
+            native rate (see audio_decode.RESAMPLERS)
+        decoder: Decoder selection passed to audio_decode.decode_audio
+        pitch_method: "peak" for the dominant spectral peak, "pyin" for
+            chunk-parallel pYIN (see pitch_track.PITCH_METHODS)
+        n_fft: FFT size of the spectrogram and window of the framed features
+        chroma_method: "cqt" for the constant-Q chromagram, "stft" to fold
+            the existing spectrogram into pitch classes instead
+        harmonic: Compute the constant-Q chromagram from the harmonic
+            component of an HPSS split, so drums do not smear it
+        segment_workers: Processes the STFT, constant-Q chroma and HPSS of
+            a long track are split across, in overlapping one-minute
+            segments (see segment_parallel.py), and pYIN's chunks; None for
+            every available core, 1 to compute them in this process
+    """
+
+    def __init__(self, audio_path, hop_length=HOP_LENGTH, cache=None, analysis_sr=None,
+                 resampler=DEFAULT_RESAMPLER, decoder="auto", pitch_method="peak", n_fft=N_FFT,
+                 chroma_method="cqt", harmonic=False, segment_workers=1):
+        if pitch_method not in PITCH_METHODS:
+            raise ValueError(f"Unknown pitch method '{pitch_method}' (expected one of {', '.join(PITCH_METHODS)})")
+        if chroma_method not in CHROMA_METHODS:
+            raise ValueError(f"Unknown chroma method '{chroma_method}' (expected one of {', '.join(CHROMA_METHODS)})")
+        if harmonic and chroma_method != "cqt":
+            raise ValueError("the harmonic chromagram is a constant-Q chromagram")
+        self.audio_path = audio_path
+        self.hop_length = hop_length
+        self.n_fft = n_fft
+        self.cache = cache
+        self.analysis_sr = analysis_sr
+        self.resampler = resampler
+        self.decoder = decoder
+        self.pitch_method = pitch_method
+        self.chroma_method = chroma_method
+        self.harmonic = harmonic
+        self.segment_workers = segment_workers
+        # Nodes answered by another node under the selected options
+        self.aliases = {}
+        if pitch_method == "pyin":
+            self.aliases["pitch_track"] = "pyin_track"
+        if chroma_method == "stft":
+            self.aliases["chroma"] = "stft_chroma"
+        elif harmonic:
+            self.aliases["chroma"] = "harmonic_chroma"
+        self.profiler = None
+        self.computed = []
+        self._values = {}
+
+    def get(self, name):
+        """Evaluate a feature and its missing inputs, memoizing the result"""
+        name = self.aliases.get(name, name)
+        if name not in self._values:
+            node = self.GRAPH[name]
+            value = None
+            if node.persist and self.cache is not None:
+                value = self.cache.load(self.cache_key, name)
+            if value is None:
+                inputs = [self.get(dep) for dep in node.requires]
+                with profile_stage(self.profiler, name):
+                    value = node.compute(self, *inputs)
+                self.computed.append(name)
+                if node.persist and self.cache is not None:
+                    self.cache.save(self.cache_key, name, value)
+            self._values[name] = value
+        return self._values[name]
+
+    def pending(self, names):
+        """Names of the features that evaluating names would still have to touch"""
+        needed = set()
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            name = self.aliases.get(name, name)
+            if name in needed:
+                continue
+            needed.add(name)
+            if name not in self._values:
+                stack.extend(self.GRAPH[name].requires)
+        return needed
+
+    def release(self, keep=()):
+        """
+        Drop memoized features that are not needed to produce keep
+
+        Used between analyzers so intermediate values (e.g. the decoded
+        signal once every consumer of it has run) do not stay resident.
+        """
+        needed = self.pending(keep)
+        for name in list(self._values):
+            if name not in needed:
+                del self._values[name]
+
+    @cached_property
+    def cache_key(self):
+        params = {"sr": self.analysis_sr, "n_fft": self.n_fft, "hop_length": self.hop_length}
+        if self.analysis_sr is not None:
+            params["resampler"] = self.resampler
+        if self.decoder != "auto":
+            params["decoder"] = self.decoder
+        if self.pitch_method != "peak":
+            params["pitch"] = self.pitch_method
+        # Results the callers persist under this key (e.g. track descriptors)
+        # mix in whichever chroma the options select
+        if self.chroma_method != "cqt":
+            params["chroma"] = self.chroma_method
+        if self.harmonic:
+            params["harmonic"] = True
+        return self.cache.key(self.audio_path, **params)
+
+    @cached_property
+    def info(self):
+        """Sample rate and length in samples, read from the cache when possible"""
+        if self.cache is not None:
+            info = self.cache.load_info(self.cache_key)
+            if info is not None:
+                return info
+        y, sr = self.audio
+        info = {"sr": int(sr), "n_samples": len(y)}
+        if self.cache is not None:
+            self.cache.save_info(self.cache_key, info)
+        return info
+
+    @property
+    def sr(self):
+        return self.info["sr"]
+
+    @property
+    def duration(self):
+        return self.info["n_samples"] / self.sr
+
+    @feature()
+    def audio(self):
+        """Decoded mono signal and its sample rate"""
+        return decode_audio(self.audio_path, sr=self.analysis_sr, resampler=self.resampler, decoder=self.decoder)
+
+    @feature("audio")
+    def y(self, audio):
+        """Decoded mono signal"""
+        return audio[0]
+
+    @feature("y", persist=True)
+    def magnitude(self, y):
+        """STFT magnitude spectrogram"""
+        return parallel_frames(partial(stft_magnitude, n_fft=self.n_fft, hop_length=self.hop_length), y, self.sr,
+                               self.hop_length, stft_margin(self.n_fft, self.hop_length), self.segment_workers)
+
+    @feature("magnitude")
+    def mel_db(self, magnitude):
+        """Log-power mel spectrogram shared by both onset envelopes"""
+        return librosa.power_to_db(librosa.feature.melspectrogram(S=magnitude ** 2, sr=self.sr, n_fft=self.n_fft))
+
+    @feature("mel_db", persist=True)
+    def onset_env(self, mel_db):
+        """Onset strength envelope (spectral flux)"""
+        return librosa.onset.onset_strength(S=mel_db, sr=self.sr, hop_length=self.hop_length)
+
+    @feature("mel_db", persist=True)
+    def mfcc(self, mel_db):
+        """Mel-frequency cepstral coefficients (timbre), N_MFCC per frame"""
+        return librosa.feature.mfcc(S=mel_db, n_mfcc=N_MFCC)
+
+    @feature("y", persist=True)
+    def rms(self, y):
+        """Frame-level RMS energy"""
+        return librosa.feature.rms(y=y, hop_length=self.hop_length)[0]
+
+    @feature("magnitude")
+    def chroma_tuning(self, magnitude):
+        """
+        Tuning of the constant-Q chromagram from the spectrogram's peaks;
+        with the default FFT size, exactly what chroma_cqt would estimate
+        from a second STFT of the signal
+        """
+        return spectral_tuning(magnitude, self.sr, self.n_fft, bins_per_octave=CHROMA_BINS_PER_OCTAVE)
+
+    @feature("y", "chroma_tuning", persist=True)
+    def chroma(self, y, chroma_tuning):
+        """Constant-Q chromagram (pitch classes)"""
+        return parallel_frames(partial(cqt_chroma, sr=self.sr, hop_length=self.hop_length, tuning=chroma_tuning), y,
+                               self.sr, self.hop_length, cqt_margin(self.sr, self.hop_length), self.segment_workers)
+
+    @feature("magnitude", "pitch_track", persist=True)
+    def stft_chroma(self, magnitude, pitch_track):
+        """
+        Chromagram folded from the STFT (chroma when chroma_method="stft"),
+        tuned from the pitch track instead of a second piptrack pass
+        """
+        pitches = pitch_track[0][pitch_track[0] > 0]
+        tuning = librosa.pitch_tuning(pitches) if pitches.size else 0.0
+        return librosa.feature.chroma_stft(S=magnitude ** 2, sr=self.sr, n_fft=self.n_fft,
+                                           hop_length=self.hop_length, tuning=tuning)
+
+    @feature("hpss")
+    def harmonic_tuning(self, hpss):
+        """
+        Tuning of the harmonic chromagram: what chroma_cqt would estimate
+        from the harmonic component, i.e. from the peaks of its STFT at
+        estimate_tuning's FFT size and hop
+        """
+        magnitude = parallel_frames(partial(stft_magnitude, n_fft=N_FFT, hop_length=N_FFT // 4), hpss[0], self.sr,
+                                    N_FFT // 4, stft_margin(N_FFT, N_FFT // 4), self.segment_workers)
+        return spectral_tuning(magnitude, self.sr, N_FFT, bins_per_octave=CHROMA_BINS_PER_OCTAVE)
+
+    @feature("hpss", "harmonic_tuning", persist=True)
+    def harmonic_chroma(self, hpss, harmonic_tuning):
+        """Constant-Q chromagram of the harmonic component (chroma when harmonic=True)"""
+        return parallel_frames(partial(cqt_chroma, sr=self.sr, hop_length=self.hop_length, tuning=harmonic_tuning),
+                               hpss[0], self.sr, self.hop_length, cqt_margin(self.sr, self.hop_length),
+                               self.segment_workers)
+
+    @feature("magnitude", persist=True)
+    def pitch_track(self, magnitude):
+        """Dominant spectral peak per frame: pitch in Hz and its confidence (see pitch_track.peak_pitch)"""
+        return peak_pitch(magnitude, self.sr, self.n_fft)
+
+    @feature("y", persist=True)
+    def pyin_track(self, y):
+        """pYIN pitch per frame in Hz and its voicing probability (pitch_track when pitch_method="pyin")"""
+        return pyin_pitch(y, self.sr, self.n_fft, self.hop_length, workers=self.segment_workers)
+
+    @feature("pitch_track", persist=True)
+    def pitch_timeline(self, pitch_track):
+        """Dominant pitch per frame in Hz (0 where no pitch was found)"""
+        return pitch_track[0]
+
+    @feature("magnitude", persist=True)
+    def spectral_centroid(self, magnitude):
+        """Spectral centroid per frame in Hz (brightness)"""
+        return librosa.feature.spectral_centroid(S=magnitude, sr=self.sr, n_fft=self.n_fft,
+                                                 hop_length=self.hop_length)[0]
+
+    @feature("magnitude", persist=True)
+    def spectral_rolloff(self, magnitude):
+        """Frequency below which 85% of each frame's energy lies"""
+        return librosa.feature.spectral_rolloff(S=magnitude, sr=self.sr, n_fft=self.n_fft,
+                                                hop_length=self.hop_length)[0]
+
+    @feature("magnitude", persist=True)
+    def spectral_bandwidth(self, magnitude):
+        """Spectral bandwidth per frame in Hz"""
+        return librosa.feature.spectral_bandwidth(S=magnitude, sr=self.sr, n_fft=self.n_fft,
+                                                  hop_length=self.hop_length)[0]
+
+    @feature("y", persist=True)
+    def zero_crossing_rate(self, y):
+        """Fraction of zero crossings per frame"""
+        return librosa.feature.zero_crossing_rate(y, frame_length=self.n_fft, hop_length=self.hop_length)[0]
+
+    @feature("mel_db", persist=True)
+    def beat_onset_env(self, mel_db):
+        """Median-aggregated onset envelope used for beat tracking"""
+        return librosa.onset.onset_strength(S=mel_db, sr=self.sr, hop_length=self.hop_length, aggregate=np.median)
+
+    @feature("beat_onset_env")
+    def beat_track(self, beat_onset_env):
+        """Global tempo estimate and beat frame indices"""
+        return librosa.beat.beat_track(onset_envelope=beat_onset_env, sr=self.sr, hop_length=self.hop_length)
+
+    @feature("beat_onset_env", persist=True)
+    def local_tempo(self, beat_onset_env):
+        """Per-frame tempo in BPM and its tempogram confidence, from the beat tracker's onset envelope"""
+        return local_tempo(beat_onset_env, self.sr, self.hop_length)
+
+    @feature("magnitude", persist=True)
+    def band_energies(self, magnitude):
+        """Mean magnitude per frame of every band_energy.BANDS band, rows in BAND_NAMES order"""
+        return band_energies(magnitude, self.sr, self.n_fft)
+
+    @feature("band_energies", persist=True)
+    def sibilant_energy(self, band_energies):
+        """Mean magnitude in the sibilant band (s, sh, z, ch)"""
+        return band_energies[BAND_NAMES.index("sibilant")]
+
+    @feature("band_energies", persist=True)
+    def fricative_energy(self, band_energies):
+        """Mean magnitude in the fricative band (f, v, th, h)"""
+        return band_energies[BAND_NAMES.index("fricative")]
+
+    @feature("band_energies", persist=True)
+    def nasal_energy(self, band_energies):
+        """Mean magnitude in the nasal/liquid band (m, n, l, r)"""
+        return band_energies[BAND_NAMES.index("nasal")]
+
+    @feature("y")
+    def hpss(self, y):
+        """Harmonic and percussive components of the signal, stacked as (2, samples)"""
+        return parallel_samples(harmonic_percussive, y, self.sr, HPSS_HOP_LENGTH, hpss_margin(), self.segment_workers)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Frame Export - Columnar per-frame sidecars for the analysis reports
+Writes every frame-level timeline an analyzer computes as typed float32
+columns on a shared time axis, so downstream tools can read the full
+timelines without re-running the analysis or parsing large JSON
+"""
+
+import struct
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+EXPORT_FORMATS = ("npz", "parquet")
+
+# Chromagram rows, used to name the per-pitch-class columns
+PITCH_CLASSES = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+
+# Local file header of a zip member: fixed part, then name and extra field
+_ZIP_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+def frame_columns(times, **columns):
+    """
+    Float32 columns truncated to the length of the shortest one
+
+    Returns:
+        dict: "time" followed by the given columns, all the same length
+    """
+    n = min(len(times), *(len(values) for values in columns.values()))
+    table = {"time": np.asarray(times[:n], dtype=np.float32)}
+    for name, values in columns.items():
+        table[name] = np.asarray(values[:n], dtype=np.float32)
+    return table
+
+def frame_flags(n_frames, indices):
+    """1.0 at the given frame indices and 0.0 elsewhere"""
+    flags = np.zeros(n_frames, dtype=np.float32)
+    flags[indices] = 1
+    return flags
+
+def write_frames(path, table, fmt="npz"):
+    """
+    Write a frame table next to a report
+
+    npz archives are stored uncompressed so load_frames can memory-map each
+    column in place. parquet needs pyarrow.
+
+    Args:
+        path: Output path without extension
+        table: Column name -> 1-D array, as built by frame_columns
+        fmt: "npz" or "parquet"
+
+    Returns:
+        str: Path of the written file
+    """
+    if fmt == "npz":
+        path = Path(path).with_suffix(".npz")
+        np.savez(path, **table)
+    elif fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export needs pyarrow (pip install pyarrow); use the npz format otherwise")
+        path = Path(path).with_suffix(".parquet")
+        pq.write_table(pa.table(table), path, compression="none")
+    else:
+        raise ValueError(f"Unknown export format '{fmt}', expected one of {EXPORT_FORMATS}")
+    print(f"Saved frame-level features: {path}")
+    return str(path)
+
+def load_frames(path):
+    """
+    Load a frame table written by write_frames
+
+    Columns of an npz sidecar are read-only memory maps into the archive,
+    so opening even a multi-hour table reads nothing until a column is
+    used. Parquet columns are returned as arrays backed by pyarrow's
+    buffers without an extra copy.
+
+    Returns:
+        dict: Column name -> 1-D array
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, memory_map=True)
+        return {name: table[name].to_numpy() for name in table.column_names}
+
+    columns = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as raw:
+        for info in archive.infolist():
+            name = info.filename[:-len(".npy")]
+            if info.compress_type != zipfile.ZIP_STORED:
+                columns[name] = np.load(archive.open(info))  # Compressed by some other writer
+                continue
+            raw.seek(info.header_offset)
+            fields = _ZIP_LOCAL_HEADER.unpack(raw.read(_ZIP_LOCAL_HEADER.size))
+            raw.seek(fields[-2] + fields[-1], 1)  # Skip the member name and extra field
+            version = np.lib.format.read_magic(raw)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(raw)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(raw)
+            columns[name] = np.memmap(path, dtype=dtype, mode="r", shape=shape,
+                                      order="F" if fortran_order else "C", offset=raw.tell())
+    return columns
+
+def add_export_arguments(parser):
+    """Add the frame export option to an argparse parser"""
+    parser.add_argument("--export-frames", choices=EXPORT_FORMATS,
+                        help="also write every per-frame timeline as a columnar sidecar next to the report")
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Keyscape - Multi-scale key strength of a track
+Correlates the summed beat-synchronous chroma of every window, from a single
+beat up to the whole piece, with the 24 major and minor key profiles, and
+draws the resulting CHARM-style keyscape triangle. Window sums come from
+prefix sums, so each row of the triangle costs O(beats)
+"""
+
+import json
+import argparse
+from pathlib import Path
+
+import librosa
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.colors import hsv_to_rgb
+from matplotlib.patches import Patch
+
+from feature_store import FeatureStore
+from frame_export import PITCH_CLASSES
+from plot_rendering import FIGURE_SIZE, DPI, PLOT_WIDTH, plot_mode, emit_figure, add_plot_arguments
+from stage_profile import StageProfiler, add_profile_arguments, profiler_from_args
+
+# Shared features consumed by analyze_keyscape
+FEATURES = ("chroma", "beat_track")
+
+# Krumhansl-Kessler probe-tone profiles, tonic first
+MAJOR_PROFILE = (6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88)
+MINOR_PROFILE = (6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17)
+
+KEY_NAMES = tuple(f"{pc} major" for pc in PITCH_CLASSES) + tuple(f"{pc} minor" for pc in PITCH_CLASSES)
+
+# Rows of the triangle; a track with fewer beats gets every window length
+DEFAULT_LEVELS = 256
+
+# Frames per column when no beats are found (about half a second at 44.1 kHz)
+FALLBACK_COLUMN_FRAMES = 43
+
+def key_templates():
+    """
+    The 24 key profiles rotated to each tonic, majors then minors
+
+    Returns:
+        np.ndarray: (24, 12) zero-mean, unit-norm rows, so a dot product
+        with a zero-mean, unit-norm chroma vector is their Pearson correlation
+    """
+    templates = np.array([np.roll(profile, tonic) for profile in (MAJOR_PROFILE, MINOR_PROFILE)
+                          for tonic in range(12)])
+    templates -= templates.mean(axis=1, keepdims=True)
+    return templates / np.linalg.norm(templates, axis=1, keepdims=True)
+
+def beat_columns(features, data):
+    """
+    Average frame-level rows between consecutive beats
+
+    Falls back to fixed FALLBACK_COLUMN_FRAMES columns when the track has
+    fewer than two beats.
+
+    Returns:
+        tuple: (rows, columns) beat-synchronous data and the start time of
+        each column plus the end time of the last
+    """
+    n_frames = data.shape[-1]
+    _, beats = features.beat_track
+    if len(beats) < 2:
+        beats = np.arange(0, n_frames, FALLBACK_COLUMN_FRAMES)
+    boundaries = librosa.util.fix_frames(beats, x_min=0, x_max=n_frames)
+    synced = librosa.util.sync(data, boundaries, aggregate=np.mean, pad=False)
+    times = librosa.frames_to_time(boundaries, sr=features.sr, hop_length=features.hop_length)
+    return synced, times
+
+def scape_levels(n, levels=DEFAULT_LEVELS):
+    """
+    Window lengths of the rows of a scape over n columns
+
+    Every length from 1 to n when that is at most levels rows, otherwise
+    levels lengths spaced evenly from 1 to n.
+    """
+    if n <= levels:
+        return np.arange(1, n + 1)
+    return np.unique(np.linspace(1, n, levels).round().astype(int))
+
+def prefix_sums(values):
+    """Cumulative sums along the last axis, with a leading zero column"""
+    values = np.asarray(values, dtype=np.float64)
+    zero = np.zeros(values.shape[:-1] + (1,))
+    return np.concatenate([zero, np.cumsum(values, axis=-1)], axis=-1)
+
+def window_sums(prefix, length):
+    """Sums of every window of length columns, from prefix_sums output"""
+    return prefix[..., length:] - prefix[..., :-length]
+
+def keyscape(chroma, levels=DEFAULT_LEVELS):
+    """
+    Strongest key and its correlation for every window of a chromagram
+
+    Window w of length L is placed at the column of its center,
+    w + (L - 1) // 2, so the rows of the result form the keyscape triangle.
+
+    Args:
+        chroma: (12, n) chroma, usually beat-synchronous
+        levels: Maximum number of window lengths (rows)
+
+    Returns:
+        tuple: (lengths, key, strength) with key an int8 (rows, n) index
+        into KEY_NAMES (-1 outside the triangle or for silent windows) and
+        strength the float16 correlation of that key
+    """
+    n = chroma.shape[1]
+    prefix = prefix_sums(chroma)
+    templates = key_templates()
+    lengths = scape_levels(n, levels)
+    key = np.full((len(lengths), n), -1, dtype=np.int8)
+    strength = np.zeros((len(lengths), n), dtype=np.float16)
+
+    for row, length in enumerate(lengths):
+        sums = window_sums(prefix, length)
+        sums -= sums.mean(axis=0)
+        norms = np.linalg.norm(sums, axis=0)
+        correlations = templates @ (sums / np.where(norms > 0, norms, 1))
+        best = correlations.argmax(axis=0)
+        offset = (length - 1) // 2
+        columns = slice(offset, offset + len(best))
+        key[row, columns] = np.where(norms > 0, best, -1)
+        strength[row, columns] = correlations[best, np.arange(len(best))]
+    return lengths, key, strength
+
+def key_colors(key, strength):
+    """
+    RGB image of a keyscape
+
+    Hue follows the circle of fifths, minor keys share the hue of their
+    relative major at lower brightness, and saturation grows with the
+    key's correlation; cells outside the triangle are white.
+    """
+    tonic = np.where(key >= 12, (key.astype(int) + 3) % 12, key.astype(int) % 12)
+    hue = (tonic * 7 % 12) / 12
+    value = np.where(key >= 12, 0.65, 1.0)
+    saturation = 0.25 + 0.75 * np.clip(strength.astype(np.float64), 0, 1)
+    rgb = hsv_to_rgb(np.stack([hue, saturation, value], axis=-1))
+    rgb[key < 0] = 1.0
+    return rgb
+
+def render_keyscape_figure(plot_path, lengths, key, strength, times, decimate=False):
+    """Draw the keyscape triangle to plot_path"""
+    if decimate and key.shape[1] > PLOT_WIDTH:
+        # Keys are categorical, so thin the columns instead of pooling them
+        step = -(-key.shape[1] // PLOT_WIDTH)
+        key, strength = key[:, ::step], strength[:, ::step]
+    fig, ax = plt.subplots(figsize=(FIGURE_SIZE[0], FIGURE_SIZE[1] / 2))
+    ax.imshow(key_colors(key, strength), origin='lower', aspect='auto', interpolation='nearest',
+              extent=[times[0], times[-1], 0, len(lengths)])
+    ticks = np.linspace(0, len(lengths) - 1, min(6, len(lengths))).round().astype(int)
+    ax.set_yticks(ticks + 0.5)
+    ax.set_yticklabels([str(lengths[tick]) for tick in ticks])
+    ax.set_xlabel('Time (s)')
+    ax.set_ylabel('Window (beats)')
+    ax.set_title('Keyscape')
+
+    present = np.bincount(key[key >= 0].astype(int), minlength=len(KEY_NAMES))
+    shown = [index for index in np.argsort(-present)[:12] if present[index]]
+    legend_colors = key_colors(np.array(shown, dtype=np.int8), np.ones(len(shown)))
+    ax.legend(handles=[Patch(color=color, label=KEY_NAMES[index]) for index, color in zip(shown, legend_colors)],
+              loc='upper left', bbox_to_anchor=(1.01, 1), fontsize=8)
+    plt.tight_layout()
+    plt.savefig(plot_path, dpi=DPI, bbox_inches='tight')
+    print(f"Saved keyscape: {plot_path}")
+    plt.close()
+
+def analyze_keyscape(audio_path, output_dir="keyscape_analysis", features=None, levels=DEFAULT_LEVELS, plot=True,
+                     decimate=False, profiler=None):
+    """
+    Build the keyscape of an audio file
+
+    Args:
+        audio_path: Path to audio file
+        output_dir: Directory to save outputs
+        features: Optional FeatureStore shared with other analyzers of the same track
+        levels: Maximum number of window lengths (rows of the triangle)
+        plot: True/"inline" to render the keyscape, "deferred" to save its
+            arrays for plot_rendering.py, False/"none" to skip it
+        decimate: Thin the keyscape's columns to the figure's pixel width
+        profiler: Optional StageProfiler that measures the analysis; its
+            stages are added to the report's profile section
+
+    Returns:
+        dict: Whole-piece key, share of the triangle held by each key, and
+        the output files
+    """
+    output_path = Path(output_dir)
+    output_path.mkdir(exist_ok=True)
+
+    if features is None:
+        features = FeatureStore(audio_path)
+    if profiler is None:
+        profiler = StageProfiler()
+    features.profiler = profiler
+
+    print(f"Building keyscape: {audio_path}")
+
+    # 1. BEAT-SYNCHRONOUS CHROMA
+    chroma, times = beat_columns(features, features.chroma)
+
+    # 2. KEY STRENGTH AT EVERY SCALE
+    with profiler.stage("keyscape"):
+        lengths, key, strength = keyscape(chroma, levels)
+
+    # 3. OUTPUT
+    data_path = output_path / "keyscape.npz"
+    np.savez(data_path, lengths=lengths, key=key, strength=strength, times=times,
+             key_names=np.array(KEY_NAMES))
+    output_files = {"data": str(data_path)}
+    if plot_mode(plot) != "none":
+        with profiler.stage("plot"):
+            output_files["keyscape"] = emit_figure(
+                render_keyscape_figure, output_path / "keyscape.png", plot, decimate,
+                lengths=lengths, key=key, strength=strength, times=times
+            )
+
+    # The apex of the triangle is the whole piece
+    apex = key[-1][key[-1] >= 0]
+    cells = key[key >= 0].astype(int)
+    share = np.bincount(cells, minlength=len(KEY_NAMES)) / max(len(cells), 1)
+    results = {
+        "file": str(audio_path),
+        "duration_seconds": float(features.duration),
+        "columns": int(chroma.shape[1]),
+        "levels": int(len(lengths)),
+        "global_key": {
+            "key": KEY_NAMES[int(apex[0])] if len(apex) else None,
+            "strength": float(strength[-1][key[-1] >= 0][0]) if len(apex) else None
+        },
+        "key_share": {KEY_NAMES[index]: float(share[index]) for index in np.argsort(-share)[:5] if share[index]},
+        "output_files": output_files,
+        "profile": profiler.report(output_path)
+    }
+
+    json_path = output_path / "keyscape_report.json"
+    with open(json_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved keyscape analysis: {json_path}")
+
+    return results
+
+if __name__ == "__main__":
+    from feature_options import add_feature_arguments, feature_store_from_args
+
+    parser = argparse.ArgumentParser(description="Multi-scale keyscape of an audio file")
+    parser.add_argument("audio_file")
+    parser.add_argument("output_dir", nargs="?", default="keyscape_analysis")
+    parser.add_argument("--levels", type=int, default=DEFAULT_LEVELS,
+                        help=f"maximum number of window lengths (default: {DEFAULT_LEVELS})")
+    add_feature_arguments(parser)
+    add_plot_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    features = feature_store_from_args(args.audio_file, args, FEATURES)
+    analyze_keyscape(args.audio_file, args.output_dir, features=features, levels=args.levels,
+                     plot=args.plots, decimate=args.decimate_plots, profiler=profiler_from_args(args))
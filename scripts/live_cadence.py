@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Live Cadence - Online emotional cadence over streaming audio
+Reads PCM continuously from stdin, a FIFO or a local socket, follows
+intensity and harmonic tension with causal smoothing and running
+normalization, and prints intensity peaks, valleys and tension releases and
+buildups as JSON lines, analyzing every hop within a fixed processing budget
+"""
+
+import sys
+import json
+import time
+import wave
+import socket
+import argparse
+from collections import deque
+
+import librosa
+import numpy as np
+
+from emotional_cadence import chroma_tension
+
+HOP_LENGTH = 512
+N_FFT = 2048
+
+# Time constant of the causal intensity smoothing
+DEFAULT_SMOOTHING_SECONDS = 1.0
+
+# Intensity and tension are normalized by their range over this much history
+DEFAULT_WINDOW_SECONDS = 30.0
+
+# Events in the first seconds of a stream are dropped: the smoothed intensity
+# still carries its starting value and the running ranges hold so little
+# history that any ripple spans them. Two smoothing time constants leave
+# the start a weight of e^-2.
+DEFAULT_WARMUP_SECONDS = 2.0
+
+# A turn in intensity must move this fraction of the running range to count
+DEFAULT_HYSTERESIS = 0.1
+
+# Peaks must reach this normalized level and valleys stay below its mirror,
+# the online stand-in for the offline 75th/25th percentile heights
+PEAK_LEVEL = 0.6
+
+# Change in normalized tension that makes a release or buildup (as offline)
+DEFAULT_TENSION_THRESHOLD = 0.15
+
+# Events of one type are at least this far apart (the offline peak distance)
+MIN_EVENT_SECONDS = 1.0
+
+DEFAULT_BUDGET_MS = 100.0
+
+RAW_FORMATS = {"s16le": np.dtype("<i2"), "s32le": np.dtype("<i4"), "f32le": np.dtype("<f4")}
+
+class RunningRange:
+    """
+    Minimum and maximum of the last size values
+
+    Monotonic queues make each update O(1) amortized, so the normalization
+    window can span minutes of frames.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.count = 0
+        self._low = deque()
+        self._high = deque()
+
+    def update(self, value):
+        """Add a value; returns (minimum, maximum) over the window"""
+        for queue, keep in ((self._low, lambda old: old < value), (self._high, lambda old: old > value)):
+            while queue and not keep(queue[-1][1]):
+                queue.pop()
+            queue.append((self.count, value))
+            if queue[0][0] <= self.count - self.size:
+                queue.popleft()
+        self.count += 1
+        return self._low[0][1], self._high[0][1]
+
+class Turns:
+    """
+    Schmitt-trigger turning points of a signal
+
+    Follows the current extreme in the direction of travel and reports it
+    once the signal has moved back from it by more than the hysteresis, so
+    ripples smaller than the hysteresis never produce a turn.
+    """
+
+    def __init__(self):
+        self.rising = True
+        self.extreme = None
+
+    def update(self, frame, value, hysteresis):
+        """
+        Returns:
+            tuple: ("peak" or "valley", frame, value) of the turn completed by
+            this value, or None
+        """
+        if self.extreme is None or (value > self.extreme[1]) == self.rising and value != self.extreme[1]:
+            self.extreme = (frame, value)
+            return None
+        if abs(value - self.extreme[1]) <= hysteresis:
+            return None
+        turn = ("peak" if self.rising else "valley",) + self.extreme
+        self.rising = not self.rising
+        self.extreme = (frame, value)
+        return turn
+
+class LiveCadence:
+    """
+    Causal emotional cadence of a stream, one hop at a time
+
+    Mirrors analyze_emotional_cadence with online building blocks: RMS over
+    the trailing N_FFT samples instead of centered frames, an exponential
+    moving average instead of the whole-track Savitzky-Golay filter, tension
+    from an STFT chromagram of the trailing frame (the constant-Q chroma
+    needs seconds of look-ahead) normalized by its running range, and
+    hysteresis turns instead of find_peaks and frame-to-frame thresholds.
+    A peak or valley is known once intensity has turned by the hysteresis,
+    so each event reports both its time and the stream time it was
+    detected at. Events timed within the warm-up are dropped.
+
+    Args:
+        sr: Sample rate of the stream
+        smoothing_seconds: Time constant of the intensity smoothing
+        window_seconds: History the running normalization covers
+        hysteresis: Turn size for peaks and valleys, as a fraction of the
+            running intensity range
+        tension_threshold: Turn size in normalized tension for releases
+            and buildups
+        warmup_seconds: Start of the stream in which no event is reported
+    """
+
+    def __init__(self, sr, smoothing_seconds=DEFAULT_SMOOTHING_SECONDS, window_seconds=DEFAULT_WINDOW_SECONDS,
+                 hysteresis=DEFAULT_HYSTERESIS, tension_threshold=DEFAULT_TENSION_THRESHOLD,
+                 warmup_seconds=DEFAULT_WARMUP_SECONDS):
+        self.sr = sr
+        self.frame_seconds = HOP_LENGTH / sr
+        self.alpha = 1 - np.exp(-self.frame_seconds / smoothing_seconds)
+        self.hysteresis = hysteresis
+        self.tension_threshold = tension_threshold
+        self.min_gap = int(round(MIN_EVENT_SECONDS / self.frame_seconds))
+        self.warmup_frames = int(round(warmup_seconds / self.frame_seconds))
+
+        self.window = np.hanning(N_FFT + 1)[:-1].astype(np.float32)
+        self.chroma_filter = librosa.filters.chroma(sr=sr, n_fft=N_FFT)
+        self.buffer = np.zeros(N_FFT, dtype=np.float32)
+        self.pending = np.zeros(0, dtype=np.float32)
+
+        window_frames = max(1, int(window_seconds / self.frame_seconds))
+        self.intensity_range = RunningRange(window_frames)
+        self.tension_range = RunningRange(window_frames)
+        self.intensity_turns = Turns()
+        self.tension_turns = Turns()
+        self.last_event = {}
+        self.frame = 0
+        self.intensity = None
+        self.counts = {"peak": 0, "valley": 0, "tension_release": 0, "tension_buildup": 0}
+
+    def process(self, samples):
+        """
+        Feed mono samples of any length
+
+        Returns:
+            list: Events completed by the full hops now available
+        """
+        samples = np.concatenate([self.pending, np.asarray(samples, dtype=np.float32)])
+        hops = len(samples) // HOP_LENGTH
+        events = []
+        for hop in range(hops):
+            events += self._hop(samples[hop * HOP_LENGTH:(hop + 1) * HOP_LENGTH])
+        self.pending = samples[hops * HOP_LENGTH:]
+        return events
+
+    def _hop(self, hop):
+        self.buffer = np.concatenate([self.buffer[HOP_LENGTH:], hop])
+        frame, now = self.frame, self.frame * self.frame_seconds
+        self.frame += 1
+
+        # 1. INTENSITY
+        rms = float(np.sqrt(np.mean(self.buffer ** 2)))
+        self.intensity = rms if self.intensity is None else self.intensity + self.alpha * (rms - self.intensity)
+        low, high = self.intensity_range.update(self.intensity)
+        span = high - low
+
+        # 2. TENSION
+        power = np.abs(np.fft.rfft(self.buffer * self.window)) ** 2
+        chroma = self.chroma_filter @ power
+        chroma /= max(chroma.max(), 1e-10)
+        tension = float(chroma_tension(chroma[:, None])[0])
+        tension_low, tension_high = self.tension_range.update(tension)
+        tension_normalized = (tension - tension_low) / (tension_high - tension_low + 1e-10)
+
+        # 3. EVENTS
+        events = []
+        turn = self.intensity_turns.update(frame, self.intensity, self.hysteresis * span)
+        if turn and span > 0:
+            kind, turn_frame, value = turn
+            level = (value - low) / span
+            if (level >= PEAK_LEVEL) if kind == "peak" else (level <= 1 - PEAK_LEVEL):
+                events += self._event(kind, turn_frame, now, intensity=value, level=level)
+        turn = self.tension_turns.update(frame, tension_normalized, self.tension_threshold)
+        if turn:
+            # A tension peak is completed by a release, a valley by a buildup
+            kind, turn_frame, value = turn
+            kind = "tension_release" if kind == "peak" else "tension_buildup"
+            events += self._event(kind, turn_frame, now, magnitude=abs(value - tension_normalized))
+        return events
+
+    def _event(self, kind, frame, now, **values):
+        if frame < self.warmup_frames or frame - self.last_event.get(kind, -self.min_gap) < self.min_gap:
+            return []
+        self.last_event[kind] = frame
+        self.counts[kind] += 1
+        # delay_ms is the detection delay so far; run_live adds the hop's processing
+        event = {"type": kind, "time": round(frame * self.frame_seconds, 3), "detected": round(now, 3),
+                 "delay_ms": 1000 * (now - frame * self.frame_seconds)}
+        event.update({name: float(value) for name, value in values.items()})
+        return [event]
+
+def open_stream(source):
+    """
+    Binary input stream for a source
+
+    Args:
+        source: "-" for stdin, "unix:PATH" to connect to a local socket, or
+            the path of a FIFO or file
+    """
+    if source == "-":
+        return sys.stdin.buffer
+    if source.startswith("unix:"):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(source[len("unix:"):])
+        return connection.makefile("rb")
+    return open(source, "rb")
+
+def pcm_blocks(stream, block_frames, raw=None):
+    """
+    Mono float32 blocks of block_frames samples from a PCM stream
+
+    Args:
+        stream: Binary stream of a WAV file, or of headerless PCM
+        raw: (sr, channels, format name in RAW_FORMATS) for headerless PCM,
+            None to read a WAV header (works on pipes, which cannot seek)
+
+    Returns:
+        tuple: (sample rate, generator of blocks)
+    """
+    if raw is None:
+        reader = wave.open(stream, "rb")
+        sr, channels, width = reader.getframerate(), reader.getnchannels(), reader.getsampwidth()
+        if width not in (1, 2, 4):
+            raise ValueError(f"{8 * width}-bit WAV is not supported; send 8, 16 or 32-bit PCM or use --raw")
+        dtype = {1: np.dtype("u1"), 2: np.dtype("<i2"), 4: np.dtype("<i4")}[width]
+        read = reader.readframes
+    else:
+        sr, channels, name = raw
+        dtype = RAW_FORMATS[name]
+        read = lambda frames: stream.read(frames * channels * dtype.itemsize)
+
+    if dtype.kind == "f":
+        offset, scale = 0.0, 1.0
+    elif dtype.kind == "u":
+        offset, scale = 128.0, 128.0
+    else:
+        offset, scale = 0.0, float(2 ** (8 * dtype.itemsize - 1))
+
+    def blocks():
+        leftover = b""
+        while True:
+            data = leftover + read(block_frames)
+            usable = len(data) - len(data) % (channels * dtype.itemsize)
+            leftover = data[usable:]
+            if usable == 0:
+                return
+            samples = np.frombuffer(data[:usable], dtype=dtype).astype(np.float32)
+            yield ((samples - offset) / scale).reshape(-1, channels).mean(axis=1)
+
+    return sr, blocks()
+
+def run_live(source, raw=None, budget_ms=DEFAULT_BUDGET_MS, status_seconds=None, out=sys.stdout, **options):
+    """
+    Follow a stream until it ends, printing events as JSON lines
+
+    Input is read one hop at a time, so the stream buffers at most one hop
+    before it is analyzed. Each event carries processing_ms, that hop's
+    duration plus the time spent analyzing it, and delay_ms, the end-to-end
+    latency from the moment of the event to its output: processing_ms plus
+    the detection delay (detected - time) a turn needs to exceed the
+    hysteresis. The detection delay depends on how fast the music turns, so
+    only processing is held to budget_ms; hops over it are counted in the
+    closing summary, which also gives the mean and worst delay_ms.
+
+    Args:
+        source: See open_stream
+        raw: See pcm_blocks
+        budget_ms: Processing budget per hop
+        status_seconds: Also print the current intensity and tension this often
+        options: LiveCadence options
+
+    Returns:
+        dict: Summary with event counts, stream length, processing and delay
+        statistics
+    """
+    stream = open_stream(source)
+    sr, blocks = pcm_blocks(stream, HOP_LENGTH, raw)
+    hop_ms = 1000 * HOP_LENGTH / sr
+    if hop_ms >= budget_ms:
+        raise ValueError(f"A {HOP_LENGTH}-sample hop at {sr} Hz already takes {hop_ms:.1f} ms, "
+                         f"over the {budget_ms:.0f} ms budget")
+    cadence = LiveCadence(sr, **options)
+    status_frames = int(status_seconds / cadence.frame_seconds) if status_seconds else None
+
+    worst_ms, over_budget = 0.0, 0
+    delays = []
+    for block in blocks:
+        started = time.perf_counter()
+        events = cadence.process(block)
+        if status_frames and cadence.frame % status_frames == 0 and cadence.intensity is not None:
+            events.append({"type": "status", "time": round(cadence.frame * cadence.frame_seconds, 3),
+                           "intensity": cadence.intensity})
+        processing_ms = hop_ms + 1000 * (time.perf_counter() - started)
+        for event in events:
+            event["processing_ms"] = round(processing_ms, 2)
+            if event["type"] != "status":
+                event["delay_ms"] = round(event["delay_ms"] + processing_ms, 2)
+                delays.append(event["delay_ms"])
+            out.write(json.dumps(event) + "\n")
+        out.flush()
+        worst_ms = max(worst_ms, processing_ms)
+        over_budget += processing_ms > budget_ms
+
+    summary = {
+        "type": "summary",
+        "duration_seconds": round(cadence.frame * cadence.frame_seconds, 3),
+        "events": cadence.counts,
+        "worst_processing_ms": round(worst_ms, 2),
+        "budget_ms": budget_ms,
+        "hops_over_budget": over_budget,
+        "mean_delay_ms": round(float(np.mean(delays)), 2) if delays else None,
+        "worst_delay_ms": round(max(delays), 2) if delays else None
+    }
+    out.write(json.dumps(summary) + "\n")
+    out.flush()
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live emotional cadence of a PCM stream (JSON lines on stdout)")
+    parser.add_argument("source", nargs="?", default="-",
+                        help="'-' for stdin (default), unix:PATH for a local socket, or a FIFO/file path")
+    parser.add_argument("--raw", metavar="FORMAT", choices=sorted(RAW_FORMATS),
+                        help="headerless PCM in this sample format instead of a WAV stream")
+    parser.add_argument("--sr", type=int, default=44100, help="sample rate of --raw input (default: 44100)")
+    parser.add_argument("--channels", type=int, default=2, help="channels of --raw input (default: 2)")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"processing budget per hop (default: {DEFAULT_BUDGET_MS:.0f})")
+    parser.add_argument("--smoothing", type=float, default=DEFAULT_SMOOTHING_SECONDS,
+                        help=f"intensity smoothing time constant in seconds (default: {DEFAULT_SMOOTHING_SECONDS})")
+    parser.add_argument("--window", type=float, default=DEFAULT_WINDOW_SECONDS,
+                        help=f"running normalization window in seconds (default: {DEFAULT_WINDOW_SECONDS:.0f})")
+    parser.add_argument("--hysteresis", type=float, default=DEFAULT_HYSTERESIS,
+                        help=f"peak/valley turn as a fraction of the intensity range (default: {DEFAULT_HYSTERESIS})")
+    parser.add_argument("--tension-threshold", type=float, default=DEFAULT_TENSION_THRESHOLD,
+                        help=f"tension release/buildup size (default: {DEFAULT_TENSION_THRESHOLD})")
+    parser.add_argument("--warmup", type=float, default=DEFAULT_WARMUP_SECONDS,
+                        help=f"seconds at the start of the stream without events (default: {DEFAULT_WARMUP_SECONDS})")
+    parser.add_argument("--status", type=float, metavar="SECONDS", help="also print the current intensity this often")
+    args = parser.parse_args()
+
+    summary = run_live(args.source, (args.sr, args.channels, args.raw) if args.raw else None, args.budget_ms,
+                       args.status, smoothing_seconds=args.smoothing, window_seconds=args.window,
+                       hysteresis=args.hysteresis, tension_threshold=args.tension_threshold,
+                       warmup_seconds=args.warmup)
+    sys.exit(1 if summary["hops_over_budget"] else 0)
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Performance Network - CHARM-style correlation networks across recordings
+Extracts per-beat tempo and dynamics curves from many recordings of the same
+piece, aligns them on a common beat grid, and correlates every pair of
+performances over windows at several hierarchical sizes from cumulative sums,
+so hundreds of performances take seconds rather than hours
+"""
+
+import os
+import sys
+import json
+import argparse
+import multiprocessing
+from pathlib import Path
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import librosa
+import numpy as np
+import matplotlib.pyplot as plt
+
+from emotional_cadence import smooth_intensity
+from plot_rendering import FIGURE_SIZE, DPI, plot_mode, emit_figure
+from workers import WORKER_ENVIRONMENT, default_workers
+
+CURVE_KINDS = ("tempo", "dynamics")
+
+# Shared features the curves are built from
+CURVE_FEATURES = ("rms", "beat_track")
+
+# Smallest hierarchical window, in beats
+DEFAULT_MIN_WINDOW = 8
+
+# Windows start every this fraction of their length
+DEFAULT_HOP_FRACTION = 0.25
+
+# Neighbours each performance is linked to in the network
+DEFAULT_LINKS = 3
+
+def beat_curves(features):
+    """
+    Per-beat tempo and dynamics from a feature store
+
+    Tempo is the instantaneous BPM between consecutive beats; dynamics is
+    the mean smoothed intensity (as in analyze_emotional_cadence) over the
+    same inter-beat span.
+
+    Returns:
+        dict: beat_times, and tempo and dynamics with one value per span
+    """
+    _, beats = features.beat_track
+    if len(beats) < 4:
+        raise ValueError(f"only {len(beats)} beats detected")
+    intensity = smooth_intensity(features.rms)
+    beat_times = librosa.frames_to_time(beats, sr=features.sr, hop_length=features.hop_length)
+    # Sum of each inter-beat span in one pass; the last beat only closes a span
+    span_sums = np.add.reduceat(intensity, beats)[:-1]
+    return {
+        "beat_times": beat_times,
+        "tempo": 60.0 / np.diff(beat_times),
+        "dynamics": span_sums / np.diff(beats)
+    }
+
+def performance_curves(audio_path, cache_dir=None, stream=False, analysis_sr=None, resampler="hq", decoder="auto",
+                       pitch_method=None, quality="standard", segment_workers=1):
+    """
+    beat_curves of one recording
+
+    Meant to run in a worker process; errors are returned rather than raised.
+
+    Returns:
+        tuple: ({"beat_times", "tempo", "dynamics"} or None, error message or None)
+    """
+    from feature_options import build_feature_store
+    try:
+        features = build_feature_store(audio_path, cache_dir, stream, analysis_sr, resampler, decoder,
+                                       wanted=CURVE_FEATURES, pitch_method=pitch_method, quality=quality,
+                                       segment_workers=segment_workers)
+        return beat_curves(features), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+def align_curves(curves, length):
+    """
+    Resample per-beat curves of different lengths onto a common grid
+
+    Each curve is stretched linearly over its relative position in the
+    piece, which assumes every recording plays the same music from start
+    to end (no cuts or repeats skipped).
+
+    Returns:
+        np.ndarray: (len(curves), length) array
+    """
+    grid = np.linspace(0, 1, length)
+    return np.array([np.interp(grid, np.linspace(0, 1, len(curve)), curve) for curve in curves])
+
+def hierarchical_windows(length, min_window=DEFAULT_MIN_WINDOW, levels=None):
+    """
+    Window sizes from the whole piece down to min_window beats
+
+    By default each level halves the one above; with levels, that many
+    sizes spaced geometrically between min_window and length.
+    """
+    if levels:
+        windows = np.geomspace(min(min_window, length), length, levels).round().astype(int)
+    else:
+        windows = []
+        window = length
+        while window >= min(min_window, length):
+            windows.append(window)
+            window //= 2
+    return sorted(set(int(window) for window in windows), reverse=True)
+
+def windowed_correlations(curves, windows, hop_fraction=DEFAULT_HOP_FRACTION):
+    """
+    Pearson correlation of every pair of performances in sliding windows
+
+    Window sums of x, x^2 and x*y are differences of cumulative sums, so
+    every window of every level costs O(1) per pair once the cumulative
+    sums exist: O(P^2 * M) for all levels of P curves of M beats, instead
+    of O(P^2 * M * window) for correlating each window from scratch. The
+    cross sums against one reference performance are built at a time, so
+    memory stays O(P * M).
+
+    Args:
+        curves: (P, M) aligned curves
+        windows: Window sizes in beats
+        hop_fraction: Windows start every this fraction of their size
+
+    Returns:
+        list: Per window size, a dict with window, starts (first beat of
+        each window), mean (P, P) mean correlation over the windows, best
+        (n_windows, P) index of each performance's best-correlated other
+        performance in each window, and best_r its correlation
+    """
+    X = np.asarray(curves, dtype=np.float64)
+    X = X - X.mean(axis=1, keepdims=True)  # Centering keeps the cumulative sums well conditioned
+    n, length = X.shape
+    zero = np.zeros((n, 1))
+    S = np.concatenate([zero, np.cumsum(X, axis=1)], axis=1)
+    SS = np.concatenate([zero, np.cumsum(X * X, axis=1)], axis=1)
+
+    levels = []
+    for window in windows:
+        starts = np.arange(0, length - window + 1, max(1, int(window * hop_fraction)))
+        sx = S[:, starts + window] - S[:, starts]
+        var = SS[:, starts + window] - SS[:, starts] - sx * sx / window
+        levels.append({
+            "window": window, "starts": starts, "sx": sx, "var": np.maximum(var, 0),
+            "mean": np.zeros((n, n)), "best": np.zeros((len(starts), n), dtype=np.int32),
+            "best_r": np.zeros((len(starts), n))
+        })
+
+    for i in range(n):
+        C = np.concatenate([zero, np.cumsum(X[i] * X, axis=1)], axis=1)
+        for level in levels:
+            window, starts, sx, var = level["window"], level["starts"], level["sx"], level["var"]
+            cov = C[:, starts + window] - C[:, starts] - sx[i] * sx / window
+            denominator = np.sqrt(var[i] * var)
+            flat = denominator < 1e-12
+            r = np.where(flat, 0.0, cov / np.where(flat, 1.0, denominator))
+            level["mean"][i] = r.mean(axis=1)
+            if n > 1:
+                r[i] = -np.inf
+                level["best"][:, i] = r.argmax(axis=0)
+                level["best_r"][:, i] = r.max(axis=0)
+
+    return [{key: level[key] for key in ("window", "starts", "mean", "best", "best_r")} for level in levels]
+
+def network_links(correlation, links=DEFAULT_LINKS, threshold=None):
+    """
+    Each performance's most correlated others, as undirected edges
+
+    Returns:
+        list: (i, j, r) with i < j, strongest first
+    """
+    n = len(correlation)
+    others = np.array(correlation, dtype=np.float64)
+    np.fill_diagonal(others, -np.inf)
+    edges = {}
+    for i in range(n):
+        for j in np.argsort(-others[i])[:min(links, n - 1)]:
+            r = float(others[i, j])
+            if threshold is None or r >= threshold:
+                edges[(min(i, j), max(i, j))] = r
+    return sorted(((i, j, r) for (i, j), r in edges.items()), key=lambda edge: -edge[2])
+
+def render_network_figure(plot_path, names, tempo_links, dynamics_links, decimate=False):
+    """
+    Draw the tempo and dynamics correlation networks side by side to plot_path
+
+    Performances sit on a circle; each link's width and color follow its
+    correlation.
+    """
+    n = len(names)
+    angles = 2 * np.pi * np.arange(n) / max(n, 1)
+    x, y = np.cos(angles), np.sin(angles)
+    fig, axes = plt.subplots(1, 2, figsize=(FIGURE_SIZE[0], FIGURE_SIZE[0] / 2))
+    colormap = plt.get_cmap("coolwarm")
+    for ax, title, links in ((axes[0], "Tempo Correlation Network", tempo_links),
+                             (axes[1], "Dynamics Correlation Network", dynamics_links)):
+        for i, j, r in links:
+            ax.plot([x[int(i)], x[int(j)]], [y[int(i)], y[int(j)]], color=colormap((r + 1) / 2),
+                    linewidth=0.5 + 3 * max(r, 0), alpha=0.8)
+        ax.scatter(x, y, color='black', s=20, zorder=5)
+        if n <= 60:
+            for k, name in enumerate(names):
+                ax.annotate(str(name), (x[k], y[k]), fontsize=7, xytext=(4, 4), textcoords='offset points')
+        ax.set_title(title)
+        ax.set_aspect('equal')
+        ax.axis('off')
+    plt.tight_layout()
+    plt.savefig(plot_path, dpi=DPI, bbox_inches='tight')
+    print(f"Saved correlation network: {plot_path}")
+    plt.close()
+
+def extract_curves(tracks, workers=None, **options):
+    """
+    performance_curves of every track across a pool of worker processes
+
+    Returns:
+        tuple: (tracks that have curves, their curves, {track: error} for failures)
+    """
+    workers = workers or default_workers()
+    extract = partial(performance_curves, **options)
+    if workers == 1:
+        results = list(map(extract, tracks))
+    else:
+        for name, value in WORKER_ENVIRONMENT.items():
+            os.environ.setdefault(name, value)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(extract, tracks))
+
+    described, curves, failed = [], [], {}
+    for track, (track_curves, error) in zip(tracks, results):
+        if error:
+            print(f"✗ {track}: {error}")
+            failed[track] = error
+        else:
+            described.append(track)
+            curves.append(track_curves)
+    return described, curves, failed
+
+def performance_network(sources, output_dir="performance_network", workers=None, grid_beats=None,
+                        min_window=DEFAULT_MIN_WINDOW, levels=None, hop_fraction=DEFAULT_HOP_FRACTION,
+                        links=DEFAULT_LINKS, plot=True, **options):
+    """
+    Correlation networks and hierarchical correlations of many performances
+
+    Args:
+        sources: Directories, list files and/or audio files of recordings
+            of the same piece (as in batch_analysis.py)
+        output_dir: Directory for the network data, report and figure
+        workers: Worker processes for extracting the curves
+        grid_beats: Length of the common beat grid (default: the median
+            number of inter-beat spans)
+        min_window, levels: Hierarchical window sizes (see hierarchical_windows)
+        hop_fraction: Windows start every this fraction of their size
+        links: Neighbours each performance is linked to in the network
+        plot: True/"inline", "deferred" or False/"none" for the network figure
+        options: Feature store options passed to performance_curves
+
+    Returns:
+        dict: The network report
+    """
+    from batch_analysis import find_tracks
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    # 1. PER-BEAT CURVES
+    tracks = find_tracks(sources)
+    print(f"Extracting tempo and dynamics curves from {len(tracks)} recordings...")
+    tracks, curves, failed = extract_curves(tracks, workers, **options)
+    if len(tracks) < 2:
+        raise ValueError(f"Need at least two recordings with beats, got {len(tracks)}")
+
+    # 2. ALIGNMENT
+    grid_beats = grid_beats or int(np.median([len(c["tempo"]) for c in curves]))
+    aligned = {kind: align_curves([c[kind] for c in curves], grid_beats) for kind in CURVE_KINDS}
+    windows = hierarchical_windows(grid_beats, min_window, levels)
+
+    # 3. HIERARCHICAL CORRELATIONS
+    arrays = {"tracks": np.array(tracks, dtype=str), "windows": np.array(windows)}
+    report = {"performances": tracks, "grid_beats": grid_beats, "windows": windows, "networks": {}, "failed": failed}
+    names = [Path(track).stem for track in tracks]
+    for kind in CURVE_KINDS:
+        levels_data = windowed_correlations(aligned[kind], windows, hop_fraction)
+        correlation = levels_data[0]["mean"] if levels_data[0]["window"] == grid_beats else \
+            windowed_correlations(aligned[kind], [grid_beats])[0]["mean"]
+        edges = network_links(correlation, links)
+        arrays[f"{kind}_curves"] = aligned[kind].astype(np.float32)
+        arrays[f"{kind}_correlation"] = correlation.astype(np.float32)
+        arrays[f"{kind}_level_mean"] = np.array([level["mean"] for level in levels_data], dtype=np.float32)
+        for level_index, level in enumerate(levels_data):
+            arrays[f"{kind}_starts_{level_index}"] = level["starts"]
+            arrays[f"{kind}_best_{level_index}"] = level["best"].astype(np.int32)
+            arrays[f"{kind}_best_r_{level_index}"] = level["best_r"].astype(np.float32)
+        report["networks"][kind] = {
+            "links": [{"a": tracks[i], "b": tracks[j], "correlation": r} for i, j, r in edges],
+            # The performance each one most often matches best at each level
+            # (the dominant color of its hierarchical correlation plot)
+            "closest_by_level": {
+                str(level["window"]): {
+                    tracks[p]: tracks[int(np.bincount(level["best"][:, p], minlength=len(tracks)).argmax())]
+                    for p in range(len(tracks))
+                } for level in levels_data
+            }
+        }
+        arrays[f"{kind}_links"] = np.array([[i, j, r] for i, j, r in edges], dtype=np.float32).reshape(-1, 3)
+
+    # 4. OUTPUT
+    data_path = output_path / "performance_network.npz"
+    np.savez(data_path, **arrays)
+    report["output_files"] = {"data": str(data_path)}
+    if plot_mode(plot) != "none":
+        report["output_files"]["network"] = emit_figure(
+            render_network_figure, output_path / "performance_network.png", plot,
+            names=np.array(names, dtype=str), tempo_links=arrays["tempo_links"], dynamics_links=arrays["dynamics_links"]
+        )
+
+    report_path = output_path / "performance_network.json"
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved correlation data: {data_path}")
+    print(f"Saved network report: {report_path}")
+    return report
+
+if __name__ == "__main__":
+    from feature_options import add_feature_arguments
+    from plot_rendering import PLOT_MODES
+
+    parser = argparse.ArgumentParser(description="CHARM-style tempo and dynamics correlation networks of many "
+                                                 "recordings of the same piece")
+    parser.add_argument("sources", nargs="+", help="audio directories, text files listing recordings, or audio files")
+    parser.add_argument("-o", "--output-dir", default="performance_network")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes (default: available cores)")
+    parser.add_argument("--grid-beats", type=int, help="common beat grid length (default: median beat count)")
+    parser.add_argument("--min-window", type=int, default=DEFAULT_MIN_WINDOW,
+                        help=f"smallest window in beats (default: {DEFAULT_MIN_WINDOW})")
+    parser.add_argument("--levels", type=int, help="number of window sizes (default: halve down to --min-window)")
+    parser.add_argument("--hop", type=float, default=DEFAULT_HOP_FRACTION,
+                        help=f"window hop as a fraction of its size (default: {DEFAULT_HOP_FRACTION})")
+    parser.add_argument("--links", type=int, default=DEFAULT_LINKS,
+                        help=f"neighbours linked per performance (default: {DEFAULT_LINKS})")
+    parser.add_argument("--plots", choices=PLOT_MODES, default="inline",
+                        help="render the network figure now, save its data for plot_rendering.py, or skip it")
+    add_feature_arguments(parser)
+    args = parser.parse_args()
+
+    report = performance_network(args.sources, args.output_dir, args.workers, args.grid_beats, args.min_window,
+                                 args.levels, args.hop, args.links, args.plots,
+                                 cache_dir=args.cache_dir, stream=args.stream, analysis_sr=args.analysis_sr,
+                                 resampler=args.resampler, decoder=args.decoder, pitch_method=args.pitch_method,
+                                 quality=args.quality, segment_workers=args.segment_workers)
+    sys.exit(1 if report["failed"] else 0)
@@ -8,19 +8,35 @@ import librosa
 import numpy as np
 import matplotlib.pyplot as plt
 import json
+import argparse
 from pathlib import Path
-import speech_recognition as sr
-from pydub import AudioSegment
+from feature_store import FeatureStore
+from feature_options import add_feature_arguments, feature_store_from_args
+from frame_export import frame_columns, frame_flags, write_frames, add_export_arguments
+from plot_rendering import FIGURE_SIZE, DPI, plot_mode, emit_figure, decimate_line, add_plot_arguments
+from stage_profile import StageProfiler, add_profile_arguments, profiler_from_args
 import warnings
 warnings.filterwarnings('ignore')
 
-def analyze_phonetic_patterns(audio_path, output_dir="phonetic_analysis"):
+# Shared features consumed by analyze_phonetic_patterns
+FEATURES = ("sibilant_energy", "fricative_energy", "nasal_energy", "onset_env", "rms")
+
+def analyze_phonetic_patterns(audio_path, output_dir="phonetic_analysis", features=None, plot=True, decimate=False,
+                              export=None, profiler=None):
     """
     Analyze phonetic characteristics for emotional content
     
     Args:
         audio_path: Path to audio file
         output_dir: Directory for outputs
+        features: Optional FeatureStore shared with other analyzers of the same track
+        plot: True/"inline" to render the phonetic pattern figure, "deferred"
+            to save its arrays for plot_rendering.py, False/"none" to skip it
+        decimate: Downsample the figure's timelines to its pixel width
+        export: "npz" or "parquet" to also write every per-frame timeline
+            (phonetic_frames.*), None to skip it
+        profiler: Optional StageProfiler that measures the analysis; its
+            stages are added to the report's profile section
     
     Returns:
         dict: Phonetic pattern analysis
@@ -29,57 +45,56 @@ def analyze_phonetic_patterns(audio_path, output_dir="phonetic_analysis"):
     output_path.mkdir(exist_ok=True)
     
     # Load audio
-    y, sr = librosa.load(audio_path, sr=None)
-    duration = len(y) / sr
+    if features is None:
+        features = FeatureStore(audio_path)
+    if profiler is None:
+        profiler = StageProfiler()
+    features.profiler = profiler
+    sr = features.sr
+    hop_length = features.hop_length
+    duration = features.duration
     
     print(f"Analyzing phonetic patterns: {audio_path}")
     
     # 1. HIGH FREQUENCY ENERGY (Sibilants: s, sh, z, ch)
     # Sibilants are characterized by high-frequency noise
-    D = librosa.stft(y)
-    magnitude = np.abs(D)
-    
     # Focus on high frequencies (4kHz-10kHz where sibilants dominate)
-    freq_bins = librosa.fft_frequencies(sr=sr)
-    high_freq_mask = (freq_bins >= 4000) & (freq_bins <= 10000)
-    sibilant_energy = np.mean(magnitude[high_freq_mask, :], axis=0)
-    sibilant_times = librosa.times_like(sibilant_energy, sr=sr)
+    sibilant_energy = features.sibilant_energy
+    sibilant_times = librosa.times_like(sibilant_energy, sr=sr, hop_length=hop_length)
     
     # Normalize
     sibilant_normalized = (sibilant_energy - sibilant_energy.min()) / (sibilant_energy.max() - sibilant_energy.min() + 1e-10)
     
     # 2. PLOSIVE DETECTION (p, t, k, b, d, g)
     # Plosives create sudden bursts of energy across spectrum
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr, hop_length=512)
-    onset_times = librosa.times_like(onset_env, sr=sr, hop_length=512)
+    onset_env = features.onset_env
+    onset_times = librosa.times_like(onset_env, sr=sr, hop_length=hop_length)
     
     # Find sharp onsets (plosive candidates)
     from scipy.signal import find_peaks
-    plosive_peaks, _ = find_peaks(onset_env, height=np.percentile(onset_env, 85), distance=sr//1024)
+    plosive_peaks, _ = find_peaks(onset_env, height=np.percentile(onset_env, 85), distance=sr//(2*hop_length))
     plosive_times = onset_times[plosive_peaks]
     plosive_strengths = onset_env[plosive_peaks]
     
     # 3. FRICATIVE DETECTION (f, v, th, h)
     # Fricatives: mid-to-high frequency noise, less sharp than sibilants
-    mid_freq_mask = (freq_bins >= 2000) & (freq_bins <= 6000)
-    fricative_energy = np.mean(magnitude[mid_freq_mask, :], axis=0)
+    fricative_energy = features.fricative_energy
     fricative_normalized = (fricative_energy - fricative_energy.min()) / (fricative_energy.max() - fricative_energy.min() + 1e-10)
     
     # 4. NASAL/LIQUID DETECTION (m, n, l, r)
     # Lower frequency, sustained energy
-    low_freq_mask = (freq_bins >= 200) & (freq_bins <= 1500)
-    nasal_energy = np.mean(magnitude[low_freq_mask, :], axis=0)
+    nasal_energy = features.nasal_energy
     nasal_normalized = (nasal_energy - nasal_energy.min()) / (nasal_energy.max() - nasal_energy.min() + 1e-10)
     
     # 5. VOCAL INTENSITY BURSTS
     # Track sudden changes that might indicate emotional emphasis
-    rms = librosa.feature.rms(y=y, hop_length=512)[0]
-    rms_times = librosa.times_like(rms, sr=sr, hop_length=512)
+    rms = features.rms
+    rms_times = librosa.times_like(rms, sr=sr, hop_length=hop_length)
     rms_gradient = np.abs(np.gradient(rms))
     
     # 6. PHONEME DENSITY
     # Estimate how "busy" the vocals are (rapid delivery vs sustained notes)
-    spectral_flux = librosa.onset.onset_strength(y=y, sr=sr)
+    spectral_flux = features.onset_env
     phoneme_density = np.mean(spectral_flux)
     
     # 7. EMOTIONAL CLASSIFICATION BASED ON PATTERNS
@@ -104,24 +119,108 @@ def analyze_phonetic_patterns(audio_path, output_dir="phonetic_analysis"):
     }
     
     # 8. TIMELINE ANALYSIS
-    # Create time-aligned phonetic features
-    timeline = []
-    for i, t in enumerate(sibilant_times):
-        if i < len(fricative_normalized) and i < len(nasal_normalized):
-            timeline.append({
-                "time": float(t),
-                "sibilance": float(sibilant_normalized[i]),
-                "fricative": float(fricative_normalized[i]),
-                "nasal_liquid": float(nasal_normalized[i])
-            })
+    # Create time-aligned phonetic features (one array per column)
+    timeline = phonetic_timeline(sibilant_times, sibilant_normalized, fricative_normalized, nasal_normalized)
     
     # 9. CREATE VISUALIZATION
-    fig, axes = plt.subplots(4, 1, figsize=(14, 12))
+    output_files = {}
+    if plot_mode(plot) != "none":
+        with profiler.stage("plot"):
+            output_files["visualization"] = emit_figure(
+                render_phonetic_figure, output_path / "phonetic_patterns.png", plot, decimate,
+                phonetic_figure_arrays,
+                sibilant_times=sibilant_times, sibilant_normalized=sibilant_normalized,
+                fricative_normalized=fricative_normalized, nasal_normalized=nasal_normalized,
+                onset_times=onset_times, onset_env=onset_env,
+                plosive_times=plosive_times, plosive_strengths=plosive_strengths,
+                rms_times=rms_times, rms=rms, rms_gradient=rms_gradient, spectral_flux=spectral_flux
+            )
+    
+    # Every frame-level timeline, including all plosives rather than the first 20
+    if export:
+        with profiler.stage("export"):
+            frames = frame_columns(
+                timeline["time"],
+                sibilance=timeline["sibilance"], fricative=timeline["fricative"],
+                nasal_liquid=timeline["nasal_liquid"], onset_strength=onset_env,
+                plosive=frame_flags(len(onset_env), plosive_peaks), rms=rms, rms_gradient=rms_gradient
+            )
+            output_files["frames"] = write_frames(output_path / "phonetic_frames", frames, export)
+        
+    # 10. COMPILE RESULTS
+    results = {
+        "file": str(audio_path),
+        "duration_seconds": float(duration),
+        "phonetic_summary": {
+            "plosive_count": len(plosive_peaks),
+            "plosives_per_second": float(len(plosive_peaks) / duration),
+            "mean_sibilance": float(np.mean(sibilant_normalized)),
+            "mean_fricative_energy": float(np.mean(fricative_normalized)),
+            "mean_nasal_liquid_energy": float(np.mean(nasal_normalized)),
+            "phoneme_density_score": float(phoneme_density)
+        },
+        "emotional_indicators": emotional_indicators,
+        "notable_plosive_moments": [
+            {"time": float(t), "strength": float(s)} 
+            for t, s in zip(plosive_times[:20], plosive_strengths[:20])
+        ],
+        "interpretation": interpret_phonetic_patterns(emotional_indicators),
+        "output_files": output_files,
+        "profile": profiler.report(output_path)
+    }
+    
+    # Save JSON report
+    json_path = output_path / "phonetic_report.json"
+    with open(json_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved phonetic analysis: {json_path}")
+    
+    return results
+
+def phonetic_figure_arrays(sibilant_times, sibilant_normalized, fricative_normalized,
+                           nasal_normalized, onset_times, onset_env, plosive_times, plosive_strengths,
+                           rms_times, rms, rms_gradient, spectral_flux, decimate=False):
+    """
+    The timelines render_phonetic_figure draws, each with its own times
+    
+    With decimate, every timeline is reduced to its min/max envelope at the
+    figure's pixel width; plosive markers are kept.
+    """
+    spectral_flux_times = onset_times
+    fricative_times = sibilant_times[:len(fricative_normalized)]
+    nasal_times = sibilant_times[:len(nasal_normalized)]
+    gradient_times = rms_times
+    if decimate:
+        fricative_times, fricative_normalized = decimate_line(fricative_times, fricative_normalized)
+        nasal_times, nasal_normalized = decimate_line(nasal_times, nasal_normalized)
+        sibilant_times, sibilant_normalized = decimate_line(sibilant_times, sibilant_normalized)
+        onset_times, onset_env = decimate_line(onset_times, onset_env)
+        gradient_times, rms_gradient = decimate_line(rms_times, rms_gradient)
+        rms_times, rms = decimate_line(rms_times, rms)
+        spectral_flux_times, spectral_flux = decimate_line(spectral_flux_times, spectral_flux)
+    return {
+        "sibilant_times": sibilant_times, "sibilant_normalized": sibilant_normalized,
+        "fricative_times": fricative_times, "fricative_normalized": fricative_normalized,
+        "nasal_times": nasal_times, "nasal_normalized": nasal_normalized,
+        "onset_times": onset_times, "onset_env": onset_env,
+        "plosive_times": plosive_times, "plosive_strengths": plosive_strengths,
+        "rms_times": rms_times, "rms": rms, "gradient_times": gradient_times, "rms_gradient": rms_gradient,
+        "spectral_flux_times": spectral_flux_times, "spectral_flux": spectral_flux
+    }
+
+def render_phonetic_figure(plot_path, sibilant_times, sibilant_normalized, fricative_times, fricative_normalized,
+                           nasal_times, nasal_normalized, onset_times, onset_env, plosive_times, plosive_strengths,
+                           rms_times, rms, gradient_times, rms_gradient, spectral_flux_times, spectral_flux):
+    """
+    Draw the phonetic energy, plosive, intensity and flux panels to plot_path
+    from phonetic_figure_arrays
+    """
+    fig, axes = plt.subplots(4, 1, figsize=FIGURE_SIZE)
     
     # Phonetic energy patterns
     axes[0].plot(sibilant_times, sibilant_normalized, label='Sibilants (s, sh, z)', color='red', alpha=0.7)
-    axes[0].plot(sibilant_times[:len(fricative_normalized)], fricative_normalized, label='Fricatives (f, v, th)', color='orange', alpha=0.7)
-    axes[0].plot(sibilant_times[:len(nasal_normalized)], nasal_normalized, label='Nasals/Liquids (m, n, l, r)', color='blue', alpha=0.7)
+    axes[0].plot(fricative_times, fricative_normalized, label='Fricatives (f, v, th)', color='orange', alpha=0.7)
+    axes[0].plot(nasal_times, nasal_normalized, label='Nasals/Liquids (m, n, l, r)', color='blue', alpha=0.7)
     axes[0].set_title('Phonetic Pattern Energy Over Time')
     axes[0].set_ylabel('Normalized Energy')
     axes[0].legend()
@@ -137,14 +236,13 @@ def analyze_phonetic_patterns(audio_path, output_dir="phonetic_analysis"):
     
     # Vocal intensity changes
     axes[2].plot(rms_times, rms, label='RMS Intensity', color='purple')
-    axes[2].plot(rms_times, rms_gradient, label='Intensity Change Rate', color='magenta', alpha=0.6)
+    axes[2].plot(gradient_times, rms_gradient, label='Intensity Change Rate', color='magenta', alpha=0.6)
     axes[2].set_title('Vocal Intensity and Dynamics')
     axes[2].set_ylabel('Amplitude')
     axes[2].legend()
     axes[2].grid(True, alpha=0.3)
     
     # Spectral flux (phoneme density indicator)
-    spectral_flux_times = librosa.times_like(spectral_flux, sr=sr)
     axes[3].plot(spectral_flux_times, spectral_flux, color='green')
     axes[3].set_title('Spectral Flux (Phoneme Density / Vocal Activity)')
     axes[3].set_xlabel('Time (s)')
@@ -153,41 +251,21 @@ def analyze_phonetic_patterns(audio_path, output_dir="phonetic_analysis"):
     
     plt.tight_layout()
     
-    plot_path = output_path / "phonetic_patterns.png"
-    plt.savefig(plot_path, dpi=150, bbox_inches='tight')
+    plt.savefig(plot_path, dpi=DPI, bbox_inches='tight')
     print(f"Saved phonetic pattern plot: {plot_path}")
     plt.close()
-    
-    # 10. COMPILE RESULTS
-    results = {
-        "file": str(audio_path),
-        "duration_seconds": float(duration),
-        "phonetic_summary": {
-            "plosive_count": len(plosive_peaks),
-            "plosives_per_second": float(len(plosive_peaks) / duration),
-            "mean_sibilance": float(np.mean(sibilant_normalized)),
-            "mean_fricative_energy": float(np.mean(fricative_normalized)),
-            "mean_nasal_liquid_energy": float(np.mean(nasal_normalized)),
-            "phoneme_density_score": float(phoneme_density)
-        },
-        "emotional_indicators": emotional_indicators,
-        "notable_plosive_moments": [
-            {"time": float(t), "strength": float(s)} 
-            for t, s in zip(plosive_times[:20], plosive_strengths[:20])
-        ],
-        "interpretation": interpret_phonetic_patterns(emotional_indicators),
-        "output_files": {
-            "visualization": str(plot_path)
-        }
+
+def phonetic_timeline(times, sibilance, fricative, nasal_liquid):
+    """
+    Time-aligned phonetic feature columns truncated to their common length
+    """
+    n = min(len(times), len(fricative), len(nasal_liquid))
+    return {
+        "time": times[:n],
+        "sibilance": sibilance[:n],
+        "fricative": fricative[:n],
+        "nasal_liquid": nasal_liquid[:n]
     }
-    
-    # Save JSON report
-    json_path = output_path / "phonetic_report.json"
-    with open(json_path, 'w') as f:
-        json.dump(results, f, indent=2)
-    print(f"Saved phonetic analysis: {json_path}")
-    
-    return results
 
 def interpret_phonetic_patterns(indicators):
     """
@@ -226,13 +304,16 @@ def interpret_phonetic_patterns(indicators):
     return interpretations
 
 if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) < 2:
-        print("Usage: python phonetic_analysis.py <audio_file> [output_dir]")
-        sys.exit(1)
-    
-    audio_file = sys.argv[1]
-    output_dir = sys.argv[2] if len(sys.argv) > 2 else "phonetic_analysis"
-    
-    analyze_phonetic_patterns(audio_file, output_dir)
+    parser = argparse.ArgumentParser(description="Phonetic pattern analysis of an audio file")
+    parser.add_argument("audio_file")
+    parser.add_argument("output_dir", nargs="?", default="phonetic_analysis")
+    add_feature_arguments(parser)
+    add_plot_arguments(parser)
+    add_export_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    
+    features = feature_store_from_args(args.audio_file, args, FEATURES)
+    analyze_phonetic_patterns(args.audio_file, args.output_dir, features=features,
+                              plot=args.plots, decimate=args.decimate_plots, export=args.export_frames,
+                              profiler=profiler_from_args(args))
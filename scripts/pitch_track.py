@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Pitch Track - Per-frame dominant pitch and its confidence
+The default tracker finds the same dominant spectral peak as
+librosa.piptrack followed by a per-frame argmax, but works block by block
+on only the bins inside its frequency range, so it never allocates the two
+bins x frames matrices piptrack returns. The accurate tracker runs pYIN
+over overlapping chunks of the track in parallel worker processes and
+stitches the chunks at the middle of each overlap
+"""
+
+from functools import partial
+
+import librosa
+import numpy as np
+
+from segment_parallel import segment_spans, map_segments, stitch_frames
+
+PITCH_METHODS = ("peak", "pyin")
+
+# librosa.piptrack's defaults: the frequency range searched for peaks, and
+# the fraction of each frame's maximum a peak must exceed
+PEAK_FMIN = 150.0
+PEAK_FMAX = 4000.0
+PEAK_THRESHOLD = 0.1
+
+# Frames whose peaks are searched at the same time
+CHUNK_FRAMES = 4096
+
+# pYIN search range (C2-C7), chunk length, and the audio each chunk reads
+# past its own frames on both sides so its Viterbi path has context
+PYIN_FMIN = 65.40639132514966
+PYIN_FMAX = 2093.004522404789
+PYIN_CHUNK_SECONDS = 30.0
+PYIN_OVERLAP_SECONDS = 2.0
+
+def spectral_peaks(magnitude, sr, n_fft, fmin=PEAK_FMIN, fmax=PEAK_FMAX, threshold=PEAK_THRESHOLD,
+                   chunk_frames=CHUNK_FRAMES):
+    """
+    Spectral peaks of every frame, chunk_frames frames at a time
+
+    A bin is a peak when it is a local maximum of the spectrum after
+    zeroing everything below threshold times the frame's maximum; its
+    frequency and magnitude are refined by parabolic interpolation, as in
+    librosa.piptrack.
+
+    Yields:
+        tuple: (first frame, pitches, mags), each (bins in range, frames in
+        chunk) and 0 wherever the bin is not a peak; nothing when no bin
+        lies in the range
+    """
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+    rows = np.flatnonzero((max(fmin, 0) <= freqs) & (freqs < min(fmax, sr / 2)))
+    # The first bin is never a local maximum, and the Nyquist bin is never in range
+    rows = rows[rows >= 1]
+    if not len(rows):
+        return
+    lo, hi = rows[0], rows[-1] + 1
+    bins = np.arange(lo, hi)[:, None]
+
+    for f0 in range(0, magnitude.shape[1], chunk_frames):
+        S = magnitude[:, f0:f0 + chunk_frames]
+        window = S[lo - 1:hi + 1]
+        below, center, above = window[:-2], window[1:-1], window[2:]
+
+        thresholded = window * (window > threshold * S.max(axis=0))
+        peaks = (thresholded[1:-1] > thresholded[:-2]) & (thresholded[1:-1] >= thresholded[2:])
+
+        # Parabolic interpolation, rounded as in piptrack
+        curvature = (above + below).astype(np.float64) - 2 * center
+        slope = (above - below).astype(np.float64) / 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shift = np.where(np.abs(slope) >= np.abs(curvature), 0, -slope / curvature).astype(np.float32)
+        mags = np.where(peaks, center + 0.5 * ((above - below) / 2.0) * shift, 0)
+        pitches = np.where(peaks, ((bins + shift) * (float(sr) / n_fft)).astype(np.float32), 0)
+        yield f0, pitches, mags
+
+def peak_pitch(magnitude, sr, n_fft, **options):
+    """
+    Dominant spectral peak of every frame
+
+    The pitch of the strongest spectral_peaks peak equals
+    bench_kernels.dominant_pitch of librosa.piptrack's output.
+
+    Args:
+        magnitude: (bins, frames) STFT magnitude
+        sr, n_fft: Sample rate and FFT size the spectrogram was computed with
+        options: fmin, fmax, threshold and chunk_frames of spectral_peaks
+
+    Returns:
+        np.ndarray: (2, frames) float32: pitch in Hz (0 where the frame has
+        no peak), and the share of the frame's total peak magnitude held
+        by the dominant peak (0-1) as its confidence
+    """
+    track = np.zeros((2, magnitude.shape[1]), dtype=np.float32)
+    for f0, pitches, mags in spectral_peaks(magnitude, sr, n_fft, **options):
+        columns = np.arange(pitches.shape[1])
+        best = mags.argmax(axis=0)
+        total = mags.sum(axis=0)
+        track[0, f0:f0 + len(columns)] = np.maximum(pitches[best, columns], 0)
+        track[1, f0:f0 + len(columns)] = np.where(total > 0, mags[best, columns] / np.where(total > 0, total, 1), 0)
+    return track
+
+def spectral_tuning(magnitude, sr, n_fft, bins_per_octave=12, **options):
+    """
+    Tuning deviation of the spectrogram in fractions of a bin
+
+    Equals librosa.estimate_tuning(S=magnitude, sr=sr, n_fft=n_fft,
+    bins_per_octave=bins_per_octave) without holding piptrack's two bins x
+    frames matrices: only the peaks are kept. For a 2048-point STFT and 36
+    bins per octave, that is the tuning chroma_cqt estimates from the
+    signal itself.
+    """
+    pitches, mags = [], []
+    for _, block_pitches, block_mags in spectral_peaks(magnitude, sr, n_fft, **options):
+        voiced = block_pitches > 0
+        pitches.append(block_pitches[voiced])
+        mags.append(block_mags[voiced])
+    pitches = np.concatenate(pitches) if pitches else np.zeros(0, dtype=np.float32)
+    mags = np.concatenate(mags) if mags else np.zeros(0, dtype=np.float32)
+    threshold = np.median(mags) if mags.size else 0.0
+    return librosa.pitch_tuning(pitches[mags >= threshold], bins_per_octave=bins_per_octave)
+
+def _pyin_chunk(chunk, sr, frame_length, hop_length, fmin, fmax):
+    f0, voiced, probability = librosa.pyin(chunk, fmin=fmin, fmax=fmax, sr=sr,
+                                           frame_length=frame_length, hop_length=hop_length)
+    return np.stack([np.where(voiced, np.nan_to_num(f0), 0), probability]).astype(np.float32)
+
+def pyin_pitch(y, sr, frame_length, hop_length, workers=None, fmin=PYIN_FMIN, fmax=PYIN_FMAX,
+               chunk_seconds=PYIN_CHUNK_SECONDS, overlap_seconds=PYIN_OVERLAP_SECONDS):
+    """
+    Probabilistic YIN pitch of every frame, chunk-parallel
+
+    The track is cut into chunks of chunk_seconds, each decoded with
+    overlap_seconds of extra audio on both sides. Each chunk contributes
+    only its own frames, so neighbouring chunks meet in the middle of
+    their shared context and no frame depends on where the cut fell more
+    than overlap_seconds away.
+
+    Args:
+        y: Mono signal
+        sr: Sample rate
+        frame_length, hop_length: pYIN framing, matching the STFT's so
+            frames line up with the other features
+        workers: Worker processes (default: available cores, or 1 inside a
+            worker process such as a batch_analysis worker; 1 runs inline)
+
+    Returns:
+        np.ndarray: (2, frames) float32: pitch in Hz (0 where unvoiced),
+        and the voicing probability as its confidence
+    """
+    chunk_frames = max(1, int(chunk_seconds * sr) // hop_length)
+    margin_frames = int(np.ceil(overlap_seconds * sr / hop_length))
+    cores, spans = segment_spans(len(y), hop_length, chunk_frames, margin_frames)
+    decode = partial(_pyin_chunk, sr=sr, frame_length=frame_length, hop_length=hop_length, fmin=fmin, fmax=fmax)
+    return stitch_frames(cores, spans, map_segments(decode, y, spans, workers), hop_length)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Plot Rendering - Inline, deferred or disabled analyzer figures
+Lets the analyzers skip their figures, save the arrays behind them for a
+separate rendering pass over a worker pool, and downsample long timelines
+to the figure's pixel width so rendering cost does not grow with track length
+"""
+
+import sys
+import argparse
+import importlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+PLOT_MODES = ("inline", "deferred", "none")
+
+# Every analyzer figure is four stacked panels saved at this size
+FIGURE_SIZE = (14, 12)
+DPI = 150
+
+# Horizontal resolution of a saved figure; more points than this per panel
+# cannot show up as separate pixels
+PLOT_WIDTH = FIGURE_SIZE[0] * DPI
+
+DEFERRED_SUFFIX = ".plot.npz"
+
+def plot_mode(plot):
+    """Normalize a plot argument (True/False or a mode name) to a mode name"""
+    if plot is True:
+        return "inline"
+    if plot is False or plot is None:
+        return "none"
+    if plot not in PLOT_MODES:
+        raise ValueError(f"Unknown plot mode '{plot}', expected one of {PLOT_MODES}")
+    return plot
+
+def decimate_line(times, values, width=PLOT_WIDTH):
+    """
+    Reduce a timeline to its min/max envelope at width buckets
+
+    Each bucket keeps its lowest and highest sample in time order, so peaks
+    and dips stay visible exactly as in the full-resolution line. Timelines
+    that already fit are returned unchanged.
+    """
+    n = len(values)
+    if n <= 2 * width:
+        return times, values
+    step = -(-n // width)
+    buckets = -(-n // step)
+    padded = np.pad(values, (0, buckets * step - n), mode='edge').reshape(buckets, step)
+    extremes = np.sort(np.stack([padded.argmin(axis=1), padded.argmax(axis=1)], axis=1), axis=1)
+    index = np.minimum((extremes + (np.arange(buckets) * step)[:, None]).ravel(), n - 1)
+    return times[index], values[index]
+
+def decimate_image(image, times, width=PLOT_WIDTH):
+    """
+    Max-pool the columns of a (bins, frames) image down to at most width
+
+    Returns:
+        tuple: Pooled image and the start time of each pooled column
+    """
+    n = image.shape[1]
+    if n <= width:
+        return image, times
+    step = -(-n // width)
+    buckets = -(-n // step)
+    padded = np.pad(image, ((0, 0), (0, buckets * step - n)), mode='edge')
+    return padded.reshape(image.shape[0], buckets, step).max(axis=2), times[::step]
+
+def render_name(render):
+    """Importable 'module:function' name of a render function"""
+    module = render.__module__
+    if module == "__main__":
+        module = Path(sys.modules["__main__"].__file__).stem
+    return f"{module}:{render.__name__}"
+
+def emit_figure(render, plot_path, plot=True, decimate=False, prepare=None, **arrays):
+    """
+    Render a figure now, save its arrays for deferred rendering, or skip it
+
+    Args:
+        render: Module-level function render(plot_path, decimate=..., **arrays),
+            or render(plot_path, **prepared) when prepare is given
+        plot_path: Where the PNG is (or will be) written
+        plot: True/"inline", "deferred", or False/"none"
+        decimate: Downsample timelines to the figure width before drawing
+        prepare: Optional prepare(decimate=..., **arrays) returning the
+            arrays render draws, with their time axes; deferred mode saves
+            those, so with decimate the saved data is already figure-sized
+        arrays: Everything the render function draws
+
+    Returns:
+        str: Path of the PNG, or None when plotting is off
+    """
+    mode = plot_mode(plot)
+    if mode == "none":
+        return None
+    if prepare is not None:
+        arrays = prepare(decimate=decimate, **arrays)
+    else:
+        arrays["decimate"] = decimate
+    if mode == "deferred":
+        data_path = Path(plot_path).with_suffix(DEFERRED_SUFFIX)
+        np.savez(data_path, render=np.array(render_name(render)), **arrays)
+        print(f"Saved plot data for deferred rendering: {data_path}")
+    else:
+        render(plot_path, **arrays)
+    return str(plot_path)
+
+def render_saved_figure(data_path, keep_data=False):
+    """
+    Render one figure from arrays saved in deferred mode
+
+    Returns:
+        str: Path of the rendered PNG
+    """
+    data_path = Path(data_path)
+    with np.load(data_path) as data:
+        arrays = {name: data[name].item() if data[name].ndim == 0 else data[name] for name in data.files}
+    module_name, function_name = arrays.pop("render").split(":")
+    render = getattr(importlib.import_module(module_name), function_name)
+
+    plot_path = data_path.with_name(data_path.name[:-len(DEFERRED_SUFFIX)] + ".png")
+    render(plot_path, **arrays)
+    if not keep_data:
+        data_path.unlink()
+    return str(plot_path)
+
+def find_deferred(sources):
+    """Deferred figure data files in the given files and directories (searched recursively)"""
+    found = []
+    for source in sources:
+        source = Path(source)
+        if source.is_dir():
+            found += sorted(source.rglob("*" + DEFERRED_SUFFIX))
+        else:
+            found.append(source)
+    return found
+
+def render_deferred(sources, workers=None, keep_data=False):
+    """
+    Render every deferred figure under sources across a process pool
+
+    A figure that fails to render is reported and its data kept so it can
+    be retried; the others are unaffected.
+
+    Returns:
+        dict: Rendered PNG paths and {data path: error} for failures
+    """
+    data_paths = find_deferred(sources)
+    rendered, failed = [], {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(render_saved_figure, str(p), keep_data): p for p in data_paths}
+        for future, data_path in futures.items():
+            try:
+                rendered.append(future.result())
+            except Exception as e:
+                print(f"✗ Could not render {data_path}: {e}")
+                failed[str(data_path)] = str(e) or type(e).__name__
+    print(f"Rendered {len(rendered)} figures, {len(failed)} failed")
+    return {"rendered": rendered, "failed": failed}
+
+def add_plot_arguments(parser):
+    """Add the figure rendering options to an argparse parser"""
+    parser.add_argument("--plots", choices=PLOT_MODES, default="inline",
+                        help="render figures now, save their data for plot_rendering.py, or skip them")
+    parser.add_argument("--decimate-plots", action="store_true",
+                        help="downsample timelines to the figure width so rendering time does not grow with track length")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render figures saved by the analyzers with --plots deferred")
+    parser.add_argument("sources", nargs="+", help="output directories or .plot.npz files")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--keep-data", action="store_true", help="keep the saved arrays after rendering")
+    args = parser.parse_args()
+
+    result = render_deferred(args.sources, args.workers, args.keep_data)
+    sys.exit(1 if result["failed"] else 0)
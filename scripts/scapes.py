@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Scapes - CHARM timescapes, dynascapes and arch scapes of a performance
+Averages the per-beat tempo and dynamics over every window from a single
+beat up to the whole piece, and correlates each window with a rising ramp
+to find phrase arches. Every window statistic comes from prefix sums, so
+each row of a scape costs O(beats) however long its windows are
+"""
+
+import json
+import argparse
+from pathlib import Path
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+from feature_store import FeatureStore
+from keyscape import DEFAULT_LEVELS, scape_levels, prefix_sums, window_sums
+from performance_network import CURVE_KINDS, beat_curves
+from plot_rendering import FIGURE_SIZE, DPI, PLOT_WIDTH, plot_mode, emit_figure, add_plot_arguments
+from stage_profile import StageProfiler, add_profile_arguments, profiler_from_args
+
+# Shared features consumed by analyze_scapes
+FEATURES = ("rms", "beat_track")
+
+# A window counts as an arch when its curve correlates with a ramp at least this strongly
+ARCH_THRESHOLD = 0.8
+
+# Shortest window reported as an arch, in beats
+MIN_ARCH_BEATS = 4
+
+# Arches reported per curve and direction
+MAX_ARCHES = 10
+
+def place(row, length, values):
+    """Write one row's window values at the column of each window's center"""
+    offset = (length - 1) // 2
+    row[offset:offset + len(values)] = values
+
+def average_scape(curve, levels=DEFAULT_LEVELS):
+    """
+    Mean of a per-beat curve over every window
+
+    Args:
+        curve: One value per beat
+        levels: Maximum number of window lengths (rows)
+
+    Returns:
+        tuple: (lengths, (rows, n) float32 means placed as in keyscape.keyscape,
+        NaN outside the triangle)
+    """
+    n = len(curve)
+    prefix = prefix_sums(curve)
+    lengths = scape_levels(n, levels)
+    scape = np.full((len(lengths), n), np.nan, dtype=np.float32)
+    for row, length in enumerate(lengths):
+        place(scape[row], length, window_sums(prefix, length) / length)
+    return lengths, scape
+
+def arch_scape(curve, levels=DEFAULT_LEVELS):
+    """
+    Pearson correlation of every window of a curve with a rising ramp
+
+    Positive values mark windows that get louder/faster, negative ones
+    windows that get softer/slower. With local position t = 0..L-1, the
+    window sums of x, x^2 and t*x are differences of prefix sums of x, x^2
+    and i*x (i the global beat index, sum t*x = sum i*x - start * sum x),
+    and the ramp's own sums are closed-form, so no window is re-fitted.
+
+    Returns:
+        tuple: (lengths, (rows, n) float32 correlations placed as in
+        keyscape.keyscape, NaN outside the triangle and for flat windows)
+    """
+    curve = np.asarray(curve, dtype=np.float64)
+    n = len(curve)
+    centered = curve - curve.mean()  # Keeps the prefix sums well conditioned
+    prefix = prefix_sums(np.stack([centered, centered * centered, np.arange(n) * centered]))
+    lengths = scape_levels(n, levels)
+    scape = np.full((len(lengths), n), np.nan, dtype=np.float32)
+    for row, length in enumerate(lengths):
+        if length < 2:
+            continue  # A single beat has no slope
+        sx, sxx, six = window_sums(prefix, length)
+        starts = np.arange(len(sx))
+        st = length * (length - 1) / 2
+        stt = (length - 1) * length * (2 * length - 1) / 6
+        cov = six - starts * sx - st * sx / length
+        var = np.maximum(sxx - sx * sx / length, 0) * (stt - st * st / length)
+        flat = var < 1e-12
+        place(scape[row], length, np.where(flat, np.nan, cov / np.sqrt(np.where(flat, 1, var))))
+    return lengths, scape
+
+def find_arches(lengths, scape, beat_times, threshold=ARCH_THRESHOLD, min_beats=MIN_ARCH_BEATS,
+                limit=MAX_ARCHES):
+    """
+    Longest non-overlapping rising and falling arches of an arch scape
+
+    Longer windows are taken first, and within a row the strongest; a
+    window overlapping one already taken in the same direction is skipped.
+
+    Returns:
+        dict: rising and falling lists of {start, end, beats, correlation}
+    """
+    arches = {}
+    for direction, sign in (("rising", 1), ("falling", -1)):
+        taken = np.zeros(scape.shape[1], dtype=bool)
+        found = []
+        for row in np.argsort(-lengths):
+            length = int(lengths[row])
+            if length < min_beats or len(found) >= limit:
+                break
+            values = sign * scape[row]
+            candidates = np.flatnonzero(np.nan_to_num(values, nan=-1) >= threshold)
+            for center in candidates[np.argsort(-values[candidates])]:
+                start = center - (length - 1) // 2
+                if taken[start:start + length].any():
+                    continue
+                taken[start:start + length] = True
+                found.append({"start": float(beat_times[start]),
+                              "end": float(beat_times[min(start + length, len(beat_times) - 1)]),
+                              "beats": length, "correlation": float(scape[row, center])})
+                if len(found) >= limit:
+                    break
+        arches[direction] = sorted(found, key=lambda arch: arch["start"])
+    return arches
+
+def render_scapes_figure(plot_path, lengths, beat_times, tempo_average, tempo_arch, dynamics_average,
+                         dynamics_arch, decimate=False):
+    """Draw the timescape, dynascape and both arch scapes to plot_path"""
+    panels = ((tempo_average, "Timescape (average tempo, BPM)", "viridis", None),
+              (tempo_arch, "Tempo Arch Scape (red = accelerating)", "coolwarm", (-1, 1)),
+              (dynamics_average, "Dynascape (average intensity)", "magma", None),
+              (dynamics_arch, "Dynamics Arch Scape (red = crescendo)", "coolwarm", (-1, 1)))
+    step = -(-tempo_average.shape[1] // PLOT_WIDTH) if decimate else 1
+    ticks = np.linspace(0, len(lengths) - 1, min(6, len(lengths))).round().astype(int)
+    fig, axes = plt.subplots(4, 1, figsize=FIGURE_SIZE)
+    for ax, (scape, title, colormap, limits) in zip(axes, panels):
+        image = ax.imshow(np.ma.masked_invalid(scape[:, ::step]), origin='lower', aspect='auto',
+                          interpolation='nearest', cmap=colormap,
+                          extent=[beat_times[0], beat_times[-1], 0, len(lengths)],
+                          **({"vmin": limits[0], "vmax": limits[1]} if limits else {}))
+        ax.set_yticks(ticks + 0.5)
+        ax.set_yticklabels([str(lengths[tick]) for tick in ticks])
+        ax.set_ylabel('Window (beats)')
+        ax.set_title(title)
+        plt.colorbar(image, ax=ax)
+    axes[-1].set_xlabel('Time (s)')
+    plt.tight_layout()
+    plt.savefig(plot_path, dpi=DPI, bbox_inches='tight')
+    print(f"Saved scapes: {plot_path}")
+    plt.close()
+
+def analyze_scapes(audio_path, output_dir="scape_analysis", features=None, levels=DEFAULT_LEVELS, plot=True,
+                   decimate=False, profiler=None):
+    """
+    Timescape, dynascape and arch scapes of an audio file
+
+    Args:
+        audio_path: Path to audio file
+        output_dir: Directory to save outputs
+        features: Optional FeatureStore shared with other analyzers of the same track
+        levels: Maximum number of window lengths (rows of each scape)
+        plot: True/"inline" to render the scapes, "deferred" to save their
+            arrays for plot_rendering.py, False/"none" to skip them
+        decimate: Thin the scapes' columns to the figure's pixel width
+        profiler: Optional StageProfiler that measures the analysis; its
+            stages are added to the report's profile section
+
+    Returns:
+        dict: Rising and falling arches of tempo and dynamics, and the output files
+    """
+    output_path = Path(output_dir)
+    output_path.mkdir(exist_ok=True)
+
+    if features is None:
+        features = FeatureStore(audio_path)
+    if profiler is None:
+        profiler = StageProfiler()
+    features.profiler = profiler
+
+    print(f"Building scapes: {audio_path}")
+
+    # 1. PER-BEAT TEMPO AND DYNAMICS
+    curves = beat_curves(features)
+    beat_times = curves["beat_times"]
+
+    # 2. AVERAGE AND ARCH SCAPES
+    arrays = {}
+    arches = {}
+    with profiler.stage("scapes"):
+        for kind in CURVE_KINDS:
+            lengths, arrays[f"{kind}_average"] = average_scape(curves[kind], levels)
+            _, arrays[f"{kind}_arch"] = arch_scape(curves[kind], levels)
+            arches[kind] = find_arches(lengths, arrays[f"{kind}_arch"], beat_times)
+
+    # 3. OUTPUT
+    data_path = output_path / "scapes.npz"
+    np.savez(data_path, lengths=lengths, beat_times=beat_times, **arrays)
+    output_files = {"data": str(data_path)}
+    if plot_mode(plot) != "none":
+        with profiler.stage("plot"):
+            output_files["scapes"] = emit_figure(
+                render_scapes_figure, output_path / "scapes.png", plot, decimate,
+                lengths=lengths, beat_times=beat_times, **arrays
+            )
+
+    results = {
+        "file": str(audio_path),
+        "duration_seconds": float(features.duration),
+        "beats": int(len(beat_times)),
+        "levels": int(len(lengths)),
+        "tempo": {"mean_bpm": float(np.mean(curves["tempo"])), "arches": arches["tempo"]},
+        "dynamics": {"mean_intensity": float(np.mean(curves["dynamics"])), "arches": arches["dynamics"]},
+        "output_files": output_files,
+        "profile": profiler.report(output_path)
+    }
+
+    json_path = output_path / "scapes_report.json"
+    with open(json_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved scape analysis: {json_path}")
+
+    return results
+
+if __name__ == "__main__":
+    from feature_options import add_feature_arguments, feature_store_from_args
+
+    parser = argparse.ArgumentParser(description="Timescape, dynascape and arch scapes of an audio file")
+    parser.add_argument("audio_file")
+    parser.add_argument("output_dir", nargs="?", default="scape_analysis")
+    parser.add_argument("--levels", type=int, default=DEFAULT_LEVELS,
+                        help=f"maximum number of window lengths (default: {DEFAULT_LEVELS})")
+    add_feature_arguments(parser)
+    add_plot_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    features = feature_store_from_args(args.audio_file, args, FEATURES)
+    analyze_scapes(args.audio_file, args.output_dir, features=features, levels=args.levels,
+                   plot=args.plots, decimate=args.decimate_plots, profiler=profiler_from_args(args))
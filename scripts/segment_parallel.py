@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Segment Parallel - Frame-aligned segment executor for long tracks
+Cuts a signal into segments on the hop grid, each read with enough extra
+audio on both sides for every frame it keeps to see exactly the samples it
+would see in the whole signal, computes a feature on every segment across a
+process pool, and stitches the kept frames (or samples) back together
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import librosa
+import numpy as np
+
+from workers import WORKER_ENVIRONMENT, default_workers
+
+# Frames kept from each segment; long enough that the overlap margins are
+# a small part of the work, short enough to balance an hour across cores
+SEGMENT_SECONDS = 60.0
+
+# chroma_cqt's default constant-Q resolution; its tuning is measured in these bins
+CHROMA_BINS_PER_OCTAVE = 36
+
+# librosa.effects.hpss defaults: STFT size and hop, and the median
+# filter length in frames
+HPSS_N_FFT = 2048
+HPSS_HOP_LENGTH = 512
+HPSS_KERNEL = 31
+
+# Worker pools by size, spawned on first use and shared by every feature
+# stage of the process, so each stage does not pay for starting workers
+# and importing librosa again
+_pools = {}
+
+def segment_spans(n_samples, hop_length, segment_frames, margin_frames):
+    """
+    Split the frames of a signal into segments
+
+    Returns:
+        tuple: (cores, spans): the [first, last) frames each segment keeps,
+        and the [start, stop) samples it reads, extended by margin_frames
+        hops on both sides and starting on the hop grid
+    """
+    n_frames = 1 + n_samples // hop_length
+    cores = [(f0, min(f0 + segment_frames, n_frames)) for f0 in range(0, n_frames, segment_frames)]
+    spans = [(max(0, (f0 - margin_frames) * hop_length), min(n_samples, (f1 + margin_frames) * hop_length))
+             for f0, f1 in cores]
+    return cores, spans
+
+def resolve_workers(workers, n_segments):
+    """
+    Worker processes for n_segments segments
+
+    None means the available cores, or 1 inside a worker process (such as
+    a batch_analysis worker) so pools are never nested.
+    """
+    if workers is None:
+        workers = 1 if multiprocessing.parent_process() is not None else default_workers()
+    return max(1, min(workers, n_segments))
+
+def worker_pool(workers):
+    """The shared pool of workers spawned processes"""
+    if workers not in _pools:
+        for name, value in WORKER_ENVIRONMENT.items():
+            os.environ.setdefault(name, value)
+        _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pools[workers]
+
+def map_segments(function, y, spans, workers=None):
+    """
+    Apply function to y[start:stop] of every span, in order
+
+    function must be picklable (a module-level function or a partial of
+    one). With a single worker the segments run inline.
+    """
+    workers = resolve_workers(workers, len(spans))
+    if workers == 1:
+        return [function(y[start:stop]) for start, stop in spans]
+    try:
+        return list(worker_pool(workers).map(function, (y[start:stop] for start, stop in spans)))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for running out of memory); start over
+        # with fresh workers next time
+        _pools.pop(workers).shutdown(wait=False)
+        raise
+
+def stitch_frames(cores, spans, results, hop_length):
+    """Concatenate the kept frames of every segment's (..., frames) result"""
+    kept = []
+    for (f0, f1), (start, _), result in zip(cores, spans, results):
+        offset = f0 - start // hop_length
+        kept.append(result[..., offset:offset + f1 - f0])
+    return np.concatenate(kept, axis=-1)
+
+def stitch_samples(cores, spans, results, hop_length, n_samples):
+    """Concatenate the samples between the kept frames of every segment's (..., samples) result"""
+    kept = []
+    for (f0, f1), (start, _), result in zip(cores, spans, results):
+        first, last = f0 * hop_length, min(f1 * hop_length, n_samples)
+        kept.append(result[..., first - start:last - start])
+    return np.concatenate(kept, axis=-1)
+
+def balanced_spans(n_samples, sr, hop_length, margin_frames, segment_seconds):
+    """segment_spans with segments of equal length, at most segment_seconds, so none is a short leftover"""
+    n_frames = 1 + n_samples // hop_length
+    n_segments = -(-n_frames // max(1, int(segment_seconds * sr) // hop_length))
+    return segment_spans(n_samples, hop_length, -(-n_frames // n_segments), margin_frames)
+
+def parallel_frames(function, y, sr, hop_length, margin_frames, workers=None, segment_seconds=SEGMENT_SECONDS):
+    """
+    Compute a centered frame-level feature of y segment by segment
+
+    function(segment) must return (..., frames) with frame i centered on
+    sample i * hop_length of the segment, reading at most margin_frames
+    hops on either side of it. Frames then match function(y) wherever the
+    feature itself is exact under a shift by whole hops. With one worker,
+    or a track that fits in one segment, function(y) runs directly.
+
+    Args:
+        workers: Worker processes (default: available cores, or 1 inside a
+            worker process)
+    """
+    cores, spans = balanced_spans(len(y), sr, hop_length, margin_frames, segment_seconds)
+    if resolve_workers(workers, len(spans)) == 1:
+        return function(y)
+    return stitch_frames(cores, spans, map_segments(function, y, spans, workers), hop_length)
+
+def parallel_samples(function, y, sr, hop_length, margin_frames, workers=None, segment_seconds=SEGMENT_SECONDS):
+    """
+    Compute a signal-to-signal transform of y segment by segment
+
+    Like parallel_frames, for a function returning (..., samples) as long
+    as its input, computed from frames of hop_length that read at most
+    margin_frames hops away; the samples between each segment's kept
+    frames are stitched.
+    """
+    cores, spans = balanced_spans(len(y), sr, hop_length, margin_frames, segment_seconds)
+    if resolve_workers(workers, len(spans)) == 1:
+        return function(y)
+    return stitch_samples(cores, spans, map_segments(function, y, spans, workers), hop_length, len(y))
+
+# Segment functions and the margins they need
+
+def stft_magnitude(y, n_fft, hop_length):
+    """STFT magnitude spectrogram"""
+    return np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length))
+
+def stft_margin(n_fft, hop_length):
+    """Hops a centered window of n_fft samples reaches on either side"""
+    return -(-n_fft // (2 * hop_length))
+
+def cqt_chroma(y, sr, hop_length, tuning):
+    """Constant-Q chromagram with a fixed tuning, so every segment is tuned alike"""
+    return librosa.feature.chroma_cqt(y=y, sr=sr, hop_length=hop_length, tuning=tuning)
+
+def cqt_margin(sr, hop_length, bins_per_octave=CHROMA_BINS_PER_OCTAVE):
+    """
+    Hops covered by the longest filter of chroma_cqt's lowest octave (C1,
+    with the widest tuning correction)
+
+    A whole filter length on either side rather than half of it, which also
+    covers the edges of the resampling filters used to decimate the signal
+    for the lower octaves.
+    """
+    freqs = librosa.cqt_frequencies(n_bins=7 * bins_per_octave, bins_per_octave=bins_per_octave,
+                                    fmin=librosa.note_to_hz("C1") * 2 ** (-0.5 / bins_per_octave))
+    lengths, _ = librosa.filters.wavelet_lengths(freqs=freqs, sr=sr)
+    return int(np.ceil(lengths.max() / hop_length))
+
+def harmonic_percussive(y):
+    """Harmonic and percussive components, stacked as (2, samples)"""
+    return np.stack(librosa.effects.hpss(y))
+
+def hpss_margin():
+    """
+    Hops a sample of the HPSS output depends on: the inverse STFT reads the
+    frames whose windows cover it, their masks the median filter's half
+    length of frames around those, and each of those its own window
+    """
+    return HPSS_KERNEL // 2 + 2 * stft_margin(HPSS_N_FFT, HPSS_HOP_LENGTH)
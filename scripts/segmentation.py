@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Segmentation - Section boundaries and repeat labels from beat-synchronous features
+Averages chroma (harmony) and MFCCs (timbre) per beat, keeps only the band
+of the self-similarity matrix around its diagonal, and finds section
+boundaries with a checkerboard-kernel novelty curve computed diagonal by
+diagonal. Sections are then labelled by clustering their feature summaries,
+so repeats are found without ever forming the full beats x beats matrix.
+Memory stays proportional to beats x band width for hour-long inputs
+"""
+
+import json
+import string
+import argparse
+from pathlib import Path
+
+import numpy as np
+import matplotlib.pyplot as plt
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.signal import find_peaks
+
+from feature_store import FeatureStore
+from keyscape import beat_columns
+from plot_rendering import FIGURE_SIZE, DPI, PLOT_WIDTH, plot_mode, emit_figure, add_plot_arguments
+from stage_profile import StageProfiler, add_profile_arguments, profiler_from_args
+
+# Shared features consumed by analyze_segmentation
+FEATURES = ("chroma", "mfcc", "beat_track")
+
+# Half width of the checkerboard kernel in beats (4 bars of 4/4); the
+# similarity band spans twice this on either side of the diagonal
+KERNEL_BEATS = 16
+
+# Sections are at least this many beats long (2 bars of 4/4)
+MIN_SECTION_BEATS = 8
+
+# A boundary's novelty peak must stand out by this fraction of the highest peak
+MIN_PROMINENCE = 0.1
+
+# Sections whose summaries are closer than this cosine distance share a label
+LABEL_DISTANCE = 0.05
+
+# Beats per bar assumed when reporting section lengths in bars
+BEATS_PER_BAR = 4
+
+def beat_vectors(chroma, mfcc):
+    """
+    Unit-length beat feature vectors weighting harmony and timbre equally
+
+    Each beat's chroma is scaled to unit length; the MFCCs without the
+    loudness coefficient are standardized over the track, then scaled to
+    unit length, so the cosine similarity of two beats is the mean of their
+    chroma and timbre similarities.
+
+    Args:
+        chroma: (12, beats) beat-synchronous chroma
+        mfcc: (n_mfcc, beats) beat-synchronous MFCCs
+
+    Returns:
+        np.ndarray: (beats, dims) float32
+    """
+    def unit(columns):
+        return columns / np.maximum(np.linalg.norm(columns, axis=0, keepdims=True), 1e-10)
+
+    timbre = mfcc[1:]
+    timbre = (timbre - timbre.mean(axis=1, keepdims=True)) / (timbre.std(axis=1, keepdims=True) + 1e-10)
+    return (np.vstack([unit(chroma), unit(timbre)]) / np.sqrt(2)).T.astype(np.float32)
+
+def banded_similarity(vectors, width):
+    """
+    Band of the self-similarity matrix on and above its diagonal
+
+    band[i, d] is the similarity of beats i and i + d for d = 0..width,
+    computed one diagonal at a time; entries past the last beat are zero.
+    The rest of the band follows by symmetry.
+
+    Returns:
+        np.ndarray: (beats, width + 1) float32
+    """
+    n = len(vectors)
+    band = np.zeros((n, width + 1), dtype=np.float32)
+    for d in range(min(width, n - 1) + 1):
+        band[:n - d, d] = np.einsum('ij,ij->i', vectors[:n - d], vectors[d:])
+    return band
+
+def checkerboard_novelty(band, kernel_beats=KERNEL_BEATS):
+    """
+    Foote novelty of every beat from a similarity band
+
+    The Gaussian-tapered checkerboard kernel of half width kernel_beats is
+    applied one diagonal at a time: along diagonal d the kernel reduces to
+    a weight vector, so each diagonal adds one sliding dot product over the
+    band column, and beats outside the track count as zero similarity.
+
+    Args:
+        band: From banded_similarity with width >= 2 * kernel_beats - 1
+
+    Returns:
+        np.ndarray: Novelty per beat, scaled to a maximum of 1
+    """
+    n = len(band)
+    k = kernel_beats
+    offsets = np.arange(-k, k)
+    taper = np.exp(-0.5 * ((offsets + 0.5) / (0.5 * k)) ** 2)
+    sign = np.where(offsets >= 0, 1.0, -1.0)
+    kernel = np.outer(sign * taper, sign * taper)
+
+    novelty = np.zeros(n)
+    for d in range(min(2 * k, band.shape[1])):
+        # Kernel entries (a, a + d) weight band[i + a, d]; the entries below
+        # the diagonal mirror them
+        weights = np.diagonal(kernel, offset=d) * (1 if d == 0 else 2)
+        column = np.pad(band[:, d].astype(np.float64), (k, k))
+        novelty += sliding_window_view(column, len(weights))[:n] @ weights
+    novelty = np.maximum(novelty, 0)
+    return novelty / novelty.max() if novelty.max() > 0 else novelty
+
+def section_boundaries(novelty, min_beats=MIN_SECTION_BEATS, prominence=MIN_PROMINENCE):
+    """
+    Beat indices where sections start, including 0 and the end
+
+    Boundaries are novelty peaks at least min_beats apart that stand out by
+    prominence.
+    """
+    peaks, _ = find_peaks(novelty, distance=min_beats, prominence=prominence)
+    peaks = peaks[(peaks >= min_beats) & (peaks <= len(novelty) - min_beats)]
+    return np.concatenate([[0], peaks, [len(novelty)]]).astype(int)
+
+def section_label(index):
+    """A, B, ..., Z, then A1, B1, ..."""
+    letter = string.ascii_uppercase[index % 26]
+    return letter if index < 26 else f"{letter}{index // 26}"
+
+def repeat_labels(vectors, boundaries, distance=LABEL_DISTANCE):
+    """
+    Label sections so that repeats share a letter
+
+    Each section is summarized by the mean of its beat vectors; sections are
+    grouped by average-linkage clustering on cosine distance, and letters
+    are assigned in order of first appearance.
+
+    Returns:
+        list: One label per section
+    """
+    summaries = np.array([vectors[a:b].mean(axis=0) for a, b in zip(boundaries[:-1], boundaries[1:])])
+    if len(summaries) < 2:
+        return [section_label(0)] * len(summaries)
+    clusters = fcluster(linkage(summaries, method='average', metric='cosine'), t=distance, criterion='distance')
+    order = {}
+    for cluster in clusters:
+        order.setdefault(cluster, len(order))
+    return [section_label(order[cluster]) for cluster in clusters]
+
+def render_segmentation_figure(plot_path, beat_times, band, novelty, boundaries, labels, decimate=False):
+    """Draw the similarity band, the novelty curve and the labelled sections to plot_path"""
+    step = -(-len(novelty) // PLOT_WIDTH) if decimate else 1
+    label_names = sorted(set(labels))
+    colors = plt.cm.tab20(np.linspace(0, 1, max(len(label_names), 2)))
+    end = beat_times[-1]
+
+    fig, axes = plt.subplots(3, 1, figsize=FIGURE_SIZE, sharex=True,
+                             gridspec_kw={'height_ratios': [3, 2, 1]})
+    image = axes[0].imshow(band[::step].T, origin='lower', aspect='auto', interpolation='nearest',
+                           cmap='magma', extent=[beat_times[0], end, 0, band.shape[1]])
+    axes[0].set_title('Self-Similarity Band (beat vs. the beats after it)')
+    axes[0].set_ylabel('Lag (beats)')
+    plt.colorbar(image, ax=axes, location='right', shrink=0.4, anchor=(0, 1))
+
+    axes[1].plot(beat_times[:len(novelty)], novelty, color='navy', linewidth=1)
+    for boundary in boundaries[1:-1]:
+        axes[1].axvline(beat_times[boundary], color='crimson', linestyle='--', linewidth=0.8)
+    axes[1].set_title('Checkerboard Novelty (dashed = section boundaries)')
+    axes[1].set_ylabel('Novelty')
+    axes[1].grid(True, alpha=0.3)
+
+    for a, b, label in zip(boundaries[:-1], boundaries[1:], labels):
+        start, stop = beat_times[a], beat_times[min(b, len(beat_times) - 1)]
+        axes[2].axvspan(start, stop, color=colors[label_names.index(label)])
+        axes[2].text((start + stop) / 2, 0.5, label, ha='center', va='center', fontweight='bold')
+    axes[2].set_yticks([])
+    axes[2].set_title('Sections (same letter = repeat)')
+    axes[2].set_xlabel('Time (s)')
+    axes[2].set_xlim(beat_times[0], end)
+
+    plt.savefig(plot_path, dpi=DPI, bbox_inches='tight')
+    print(f"Saved segmentation plot: {plot_path}")
+    plt.close()
+
+def analyze_segmentation(audio_path, output_dir="segmentation_analysis", features=None,
+                         kernel_beats=KERNEL_BEATS, min_section_beats=MIN_SECTION_BEATS, plot=True,
+                         decimate=False, profiler=None):
+    """
+    Section boundaries and repeat labels of an audio file
+
+    Args:
+        audio_path: Path to audio file
+        output_dir: Directory to save outputs
+        features: Optional FeatureStore shared with other analyzers of the same track
+        kernel_beats: Half width of the novelty kernel in beats
+        min_section_beats: Shortest section in beats
+        plot: True/"inline" to render the segmentation figure, "deferred"
+            to save its arrays for plot_rendering.py, False/"none" to skip it
+        decimate: Thin the similarity band's columns to the figure's pixel width
+        profiler: Optional StageProfiler that measures the analysis; its
+            stages are added to the report's profile section
+
+    Returns:
+        dict: Sections with their labels, the form string and the output files
+    """
+    output_path = Path(output_dir)
+    output_path.mkdir(exist_ok=True)
+
+    if features is None:
+        features = FeatureStore(audio_path)
+    if profiler is None:
+        profiler = StageProfiler()
+    features.profiler = profiler
+
+    print(f"Segmenting: {audio_path}")
+
+    # 1. BEAT-SYNCHRONOUS FEATURES
+    chroma, beat_times = beat_columns(features, features.chroma)
+    mfcc, _ = beat_columns(features, features.mfcc)
+    with profiler.stage("segmentation"):
+        vectors = beat_vectors(chroma, mfcc)
+
+        # 2. SIMILARITY BAND AND NOVELTY
+        band = banded_similarity(vectors, 2 * kernel_beats)
+        novelty = checkerboard_novelty(band, kernel_beats)
+
+        # 3. BOUNDARIES AND REPEAT LABELS
+        boundaries = section_boundaries(novelty, min_section_beats)
+        labels = repeat_labels(vectors, boundaries)
+
+    # 4. OUTPUT
+    data_path = output_path / "segmentation.npz"
+    np.savez(data_path, beat_times=beat_times, novelty=novelty, boundaries=boundaries, labels=np.array(labels))
+    output_files = {"data": str(data_path)}
+    if plot_mode(plot) != "none":
+        with profiler.stage("plot"):
+            output_files["visualization"] = emit_figure(
+                render_segmentation_figure, output_path / "segmentation.png", plot, decimate,
+                beat_times=beat_times, band=band, novelty=novelty, boundaries=boundaries, labels=np.array(labels)
+            )
+
+    sections = []
+    for a, b, label in zip(boundaries[:-1], boundaries[1:], labels):
+        sections.append({
+            "label": label,
+            "start": float(beat_times[a]),
+            "end": float(beat_times[b]),
+            "beats": int(b - a),
+            "bars": float((b - a) / BEATS_PER_BAR)
+        })
+    repeats = {}
+    for section in sections:
+        entry = repeats.setdefault(section["label"], {"count": 0, "seconds": 0.0})
+        entry["count"] += 1
+        entry["seconds"] += section["end"] - section["start"]
+
+    results = {
+        "file": str(audio_path),
+        "duration_seconds": float(features.duration),
+        "beats": int(len(vectors)),
+        "form": "".join(labels),
+        "sections": sections,
+        "repeats": repeats,
+        "output_files": output_files,
+        "profile": profiler.report(output_path)
+    }
+
+    json_path = output_path / "segmentation_report.json"
+    with open(json_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved segmentation analysis: {json_path}")
+
+    return results
+
+if __name__ == "__main__":
+    from feature_options import add_feature_arguments, feature_store_from_args
+
+    parser = argparse.ArgumentParser(description="Section boundaries and repeat labels of an audio file")
+    parser.add_argument("audio_file")
+    parser.add_argument("output_dir", nargs="?", default="segmentation_analysis")
+    parser.add_argument("--kernel-beats", type=int, default=KERNEL_BEATS,
+                        help=f"half width of the novelty kernel in beats (default: {KERNEL_BEATS})")
+    parser.add_argument("--min-section-beats", type=int, default=MIN_SECTION_BEATS,
+                        help=f"shortest section in beats (default: {MIN_SECTION_BEATS})")
+    add_feature_arguments(parser)
+    add_plot_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    features = feature_store_from_args(args.audio_file, args, FEATURES)
+    analyze_segmentation(args.audio_file, args.output_dir, features=features, kernel_beats=args.kernel_beats,
+                         min_section_beats=args.min_section_beats, plot=args.plots,
+                         decimate=args.decimate_plots, profiler=profiler_from_args(args))
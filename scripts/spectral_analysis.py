@@ -7,18 +7,42 @@ Extracts frequency data, harmonics, and mathematical relationships from audio
 import librosa
 import numpy as np
 import matplotlib.pyplot as plt
+import sys
 import json
+import argparse
 from pathlib import Path
+from feature_store import FeatureStore
+from feature_options import add_feature_arguments, feature_store_from_args
+from frame_export import PITCH_CLASSES, frame_columns, frame_flags, write_frames, add_export_arguments
+from plot_rendering import (
+    FIGURE_SIZE, DPI, plot_mode, emit_figure, decimate_line, decimate_image, add_plot_arguments
+)
+from stage_profile import StageProfiler, add_profile_arguments, profiler_from_args
 import warnings
 warnings.filterwarnings('ignore')
 
-def analyze_audio(audio_path, output_dir="analysis_output"):
+# Shared features consumed by analyze_audio
+FEATURES = (
+    "magnitude", "chroma", "spectral_centroid", "spectral_rolloff", "spectral_bandwidth",
+    "zero_crossing_rate", "rms", "beat_track", "pitch_timeline"
+)
+
+def analyze_audio(audio_path, output_dir="analysis_output", features=None, plot=True, decimate=False, export=None,
+                  profiler=None):
     """
     Comprehensive spectral analysis of an audio file
     
     Args:
         audio_path: Path to audio file
         output_dir: Directory to save output files
+        features: Optional FeatureStore shared with other analyzers of the same track
+        plot: True/"inline" to render the spectrogram figure, "deferred" to save
+            its arrays for plot_rendering.py, False/"none" to skip it
+        decimate: Downsample the figure's timelines to its pixel width
+        export: "npz" or "parquet" to also write every per-frame timeline
+            (analysis_frames.*), None to skip it
+        profiler: Optional StageProfiler that measures the analysis; its
+            stages are added to the report's profile section
     
     Returns:
         dict: Analysis results including frequency data, harmonics, and metrics
@@ -27,101 +51,75 @@ def analyze_audio(audio_path, output_dir="analysis_output"):
     output_path.mkdir(exist_ok=True)
     
     # Load audio
-    y, sr = librosa.load(audio_path, sr=None)
-    duration = len(y) / sr
+    if features is None:
+        features = FeatureStore(audio_path)
+    if profiler is None:
+        profiler = StageProfiler()
+    features.profiler = profiler
+    sr = features.sr
+    duration = features.duration
     
     print(f"Loaded: {audio_path}")
     print(f"Duration: {duration:.2f}s, Sample rate: {sr}Hz")
     
     # 1. SPECTRAL ANALYSIS
-    # Compute Short-Time Fourier Transform
-    D = librosa.stft(y)
-    magnitude = np.abs(D)
-    phase = np.angle(D)
-    
-    # Convert to dB scale
-    S_db = librosa.amplitude_to_db(magnitude, ref=np.max)
+    # The Short-Time Fourier Transform magnitude (features.magnitude) is computed
+    # once and shared: centroid, rolloff, bandwidth, pitch and onsets below are
+    # all derived from it, as is the spectrogram figure
     
     # 2. HARMONIC ANALYSIS
-    # Separate harmonics from percussives
-    y_harmonic, y_percussive = librosa.effects.hpss(y)
-    
     # Compute chromagram (pitch classes)
-    chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
+    chroma = features.chroma
     
     # 3. FREQUENCY DOMAIN FEATURES
     # Spectral centroid (brightness)
-    spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
+    spectral_centroids = features.spectral_centroid
     
     # Spectral rolloff
-    spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
+    spectral_rolloff = features.spectral_rolloff
     
     # Spectral bandwidth
-    spectral_bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr)[0]
+    spectral_bandwidth = features.spectral_bandwidth
     
     # Zero crossing rate
-    zcr = librosa.feature.zero_crossing_rate(y)[0]
+    zcr = features.zero_crossing_rate
     
     # 4. ENERGY AND DYNAMICS
     # RMS energy
-    rms = librosa.feature.rms(y=y)[0]
+    rms = features.rms
     
     # 5. TEMPO AND RHYTHM
-    tempo, beats = librosa.beat.beat_track(y=y, sr=sr)
+    tempo, beats = features.beat_track
     
     # 6. PITCH DETECTION
-    pitches, magnitudes_pitch = librosa.piptrack(y=y, sr=sr)
-    
-    # Get dominant pitch over time
-    pitch_timeline = []
-    for t in range(pitches.shape[1]):
-        index = magnitudes_pitch[:, t].argmax()
-        pitch = pitches[index, t]
-        pitch_timeline.append(pitch if pitch > 0 else 0)
-    
-    pitch_timeline = np.array(pitch_timeline)
+    # Dominant pitch over time
+    pitch_timeline = features.pitch_timeline
     
     # 7. MATHEMATICAL RELATIONSHIPS
     # Detect consonant/dissonant patterns by analyzing frequency ratios
     consonance_score = calculate_consonance(chroma)
     
     # 8. CREATE VISUALIZATIONS
-    fig, axes = plt.subplots(4, 1, figsize=(14, 12))
-    
-    # Spectrogram
-    img1 = librosa.display.specshow(S_db, sr=sr, x_axis='time', y_axis='hz', ax=axes[0])
-    axes[0].set_title('Spectrogram (Frequency over Time)')
-    axes[0].set_ylabel('Frequency (Hz)')
-    fig.colorbar(img1, ax=axes[0], format='%+2.0f dB')
-    
-    # Chromagram
-    img2 = librosa.display.specshow(chroma, sr=sr, x_axis='time', y_axis='chroma', ax=axes[1])
-    axes[1].set_title('Chromagram (Pitch Classes)')
-    fig.colorbar(img2, ax=axes[1])
-    
-    # Energy and Dynamics
-    times = librosa.times_like(rms, sr=sr)
-    axes[2].plot(times, rms, label='RMS Energy', color='blue', alpha=0.7)
-    axes[2].plot(times, spectral_centroids / sr, label='Spectral Centroid (normalized)', color='red', alpha=0.7)
-    axes[2].set_title('Energy and Spectral Characteristics')
-    axes[2].set_xlabel('Time (s)')
-    axes[2].legend()
-    axes[2].grid(True, alpha=0.3)
-    
-    # Pitch timeline
-    pitch_times = librosa.times_like(pitch_timeline, sr=sr)
-    axes[3].plot(pitch_times, pitch_timeline, color='green', alpha=0.7)
-    axes[3].set_title('Dominant Pitch Over Time')
-    axes[3].set_xlabel('Time (s)')
-    axes[3].set_ylabel('Frequency (Hz)')
-    axes[3].grid(True, alpha=0.3)
-    
-    plt.tight_layout()
+    output_files = {}
+    if plot_mode(plot) != "none":
+        with profiler.stage("plot"):
+            output_files["spectrogram"] = emit_figure(
+                render_spectral_figure, output_path / "spectrogram.png", plot, decimate, spectral_figure_arrays,
+                sr=sr, hop_length=features.hop_length, magnitude=features.magnitude, chroma=chroma, rms=rms,
+                spectral_centroids=spectral_centroids, pitch_timeline=pitch_timeline
+            )
     
-    spectrogram_path = output_path / "spectrogram.png"
-    plt.savefig(spectrogram_path, dpi=150, bbox_inches='tight')
-    print(f"Saved spectrogram: {spectrogram_path}")
-    plt.close()
+    # Every frame-level timeline, for downstream tools that need more than the summary
+    if export:
+        with profiler.stage("export"):
+            frames = frame_columns(
+                librosa.times_like(rms, sr=sr, hop_length=features.hop_length),
+                rms=rms, spectral_centroid=spectral_centroids, spectral_rolloff=spectral_rolloff,
+                spectral_bandwidth=spectral_bandwidth, zero_crossing_rate=zcr, pitch_hz=pitch_timeline,
+                beat=frame_flags(len(rms), beats),
+                **{f"chroma_{name}": row for name, row in zip(PITCH_CLASSES, chroma)}
+            )
+            output_files["frames"] = write_frames(output_path / "analysis_frames", frames, export)
     
     # 9. COMPILE RESULTS
     results = {
@@ -144,11 +142,10 @@ def analyze_audio(audio_path, output_dir="analysis_output"):
         },
         "harmonic_characteristics": {
             "consonance_score": float(consonance_score),
-            "mean_pitch_hz": float(np.mean([p for p in pitch_timeline if p > 0] or [0]))
+            "mean_pitch_hz": mean_voiced_pitch(pitch_timeline)
         },
-        "output_files": {
-            "spectrogram": str(spectrogram_path)
-        }
+        "output_files": output_files,
+        "profile": profiler.report(output_path)
     }
     
     # Save JSON report
@@ -159,6 +156,81 @@ def analyze_audio(audio_path, output_dir="analysis_output"):
     
     return results
 
+def mean_voiced_pitch(pitch_timeline):
+    """
+    Mean of the frames where a pitch was detected (0 if there are none)
+    """
+    voiced = pitch_timeline[pitch_timeline > 0]
+    return float(np.mean(voiced)) if voiced.size else 0.0
+
+def spectral_figure_arrays(sr, hop_length, magnitude, chroma, rms, spectral_centroids, pitch_timeline, decimate=False):
+    """
+    The images and timelines render_spectral_figure draws, with their times
+    
+    With decimate, the images are max-pooled and the timelines reduced to
+    their min/max envelope at the figure's pixel width.
+    """
+    spectrogram_times = librosa.times_like(magnitude, sr=sr, hop_length=hop_length)
+    chroma_times = librosa.times_like(chroma, sr=sr, hop_length=hop_length)
+    times = librosa.times_like(rms, sr=sr, hop_length=hop_length)
+    pitch_times = librosa.times_like(pitch_timeline, sr=sr, hop_length=hop_length)
+    rms_times, centroid_times, centroid = times, times, spectral_centroids / sr
+    if decimate:
+        # Max-pooling commutes with the dB conversion, so pool the magnitudes first
+        magnitude, spectrogram_times = decimate_image(magnitude, spectrogram_times)
+        chroma, chroma_times = decimate_image(chroma, chroma_times)
+        rms_times, rms = decimate_line(times, rms)
+        centroid_times, centroid = decimate_line(times, centroid)
+        pitch_times, pitch_timeline = decimate_line(pitch_times, pitch_timeline)
+    return {
+        "sr": sr, "magnitude": magnitude, "spectrogram_times": spectrogram_times, "chroma": chroma,
+        "chroma_times": chroma_times, "rms_times": rms_times, "rms": rms, "centroid_times": centroid_times,
+        "centroid": centroid, "pitch_times": pitch_times, "pitch_timeline": pitch_timeline
+    }
+
+def render_spectral_figure(plot_path, sr, magnitude, spectrogram_times, chroma, chroma_times, rms_times, rms,
+                           centroid_times, centroid, pitch_times, pitch_timeline):
+    """
+    Draw the spectrogram, chromagram, energy and pitch panels to plot_path
+    from spectral_figure_arrays
+    """
+    # Convert to dB scale
+    S_db = librosa.amplitude_to_db(magnitude, ref=np.max)
+    
+    fig, axes = plt.subplots(4, 1, figsize=FIGURE_SIZE)
+    
+    # Spectrogram
+    img1 = librosa.display.specshow(S_db, sr=sr, x_coords=spectrogram_times, x_axis='time', y_axis='hz', ax=axes[0])
+    axes[0].set_title('Spectrogram (Frequency over Time)')
+    axes[0].set_ylabel('Frequency (Hz)')
+    fig.colorbar(img1, ax=axes[0], format='%+2.0f dB')
+    
+    # Chromagram
+    img2 = librosa.display.specshow(chroma, sr=sr, x_coords=chroma_times, x_axis='time', y_axis='chroma', ax=axes[1])
+    axes[1].set_title('Chromagram (Pitch Classes)')
+    fig.colorbar(img2, ax=axes[1])
+    
+    # Energy and Dynamics
+    axes[2].plot(rms_times, rms, label='RMS Energy', color='blue', alpha=0.7)
+    axes[2].plot(centroid_times, centroid, label='Spectral Centroid (normalized)', color='red', alpha=0.7)
+    axes[2].set_title('Energy and Spectral Characteristics')
+    axes[2].set_xlabel('Time (s)')
+    axes[2].legend()
+    axes[2].grid(True, alpha=0.3)
+    
+    # Pitch timeline
+    axes[3].plot(pitch_times, pitch_timeline, color='green', alpha=0.7)
+    axes[3].set_title('Dominant Pitch Over Time')
+    axes[3].set_xlabel('Time (s)')
+    axes[3].set_ylabel('Frequency (Hz)')
+    axes[3].grid(True, alpha=0.3)
+    
+    plt.tight_layout()
+    
+    plt.savefig(plot_path, dpi=DPI, bbox_inches='tight')
+    print(f"Saved spectrogram: {plot_path}")
+    plt.close()
+
 def calculate_consonance(chroma):
     """
     Calculate a consonance score based on chromagram
@@ -179,14 +251,33 @@ def calculate_consonance(chroma):
     
     return consonance
 
-def compare_tracks(audio_path1, audio_path2, output_dir="comparison_output"):
+def compare_tracks(audio_path1, audio_path2, output_dir="comparison_output", cache=None, plot=True, decimate=False,
+                   export=None, features1=None, features2=None):
     """
     Compare spectral characteristics between two audio files
+
+    With a FeatureCache, features of previously analyzed tracks are loaded
+    from disk instead of being recomputed. features1 and features2 are
+    optional feature stores of the two tracks (e.g. from
+    feature_options.build_feature_store, for a quality tier or analysis
+    rate); cache is ignored for a track given one. plot, decimate and export are
+    passed to analyze_audio for both tracks. descriptor_similarity is the
+    score track_similarity.py gives the pair; use that script directly to
+    compare more than two tracks without running the full analysis.
     """
+    from track_similarity import track_descriptor, similarity_matrix
+    
     print(f"\n=== Comparing Two Tracks ===")
     
-    results1 = analyze_audio(audio_path1, output_dir + "/track1")
-    results2 = analyze_audio(audio_path2, output_dir + "/track2")
+    if features1 is None:
+        features1 = FeatureStore(audio_path1, cache=cache)
+    if features2 is None:
+        features2 = FeatureStore(audio_path2, cache=cache)
+    results1 = analyze_audio(audio_path1, output_dir + "/track1", features=features1,
+                             plot=plot, decimate=decimate, export=export)
+    results2 = analyze_audio(audio_path2, output_dir + "/track2", features=features2,
+                             plot=plot, decimate=decimate, export=export)
+    similarity = similarity_matrix(np.stack([track_descriptor(features1), track_descriptor(features2)]))
     
     comparison = {
         "track1": results1["file"],
@@ -206,7 +297,8 @@ def compare_tracks(audio_path1, audio_path2, output_dir="comparison_output"):
         "consonance_difference": abs(
             results1["harmonic_characteristics"]["consonance_score"] - 
             results2["harmonic_characteristics"]["consonance_score"]
-        )
+        ),
+        "descriptor_similarity": float(similarity[0, 1])
     }
     
     output_path = Path(output_dir)
@@ -220,20 +312,34 @@ def compare_tracks(audio_path1, audio_path2, output_dir="comparison_output"):
     return comparison
 
 if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) < 2:
-        print("Usage: python spectral_analysis.py <audio_file> [output_dir]")
-        print("   or: python spectral_analysis.py --compare <audio1> <audio2> [output_dir]")
-        sys.exit(1)
-    
-    if sys.argv[1] == "--compare":
-        if len(sys.argv) < 4:
+    parser = argparse.ArgumentParser(
+        description="Spectral analysis of an audio file, or comparison of two",
+        usage="%(prog)s <audio_file> [output_dir]\n       %(prog)s --compare <audio1> <audio2> [output_dir]"
+    )
+    parser.add_argument("paths", nargs="+", help=argparse.SUPPRESS)
+    parser.add_argument("--compare", action="store_true", help="compare two audio files")
+    add_feature_arguments(parser)
+    add_plot_arguments(parser)
+    add_export_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    
+    if args.compare:
+        if len(args.paths) < 2:
             print("Need two audio files for comparison")
             sys.exit(1)
-        output_dir = sys.argv[4] if len(sys.argv) > 4 else "comparison_output"
-        compare_tracks(sys.argv[2], sys.argv[3], output_dir)
+        if args.stream:
+            parser.error("--stream is not supported with --compare")
+        output_dir = args.paths[2] if len(args.paths) > 2 else "comparison_output"
+        compare_tracks(args.paths[0], args.paths[1], output_dir,
+                       plot=args.plots, decimate=args.decimate_plots, export=args.export_frames,
+                       features1=feature_store_from_args(args.paths[0], args),
+                       features2=feature_store_from_args(args.paths[1], args))
     else:
-        audio_file = sys.argv[1]
-        output_dir = sys.argv[2] if len(sys.argv) > 2 else "analysis_output"
-        analyze_audio(audio_file, output_dir)
+        audio_file = args.paths[0]
+        output_dir = args.paths[1] if len(args.paths) > 1 else "analysis_output"
+        # The full-resolution spectrogram panel is not available in streaming mode
+        features = feature_store_from_args(audio_file, args, FEATURES)
+        plot = "none" if args.stream else args.plots
+        analyze_audio(audio_file, output_dir, features=features, plot=plot, decimate=args.decimate_plots,
+                      export=args.export_frames, profiler=profiler_from_args(args))
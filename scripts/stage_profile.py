@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Stage Profile - Per-stage timing and memory instrumentation for the analyzers
+Records wall time, CPU time and peak memory of every named stage of an
+analysis (decoding, each feature computation, figure rendering, export) for
+the report's profile section, and can wrap chosen stages in cProfile or
+tracemalloc to find the hot spots inside them
+"""
+
+import io
+import sys
+import time
+import pstats
+import cProfile
+import resource
+import tracemalloc
+from pathlib import Path
+from contextlib import contextmanager, nullcontext
+
+PROFILE_HOOKS = ("cprofile", "tracemalloc")
+
+# Functions / allocation sites listed per hooked stage in the report
+HOOK_TOP = 10
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter for this process (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB since the last reset"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Never reset: the peak of the whole process (KB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+class _Frame:
+    """A stage that has been entered and not yet left"""
+
+    def __init__(self, name):
+        self.name = name
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        self.child_wall = 0.0
+        self.child_cpu = 0.0
+        self.peak = 0.0
+        self.hooks = []
+
+class StageProfiler:
+    """
+    Wall time, CPU time and peak RSS of the named stages of one analysis
+
+    Stages nest: a stage's times exclude the stages entered inside it, so
+    the stages of a report add up to its total, while its peak RSS includes
+    them. Time spent outside every explicit stage is charged to the root
+    stage, which starts when the profiler is created. A stage entered
+    several times accumulates its times and keeps its largest peak.
+
+    Peak RSS is measured per stage on Linux, where the kernel's high-water
+    mark can be reset; elsewhere every stage reports the process peak so far.
+
+    Args:
+        root: Name of the stage that collects unstaged time
+        hooks: Any of PROFILE_HOOKS to run inside hooked stages
+        hook_stages: Names of the stages to hook (default: the root stage,
+            i.e. the whole analysis). A hook already running in an outer
+            stage is not restarted by an inner one; the outer stage's
+            profile then covers both.
+    """
+
+    def __init__(self, root="analysis", hooks=(), hook_stages=None):
+        unknown = set(hooks) - set(PROFILE_HOOKS)
+        if unknown:
+            raise ValueError(f"Unknown profile hooks {sorted(unknown)}, expected any of {PROFILE_HOOKS}")
+        self.root = root
+        self.hooks = tuple(hooks)
+        self.hook_stages = {root} if hook_stages is None else set(hook_stages)
+        self.per_stage_peak = reset_peak_rss()
+        self.stages = {}
+        self._profiles = {}
+        self._allocations = {}
+        self._active_hooks = set()
+        self._stack = [_Frame(root)]
+        self._start_hooks(self._stack[0])
+
+    @contextmanager
+    def stage(self, name):
+        """Measure the enclosed code as stage name"""
+        parent = self._stack[-1]
+        parent.peak = max(parent.peak, peak_rss_mb())
+        reset_peak_rss()
+        frame = _Frame(name)
+        self._stack.append(frame)
+        self._start_hooks(frame)
+        try:
+            yield
+        finally:
+            self._stop_hooks(frame)
+            self._stack.pop()
+            wall, cpu, peak = self._record(frame)
+            parent.child_wall += wall
+            parent.child_cpu += cpu
+            parent.peak = max(parent.peak, peak)
+            reset_peak_rss()
+
+    def _record(self, frame):
+        """Add a frame's exclusive times to its stage; returns its inclusive wall, CPU and peak"""
+        wall = time.perf_counter() - frame.wall
+        cpu = time.process_time() - frame.cpu
+        peak = max(frame.peak, peak_rss_mb())
+        stage = self.stages.setdefault(frame.name, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                                    "peak_rss_mb": 0.0})
+        stage["calls"] += 1
+        stage["wall_seconds"] += wall - frame.child_wall
+        stage["cpu_seconds"] += cpu - frame.child_cpu
+        stage["peak_rss_mb"] = max(stage["peak_rss_mb"], peak)
+        return wall, cpu, peak
+
+    def _start_hooks(self, frame):
+        if frame.name not in self.hook_stages:
+            return
+        for hook in self.hooks:
+            if hook in self._active_hooks:
+                continue
+            if hook == "cprofile":
+                self._profiles.setdefault(frame.name, cProfile.Profile()).enable()
+            else:
+                if tracemalloc.is_tracing():
+                    continue  # Traced by whoever started it
+                tracemalloc.start()
+            self._active_hooks.add(hook)
+            frame.hooks.append(hook)
+
+    def _stop_hooks(self, frame):
+        for hook in frame.hooks:
+            if hook == "cprofile":
+                self._profiles[frame.name].disable()
+            else:
+                peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                previous = self._allocations.get(frame.name)
+                if previous is None or peak > previous["peak_mb"]:
+                    top = tracemalloc.take_snapshot().statistics("lineno")[:HOOK_TOP]
+                    self._allocations[frame.name] = {
+                        "peak_mb": round(peak, 2),
+                        "top": [{"line": str(stat.traceback), "size_mb": round(stat.size / (1024 * 1024), 3),
+                                 "count": stat.count} for stat in top]
+                    }
+                tracemalloc.stop()
+            self._active_hooks.discard(hook)
+        frame.hooks = []
+
+    def report(self, output_dir=None):
+        """
+        The profile section of a report
+
+        Ends the root stage and its hooks. cProfile statistics are written
+        to profile_<stage>.prof in output_dir (load them with pstats or
+        snakeviz); the report lists the functions with the most cumulative
+        time and the largest tracemalloc allocation sites.
+
+        Returns:
+            dict: stages (name -> calls, wall_seconds, cpu_seconds,
+            peak_rss_mb), total, and peak_rss_scope ("stage" when peaks are
+            per stage, "process" when they are the process peak)
+        """
+        root = self._stack[0]
+        self._stop_hooks(root)
+        wall, cpu, peak = self._record(root)
+        # Reopen the root so a late report still measures from here
+        self._stack = [_Frame(self.root)]
+
+        stages = {}
+        for name, stage in self.stages.items():
+            stages[name] = {
+                "calls": stage["calls"],
+                "wall_seconds": round(stage["wall_seconds"], 4),
+                "cpu_seconds": round(stage["cpu_seconds"], 4),
+                "peak_rss_mb": round(stage["peak_rss_mb"], 1)
+            }
+            if name in self._profiles:
+                stages[name]["cprofile"] = self._profile_summary(name, output_dir)
+            if name in self._allocations:
+                stages[name]["tracemalloc"] = self._allocations[name]
+        return {
+            "stages": stages,
+            "total": {"wall_seconds": round(wall, 4), "cpu_seconds": round(cpu, 4), "peak_rss_mb": round(peak, 1)},
+            "peak_rss_scope": "stage" if self.per_stage_peak else "process"
+        }
+
+    def _profile_summary(self, name, output_dir):
+        stats = pstats.Stats(self._profiles[name], stream=io.StringIO())
+        summary = {}
+        if output_dir is not None:
+            path = Path(output_dir) / f"profile_{name}.prof"
+            stats.dump_stats(path)
+            summary["stats_file"] = str(path)
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:HOOK_TOP]
+        summary["top"] = [
+            {"function": f"{Path(file).name}:{line}({function})", "calls": calls,
+             "own_seconds": round(own, 4), "cumulative_seconds": round(cumulative, 4)}
+            for (file, line, function), (_, calls, own, cumulative, _) in top
+        ]
+        return summary
+
+def profile_stage(profiler, name):
+    """profiler.stage(name), or a no-op when profiler is None"""
+    return nullcontext() if profiler is None else profiler.stage(name)
+
+def add_profile_arguments(parser):
+    """Add the profiling hook options to an argparse parser"""
+    parser.add_argument("--profile-hook", dest="profile_hooks", action="append", choices=PROFILE_HOOKS, default=[],
+                        help="also run cProfile or tracemalloc inside the hooked stages (repeatable)")
+    parser.add_argument("--profile-stage", dest="profile_stages", action="append",
+                        help="stage to hook, e.g. chroma, hpss or plot (repeatable; default: the whole analysis)")
+
+def profiler_from_args(args):
+    """Build the StageProfiler selected by the parsed options"""
+    return StageProfiler(hooks=args.profile_hooks, hook_stages=args.profile_stages)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Streaming Feature Store - Bounded-memory feature extraction for long recordings
+Reads the track in fixed-size overlapping blocks and assembles the same
+frame-level feature timelines as FeatureStore, without ever holding the whole
+signal or its full spectrogram in memory
+"""
+
+import librosa
+import numpy as np
+import soundfile as sf
+from functools import cached_property
+
+from audio_decode import block_reads_exact
+from stage_profile import profile_stage
+from band_energy import band_energies
+from feature_store import FeatureStore, HOP_LENGTH, N_MFCC
+from pitch_track import peak_pitch
+from segment_parallel import CHROMA_BINS_PER_OCTAVE
+
+# Features assembled block by block; everything derived from them (beat
+# tracking, the analyzers' summaries and peak picking) then runs on the
+# complete timelines exactly as in the in-memory path
+STREAMED = (
+    "rms", "onset_env", "beat_onset_env", "chroma", "pitch_track",
+    "spectral_centroid", "spectral_rolloff", "spectral_bandwidth", "zero_crossing_rate",
+    "band_energies", "mfcc"
+)
+
+# Onset strength at frame t compares frames t-3 and t-2, so each block needs
+# this many frames of spectral context before its first frame
+ONSET_CONTEXT = 3
+
+# Audio context on each side of a block for the constant-Q transform, whose
+# lowest filters span about 1.6 s
+CHROMA_MARGIN_SECONDS = 2.0
+
+DEFAULT_BLOCK_SECONDS = 30.0
+
+class StreamingFeatureStore(FeatureStore):
+    """
+    FeatureStore that computes frame-level features from overlapping blocks
+
+    Peak memory is bounded by the block size plus the 1-D feature timelines
+    themselves (a few bytes per frame). STFT-derived features, RMS, zero
+    crossing rate and pitch are frame-exact because every block is framed
+    with the real neighbouring samples. Three features differ slightly from
+    the in-memory path: the 80 dB floor of the onset envelope and the MFCCs
+    is taken per block rather than over the whole track, and chroma tuning
+    is estimated from the first block rather than the whole track. Features
+    that need the whole signal at once (the decoded audio, the full magnitude
+    spectrogram, HPSS) raise ValueError.
+
+    Args:
+        audio_path: Path to an audio file libsndfile can read in blocks
+            exactly (not MP3)
+        wanted: Feature names the caller will ask for; only the streamed
+            features they depend on are computed (default: all)
+        block_seconds: Length of each analysis block
+        hop_length: Hop size in samples shared by all frame-level features
+    """
+
+    def __init__(self, audio_path, wanted=None, block_seconds=DEFAULT_BLOCK_SECONDS, hop_length=HOP_LENGTH):
+        super().__init__(audio_path, hop_length=hop_length)
+        self.wanted = STREAMED if wanted is None else tuple(wanted)
+        self.block_seconds = block_seconds
+
+    @cached_property
+    def info(self):
+        """Sample rate and length in samples, read from the file header"""
+        with sf.SoundFile(self.audio_path) as audio_file:
+            if not block_reads_exact(audio_file):
+                raise ValueError(f"{self.audio_path}: {audio_file.subtype} audio cannot be decoded block by block "
+                                 "exactly; convert it to WAV/FLAC or analyze it without streaming")
+            return {"sr": int(audio_file.samplerate), "n_samples": int(audio_file.frames)}
+
+    def get(self, name):
+        if name not in self._values and name in STREAMED:
+            streamed = self.pending(self.wanted) | {name}
+            # Every streamed feature comes out of one pass, profiled as a single stage
+            with profile_stage(self.profiler, "stream"):
+                self._stream([feature for feature in STREAMED if feature in streamed])
+        if name in ("audio", "y"):
+            raise ValueError(f"Feature '{name}' needs the whole signal in memory and is not available in streaming mode")
+        return super().get(name)
+
+    def _stream(self, names):
+        sr, n_samples = self.sr, self.info["n_samples"]
+        hop, n_fft = self.hop_length, self.n_fft
+        n_frames = 1 + n_samples // hop
+        block_frames = max(ONSET_CONTEXT + 1, int(self.block_seconds * sr) // hop)
+        margin = max(
+            int(np.ceil(CHROMA_MARGIN_SECONDS * sr / hop)) * hop,
+            ONSET_CONTEXT * hop + n_fft
+        )
+
+        blocks = {name: [] for name in names}
+        tuning = None
+        with sf.SoundFile(self.audio_path) as audio_file:
+            for f0 in range(0, n_frames, block_frames):
+                f1 = min(f0 + block_frames, n_frames)
+
+                # One read covers the STFT frames and the chroma margins
+                start = max(0, f0 * hop - margin)
+                stop = min(n_samples, f1 * hop + margin)
+                audio_file.seek(start)
+                chunk = audio_file.read(stop - start, dtype='float32', always_2d=True).mean(axis=1)
+
+                # Samples under frames g0..f1-1 (centered), padded like the whole-signal path
+                g0 = max(0, f0 - ONSET_CONTEXT)
+                span = (g0 * hop - n_fft // 2, (f1 - 1) * hop + n_fft // 2)
+                framed = _pad_span(chunk, start, n_samples, span, 'constant')
+                keep = f0 - g0
+
+                S = np.abs(librosa.stft(framed, n_fft=n_fft, hop_length=hop, center=False))
+                S_block = S[:, keep:]
+
+                if "rms" in blocks:
+                    blocks["rms"].append(
+                        librosa.feature.rms(y=framed, frame_length=n_fft, hop_length=hop, center=False)[0, keep:]
+                    )
+                if "zero_crossing_rate" in blocks:
+                    edge_framed = _pad_span(chunk, start, n_samples, span, 'edge')
+                    blocks["zero_crossing_rate"].append(
+                        librosa.feature.zero_crossing_rate(edge_framed, frame_length=n_fft, hop_length=hop, center=False)[0, keep:]
+                    )
+                if "spectral_centroid" in blocks:
+                    blocks["spectral_centroid"].append(
+                        librosa.feature.spectral_centroid(S=S_block, sr=sr, n_fft=n_fft, hop_length=hop)[0]
+                    )
+                if "spectral_rolloff" in blocks:
+                    blocks["spectral_rolloff"].append(
+                        librosa.feature.spectral_rolloff(S=S_block, sr=sr, n_fft=n_fft, hop_length=hop)[0]
+                    )
+                if "spectral_bandwidth" in blocks:
+                    blocks["spectral_bandwidth"].append(
+                        librosa.feature.spectral_bandwidth(S=S_block, sr=sr, n_fft=n_fft, hop_length=hop)[0]
+                    )
+                if "band_energies" in blocks:
+                    blocks["band_energies"].append(band_energies(S_block, sr, n_fft))
+                if "pitch_track" in blocks:
+                    blocks["pitch_track"].append(peak_pitch(S_block, sr, n_fft))
+                if "onset_env" in blocks or "beat_onset_env" in blocks or "mfcc" in blocks:
+                    mel_db = librosa.power_to_db(librosa.feature.melspectrogram(S=S ** 2, sr=sr, n_fft=n_fft))
+                    if "mfcc" in blocks:
+                        blocks["mfcc"].append(librosa.feature.mfcc(S=mel_db[:, keep:], n_mfcc=N_MFCC))
+                    for name, aggregate in (("onset_env", np.mean), ("beat_onset_env", np.median)):
+                        if name in blocks:
+                            blocks[name].append(librosa.onset.onset_strength(
+                                S=mel_db, sr=sr, n_fft=n_fft, hop_length=hop, aggregate=aggregate
+                            )[keep:])
+                if "chroma" in blocks:
+                    if tuning is None:
+                        tuning = librosa.estimate_tuning(y=chunk, sr=sr, bins_per_octave=CHROMA_BINS_PER_OCTAVE)
+                    offset = (f0 * hop - start) // hop
+                    chroma = librosa.feature.chroma_cqt(y=chunk, sr=sr, hop_length=hop, tuning=tuning)
+                    blocks["chroma"].append(chroma[:, offset:offset + f1 - f0])
+
+        for name, parts in blocks.items():
+            self._values[name] = np.concatenate(parts, axis=-1)
+            self.computed.append(name)
+
+def _pad_span(chunk, chunk_start, n_samples, span, mode):
+    """
+    Samples span = (a, b) of the track taken from chunk, with the parts that
+    fall outside the track padded the way centered framing pads them
+    """
+    a, b = span
+    inner = chunk[max(a, 0) - chunk_start:min(b, n_samples) - chunk_start]
+    return np.pad(inner, (max(0, -a), max(0, b - n_samples)), mode=mode)
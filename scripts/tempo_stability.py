@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Tempo Stability - Local tempo curve, inter-beat intervals and rubato screening
+Follows the tempo frame by frame from the shared tempogram, measures the
+intervals between tracked beats, and classifies the timing as strict,
+moderate, rubato or hybrid, with accelerandi and ritardandi located in time.
+Every step is linear in track length, so whole catalogs can be screened in
+batch
+"""
+
+import json
+import argparse
+from pathlib import Path
+
+import librosa
+import numpy as np
+import matplotlib.pyplot as plt
+from scipy.ndimage import median_filter
+
+from feature_store import FeatureStore
+from feature_options import add_feature_arguments, feature_store_from_args
+from frame_export import frame_columns, write_frames, add_export_arguments
+from plot_rendering import FIGURE_SIZE, DPI, plot_mode, emit_figure, decimate_line, add_plot_arguments
+from stage_profile import StageProfiler, add_profile_arguments, profiler_from_args
+
+# Shared features consumed by analyze_tempo_stability
+FEATURES = ("local_tempo", "beat_track")
+
+# Median filter applied to the local tempo, removing brief octave slips
+SMOOTH_SECONDS = 4.0
+
+# Windows in which the tempo's coefficient of variation is measured
+WINDOW_SECONDS = 30.0
+
+# Coefficient of variation below which a window is strict, above which it is rubato
+STRICT_CV = 0.02
+RUBATO_CV = 0.06
+
+# A track is hybrid when at least this share of its windows is strict and
+# at least this share rubato
+HYBRID_SHARE = 0.2
+
+# An accelerando/ritardando changes the tempo by at least CHANGE_PERCENT
+# within every CHANGE_SECONDS along it, and over its whole length
+CHANGE_SECONDS = 8.0
+CHANGE_PERCENT = 5.0
+
+STABILITY_LABELS = {
+    "strict": "Strict (grid-locked tempo)",
+    "moderate": "Moderate (slight flexibility)",
+    "rubato": "Rubato (flexible tempo)",
+    "hybrid": "Hybrid (strict and rubato sections)"
+}
+
+def classify_cv(cv):
+    """Stability class of a coefficient of variation"""
+    return "strict" if cv < STRICT_CV else "rubato" if cv > RUBATO_CV else "moderate"
+
+def window_cvs(curve, window_frames):
+    """
+    Coefficient of variation of a curve over consecutive windows
+
+    A trailing partial window is dropped unless it is the only one.
+
+    Returns:
+        np.ndarray: One coefficient per window
+    """
+    count = max(1, len(curve) // window_frames)
+    windows = curve[:count * window_frames].reshape(count, -1) if len(curve) >= window_frames else curve[None]
+    return windows.std(axis=1) / np.maximum(windows.mean(axis=1), 1e-10)
+
+def tempo_changes(curve, times, change_frames, percent=CHANGE_PERCENT):
+    """
+    Accelerandi and ritardandi of a smoothed tempo curve
+
+    Each frame's rate is the relative tempo change across change_frames
+    centered on it; frames whose rate reaches percent in the same direction
+    form a run, reported when the tempo over the whole run also changes by
+    at least percent.
+
+    Returns:
+        list: {type, start, end, from_bpm, to_bpm, change_percent} per run, in time order
+    """
+    half = change_frames // 2
+    if half < 1 or len(curve) <= 2 * half:
+        return []
+    rate = 100 * (curve[2 * half:] / curve[:-2 * half] - 1)
+    direction = np.zeros(len(curve), dtype=np.int8)
+    direction[half:len(curve) - half] = np.where(rate >= percent, 1, np.where(rate <= -percent, -1, 0))
+    bounds = np.flatnonzero(np.diff(direction, prepend=0, append=0))
+    changes = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        change = 100 * (curve[stop - 1] / curve[start] - 1)
+        if direction[start] == 0 or abs(change) < percent or np.sign(change) != direction[start]:
+            continue
+        changes.append({
+            "type": "accelerando" if change > 0 else "ritardando",
+            "start": float(times[start]),
+            "end": float(times[stop - 1]),
+            "from_bpm": float(curve[start]),
+            "to_bpm": float(curve[stop - 1]),
+            "change_percent": float(change)
+        })
+    return changes
+
+def tempo_figure_arrays(times, local_bpm, smoothed_bpm, confidence, beat_times, ibi, change_spans,
+                        change_directions, decimate=False):
+    """
+    The curves render_tempo_figure draws, each with its own times, reduced
+    to their min/max envelope at the figure's pixel width with decimate
+    """
+    arrays = {"beat_times": beat_times, "ibi": ibi, "change_spans": change_spans,
+              "change_directions": change_directions}
+    for name, values in (("local_bpm", local_bpm), ("smoothed_bpm", smoothed_bpm), ("confidence", confidence)):
+        arrays[f"{name}_times"], arrays[name] = decimate_line(times, values) if decimate else (times, values)
+    return arrays
+
+def render_tempo_figure(plot_path, local_bpm_times, local_bpm, smoothed_bpm_times, smoothed_bpm, confidence_times,
+                        confidence, beat_times, ibi, change_spans, change_directions):
+    """
+    Draw the local tempo curve, the inter-beat intervals and the tempogram
+    confidence to plot_path, from tempo_figure_arrays
+    """
+    fig, axes = plt.subplots(3, 1, figsize=FIGURE_SIZE, sharex=True)
+
+    axes[0].plot(local_bpm_times, local_bpm, color='lightsteelblue', linewidth=0.6, label='Local tempo')
+    axes[0].plot(smoothed_bpm_times, smoothed_bpm, color='navy', linewidth=1.2, label='Smoothed')
+    if len(ibi):
+        axes[0].scatter(beat_times[1:], 60 / ibi, s=4, color='darkorange', alpha=0.6, label='Beat-to-beat')
+    for (start, end), direction in zip(change_spans, change_directions):
+        axes[0].axvspan(start, end, alpha=0.15, color='green' if direction > 0 else 'red')
+    axes[0].set_title('Local Tempo (green = accelerando, red = ritardando)')
+    axes[0].set_ylabel('BPM')
+    axes[0].legend(loc='upper right')
+    axes[0].grid(True, alpha=0.3)
+
+    if len(ibi):
+        axes[1].plot(beat_times[1:], ibi, color='darkorange', linewidth=0.8, marker='.', markersize=3)
+        axes[1].axhline(ibi.mean(), color='gray', linestyle='--', linewidth=0.8)
+    axes[1].set_title('Inter-Beat Intervals (flat = strict tempo)')
+    axes[1].set_ylabel('Seconds')
+    axes[1].grid(True, alpha=0.3)
+
+    axes[2].plot(confidence_times, confidence, color='purple', linewidth=0.8)
+    axes[2].set_title('Tempogram Confidence')
+    axes[2].set_ylabel('Autocorrelation')
+    axes[2].set_ylim(0, 1)
+    axes[2].set_xlabel('Time (s)')
+    axes[2].grid(True, alpha=0.3)
+
+    plt.tight_layout()
+    plt.savefig(plot_path, dpi=DPI, bbox_inches='tight')
+    print(f"Saved tempo stability plot: {plot_path}")
+    plt.close()
+
+def analyze_tempo_stability(audio_path, output_dir="tempo_analysis", features=None, plot=True, decimate=False,
+                            export=None, profiler=None):
+    """
+    Local tempo curve and tempo stability of an audio file
+
+    Args:
+        audio_path: Path to audio file
+        output_dir: Directory to save outputs
+        features: Optional FeatureStore shared with other analyzers of the same track
+        plot: True/"inline" to render the tempo figure, "deferred" to save
+            its arrays for plot_rendering.py, False/"none" to skip it
+        decimate: Downsample the figure's timelines to its pixel width
+        export: "npz" or "parquet" to also write the per-frame local and
+            smoothed tempo and confidence (tempo_frames.*), None to skip it
+        profiler: Optional StageProfiler that measures the analysis; its
+            stages are added to the report's profile section
+
+    Returns:
+        dict: Tempo curve statistics, inter-beat interval statistics,
+        stability class and tempo changes
+    """
+    output_path = Path(output_dir)
+    output_path.mkdir(exist_ok=True)
+
+    if features is None:
+        features = FeatureStore(audio_path)
+    if profiler is None:
+        profiler = StageProfiler()
+    features.profiler = profiler
+
+    print(f"Analyzing tempo stability: {audio_path}")
+
+    # 1. LOCAL TEMPO CURVE
+    local_bpm, confidence = features.local_tempo
+    tempo, beats = features.beat_track
+    frames_per_second = features.sr / features.hop_length
+    times = librosa.frames_to_time(np.arange(len(local_bpm)), sr=features.sr, hop_length=features.hop_length)
+    with profiler.stage("tempo_stability"):
+        smoothed_bpm = median_filter(local_bpm, size=max(1, int(SMOOTH_SECONDS * frames_per_second)) | 1,
+                                     mode='nearest')
+
+        # 2. INTER-BEAT INTERVALS
+        beat_times = librosa.frames_to_time(beats, sr=features.sr, hop_length=features.hop_length)
+        ibi = np.diff(beat_times)
+        if len(ibi) > 1:
+            ibi_stats = {
+                "mean_seconds": float(ibi.mean()),
+                "std_seconds": float(ibi.std()),
+                "cv": float(ibi.std() / ibi.mean()),
+                # Mean change between consecutive intervals relative to their mean
+                "jitter": float(np.abs(np.diff(ibi)).mean() / ibi.mean())
+            }
+        else:
+            ibi_stats = None
+
+        # 3. STABILITY
+        cvs = window_cvs(smoothed_bpm, max(1, int(WINDOW_SECONDS * frames_per_second)))
+        classes = [classify_cv(cv) for cv in cvs]
+        shares = {name: classes.count(name) / len(classes) for name in ("strict", "moderate", "rubato")}
+        if shares["strict"] >= HYBRID_SHARE and shares["rubato"] >= HYBRID_SHARE:
+            stability = "hybrid"
+        else:
+            stability = classify_cv(float(np.median(cvs)))
+        changes = tempo_changes(smoothed_bpm, times, max(1, int(CHANGE_SECONDS * frames_per_second)))
+
+    # 4. VISUALIZATION AND EXPORT
+    output_files = {}
+    if plot_mode(plot) != "none":
+        with profiler.stage("plot"):
+            output_files["visualization"] = emit_figure(
+                render_tempo_figure, output_path / "tempo_stability.png", plot, decimate, tempo_figure_arrays,
+                times=times, local_bpm=local_bpm, smoothed_bpm=smoothed_bpm, confidence=confidence,
+                beat_times=beat_times, ibi=ibi,
+                change_spans=np.array([[change["start"], change["end"]] for change in changes]).reshape(-1, 2),
+                change_directions=np.array([1 if change["type"] == "accelerando" else -1 for change in changes])
+            )
+    if export:
+        with profiler.stage("export"):
+            output_files["frames"] = write_frames(
+                output_path / "tempo_frames",
+                frame_columns(times, local_bpm=local_bpm, smoothed_bpm=smoothed_bpm, confidence=confidence),
+                export
+            )
+
+    # 5. COMPILE RESULTS
+    results = {
+        "file": str(audio_path),
+        "duration_seconds": float(features.duration),
+        "global_tempo_bpm": float(tempo),
+        "local_tempo": {
+            "mean_bpm": float(smoothed_bpm.mean()),
+            "median_bpm": float(np.median(smoothed_bpm)),
+            "std_bpm": float(smoothed_bpm.std()),
+            "min_bpm": float(smoothed_bpm.min()),
+            "max_bpm": float(smoothed_bpm.max()),
+            "cv": float(smoothed_bpm.std() / max(smoothed_bpm.mean(), 1e-10)),
+            "mean_confidence": float(confidence.mean())
+        },
+        "inter_beat_intervals": ibi_stats,
+        "stability": {
+            "class": stability,
+            "label": STABILITY_LABELS[stability],
+            "window_seconds": WINDOW_SECONDS,
+            "window_cv": [float(cv) for cv in cvs],
+            "window_shares": shares
+        },
+        "tempo_changes": changes,
+        "output_files": output_files,
+        "profile": profiler.report(output_path)
+    }
+
+    json_path = output_path / "tempo_report.json"
+    with open(json_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved tempo stability analysis: {json_path}")
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local tempo curve and tempo stability of an audio file")
+    parser.add_argument("audio_file")
+    parser.add_argument("output_dir", nargs="?", default="tempo_analysis")
+    add_feature_arguments(parser)
+    add_plot_arguments(parser)
+    add_export_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    features = feature_store_from_args(args.audio_file, args, FEATURES)
+    analyze_tempo_stability(args.audio_file, args.output_dir, features=features,
+                            plot=args.plots, decimate=args.decimate_plots, export=args.export_frames,
+                            profiler=profiler_from_args(args))
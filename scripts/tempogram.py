@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tempogram - Local tempo from the autocorrelation of the onset envelope
+Computes librosa's autocorrelation tempogram block by block, reducing each
+block to the most likely tempo of every frame before the next is computed,
+so the cost is linear in track length and memory stays bounded however
+long the track is
+"""
+
+import librosa
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import fft
+from scipy.signal import get_window
+
+# Onset frames per autocorrelation window (about 9 s at 44.1 kHz, hop 512),
+# librosa's default
+WIN_LENGTH = 384
+
+# Tempi considered, and the log-normal prior that resolves octave ambiguity
+MIN_BPM = 30.0
+MAX_BPM = 300.0
+PRIOR_BPM = 120.0
+PRIOR_OCTAVES = 1.0
+
+# Frames whose tempogram columns exist at the same time
+CHUNK_FRAMES = 8192
+
+def tempogram_blocks(onset_env, win_length=WIN_LENGTH, chunk_frames=CHUNK_FRAMES):
+    """
+    Columns of the autocorrelation tempogram, a block of frames at a time
+
+    Each block equals the matching columns of librosa.feature.tempogram
+    (centered, Hann-windowed, max-normalized), transposed to (frames, lags).
+
+    Yields:
+        tuple: (first frame of the block, (frames, win_length) block)
+    """
+    n = len(onset_env)
+    padded = np.pad(onset_env, win_length // 2, mode="linear_ramp", end_values=0)
+    frames = sliding_window_view(padded, win_length)[:n]
+    window = get_window("hann", win_length, fftbins=True)
+    # Any length of at least 2 * win_length - 1 keeps the autocorrelation linear
+    n_fft = fft.next_fast_len(2 * win_length - 1, real=True)
+    for f0 in range(0, n, chunk_frames):
+        spectrum = fft.rfft(frames[f0:f0 + chunk_frames] * window, n=n_fft, axis=1)
+        block = fft.irfft(np.abs(spectrum) ** 2, n=n_fft, axis=1)[:, :win_length]
+        peak = np.abs(block).max(axis=1, keepdims=True)
+        yield f0, block / np.where(peak > np.finfo(block.dtype).tiny, peak, 1)
+
+def local_tempo(onset_env, sr, hop_length, win_length=WIN_LENGTH):
+    """
+    Most likely tempo of every frame
+
+    The tempogram lag with the highest autocorrelation weighted by a
+    log-normal prior around PRIOR_BPM, among lags between MIN_BPM and
+    MAX_BPM, refined between lags by a parabola through its neighbours so
+    the tempo is not quantized to whole onset frames.
+
+    Returns:
+        np.ndarray: (2, frames) float32: BPM, and the normalized
+        autocorrelation at that lag (0-1) as its confidence
+    """
+    bpms = librosa.tempo_frequencies(win_length, hop_length=hop_length, sr=sr)
+    lags = np.flatnonzero((bpms >= MIN_BPM) & (bpms <= MAX_BPM))
+    lags = lags[lags < win_length - 1]  # Both neighbours of a peak must exist
+    prior = np.exp(-0.5 * (np.log2(bpms[lags] / PRIOR_BPM) / PRIOR_OCTAVES) ** 2)
+    tempo = np.empty((2, len(onset_env)), dtype=np.float32)
+    for f0, block in tempogram_blocks(onset_env, win_length):
+        rows = np.arange(len(block))
+        lag = lags[(block[:, lags] * prior).argmax(axis=1)]
+        before, peak, after = block[rows, lag - 1], block[rows, lag], block[rows, lag + 1]
+        curvature = before - 2 * peak + after
+        shift = np.where(curvature < 0, 0.5 * (before - after) / np.where(curvature < 0, curvature, -1), 0)
+        tempo[0, f0:f0 + len(block)] = 60 * sr / (hop_length * (lag + np.clip(shift, -0.5, 0.5)))
+        tempo[1, f0:f0 + len(block)] = peak
+    return tempo
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Track Index - Persistent nearest-neighbour index over track descriptors
+Keeps the descriptors of a library on disk, answers "which tracks sound like
+this one" with a KD-tree query instead of comparing against every file, and
+takes new tracks incrementally through an append-only journal
+"""
+
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+from functools import cached_property
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from track_similarity import (
+    DESCRIPTOR_VERSION, DESCRIPTOR_SIZE, DESCRIPTOR_TABLE_NAME, DESCRIPTOR_GROUPS,
+    describe_track, describe_tracks, file_stamp, save_descriptor_table, weight_descriptors, parse_weight
+)
+
+JOURNAL_NAME = "journal.jsonl"
+
+# The journal is folded into the descriptor table once it holds this many
+# tracks and at least this fraction of the table
+COMPACT_MIN_TRACKS = 1024
+COMPACT_FRACTION = 0.1
+
+class TrackIndex:
+    """
+    On-disk k-nearest-neighbour index of track descriptors
+
+    The index directory holds the descriptor table (the format
+    track_similarity.py writes) and a journal of tracks inserted since the
+    table was last written. Inserting a track appends one line to the
+    journal, so it costs the same however large the library is; the
+    journal is folded into the table once it grows past COMPACT_FRACTION
+    of it. Queries search a KD-tree built over the table on first use and
+    scan the journal's tracks directly.
+
+    Descriptors are compared after weight_descriptors, so neighbours and
+    similarities match the similarity matrix of track_similarity.py. One
+    process should write to an index at a time.
+
+    Args:
+        index_dir: Directory of the index (created if missing)
+        settings: Feature store options the descriptors are computed with
+        weights: Optional {group: weight} over DESCRIPTOR_GROUPS
+
+    An existing index keeps the settings and weights it was created with;
+    passing different ones raises ValueError.
+    """
+
+    def __init__(self, index_dir, settings=None, weights=None):
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.table_path = self.index_dir / DESCRIPTOR_TABLE_NAME
+        self.journal_path = self.index_dir / JOURNAL_NAME
+        if not self.table_path.exists():
+            # An empty table records the settings every later descriptor must share
+            save_descriptor_table(self.table_path, {}, {"features": settings or {}, "weights": weights or {}})
+
+        with np.load(self.table_path) as table:
+            if int(table["version"]) != DESCRIPTOR_VERSION:
+                raise ValueError(f"{self.index_dir} was built with descriptor version {int(table['version'])}, "
+                                 f"rebuild it for version {DESCRIPTOR_VERSION}")
+            self.settings = json.loads(str(table["settings"]))
+            self.paths = [str(path) for path in table["paths"]]
+            self.stamps = np.stack([table["sizes"], table["mtimes"]], axis=1)
+            self.descriptors = table["descriptors"]
+        if settings is not None and self.settings["features"] != settings:
+            raise ValueError(f"{self.index_dir} was built with {self.settings['features']}, not {settings}")
+        if weights is not None and self.settings["weights"] != weights:
+            raise ValueError(f"{self.index_dir} was built with weights {self.settings['weights']}, not {weights}")
+        self.weights = self.settings["weights"]
+
+        self.rows = {path: row for row, path in enumerate(self.paths)}
+        self.live = np.ones(len(self.paths), dtype=bool)
+        # Tracks from the journal: path -> (size, mtime_ns, descriptor)
+        self.journal = {}
+        if self.journal_path.exists():
+            with open(self.journal_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Truncated by an interrupted insert
+                    self._add(entry["path"], (entry["size"], entry["mtime"]),
+                              np.array(entry["descriptor"], dtype=np.float32))
+
+    def __len__(self):
+        return int(self.live.sum()) + len(self.journal)
+
+    def __contains__(self, path):
+        return path in self.journal or (path in self.rows and self.live[self.rows[path]])
+
+    @cached_property
+    def tree(self):
+        """KD-tree over the weighted descriptors of the table"""
+        return cKDTree(weight_descriptors(self.descriptors, self.weights))
+
+    def stamp(self, path):
+        """Size and mtime_ns a track was indexed with, or None"""
+        if path in self.journal:
+            return self.journal[path][:2]
+        if path in self:
+            return tuple(int(value) for value in self.stamps[self.rows[path]])
+        return None
+
+    def descriptor(self, path):
+        """Stored descriptor of an indexed track, or None"""
+        if path in self.journal:
+            return self.journal[path][2]
+        if path in self:
+            return self.descriptors[self.rows[path]]
+        return None
+
+    def _add(self, path, stamp, descriptor):
+        if path in self.rows:
+            self.live[self.rows[path]] = False  # Superseded by the new descriptor
+        self.journal[path] = (int(stamp[0]), int(stamp[1]), descriptor)
+
+    def insert(self, path, stamp, descriptor):
+        """
+        Add a track, or replace the descriptor of one already indexed
+
+        Args:
+            path: Track path
+            stamp: (size, mtime_ns) of the file the descriptor was computed from
+            descriptor: DESCRIPTOR_SIZE values from track_similarity.track_descriptor
+        """
+        descriptor = np.asarray(descriptor, dtype=np.float32)
+        self._add(path, stamp, descriptor)
+        with open(self.journal_path, "a") as f:
+            f.write(json.dumps({"path": path, "size": int(stamp[0]), "mtime": int(stamp[1]),
+                                "descriptor": descriptor.tolist()}) + "\n")
+        if len(self.journal) >= max(COMPACT_MIN_TRACKS, COMPACT_FRACTION * len(self.paths)):
+            self.compact()
+
+    def compact(self):
+        """Fold the journal into the descriptor table and rebuild the tree"""
+        table = {path: (*self.stamps[row], self.descriptors[row])
+                 for path, row in self.rows.items() if self.live[row]}
+        table.update(self.journal)
+        save_descriptor_table(self.table_path, table, self.settings)
+        self.journal_path.unlink(missing_ok=True)
+
+        self.paths = list(table)
+        self.stamps = np.array([table[path][:2] for path in self.paths], dtype=np.int64).reshape(-1, 2)
+        self.descriptors = np.array([table[path][2] for path in self.paths],
+                                    dtype=np.float32).reshape(-1, DESCRIPTOR_SIZE)
+        self.rows = {path: row for row, path in enumerate(self.paths)}
+        self.live = np.ones(len(self.paths), dtype=bool)
+        self.journal = {}
+        self.__dict__.pop("tree", None)
+
+    def query(self, descriptor, k=10, exclude=()):
+        """
+        The k indexed tracks closest to a descriptor
+
+        Args:
+            descriptor: DESCRIPTOR_SIZE values
+            k: Number of neighbours
+            exclude: Paths never returned (e.g. the query track itself)
+
+        Returns:
+            list: Up to k {"track", "similarity"} dicts, most similar first;
+            similarity is 1 / (1 + weighted distance) as in track_similarity.py
+        """
+        query = weight_descriptors(np.asarray(descriptor, dtype=np.float32)[None], self.weights)[0]
+        exclude = set(exclude)
+        candidates = []
+
+        n_table = len(self.paths)
+        if n_table:
+            # Ask for enough extra neighbours to cover every row that will be skipped
+            hidden = int((~self.live).sum()) + sum(1 for path in exclude if path in self.rows)
+            count = min(k + hidden, n_table)
+            distances, rows = self.tree.query(query, k=count)
+            for distance, row in zip(np.atleast_1d(distances), np.atleast_1d(rows)):
+                if self.live[row] and self.paths[row] not in exclude:
+                    candidates.append((float(distance), self.paths[row]))
+
+        journal = [path for path in self.journal if path not in exclude]
+        if journal:
+            vectors = weight_descriptors(np.array([self.journal[path][2] for path in journal]), self.weights)
+            distances = np.linalg.norm(vectors - query, axis=1)
+            candidates += [(float(distance), path) for distance, path in zip(distances, journal)]
+
+        candidates.sort()
+        return [{"track": path, "similarity": 1 / (1 + distance)} for distance, path in candidates[:k]]
+
+def add_tracks(index, sources, workers=None, **options):
+    """
+    Describe and insert every track in sources that is new or has changed
+
+    Returns:
+        dict: Counts of added, unchanged and failed tracks
+    """
+    from batch_analysis import find_tracks
+
+    tracks = find_tracks(sources)
+    missing = [track for track in tracks if not os.path.isfile(track)]
+    todo = [track for track in tracks if track not in missing and index.stamp(track) != file_stamp(track)]
+    described, descriptors, failed = describe_tracks(todo, workers=workers, **options)
+    for track, descriptor in zip(described, descriptors):
+        index.insert(track, file_stamp(track), descriptor)
+    failed.update({track: "FileNotFoundError: no such file" for track in missing})
+
+    counts = {"added": len(described), "unchanged": len(tracks) - len(todo) - len(missing), "failed": len(failed)}
+    print(f"Indexed {counts['added']} tracks ({counts['unchanged']} unchanged, {counts['failed']} failed); "
+          f"{len(index)} tracks in {index.index_dir}")
+    return counts
+
+def find_similar(index, audio_path, k=10, **options):
+    """
+    The k indexed tracks that sound most like audio_path
+
+    An indexed, unchanged track is looked up by its stored descriptor and
+    never returned as its own neighbour; any other file is described first.
+    """
+    audio_path = str(Path(audio_path).resolve())
+    descriptor = index.descriptor(audio_path)
+    if descriptor is None or index.stamp(audio_path) != file_stamp(audio_path):
+        descriptor, error = describe_track(audio_path, **options)
+        if error:
+            raise RuntimeError(f"Could not describe {audio_path}: {error}")
+    return index.query(descriptor, k, exclude=[audio_path])
+
+if __name__ == "__main__":
+    from feature_options import add_feature_arguments
+
+    parser = argparse.ArgumentParser(description="Persistent nearest-neighbour index of track descriptors")
+    parser.add_argument("--index", default="track_index", help="index directory (default: track_index)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="index new and changed tracks")
+    add.add_argument("sources", nargs="+", help="audio directories, text files listing tracks, or audio files")
+    add.add_argument("-j", "--workers", type=int, help="worker processes (default: available cores)")
+    add.add_argument("--weight", type=parse_weight, action="append", default=[],
+                     help="weight of a descriptor group when the index is created, e.g. chroma=2 (groups: "
+                          + ", ".join(group for group, _ in DESCRIPTOR_GROUPS) + ")")
+    add_feature_arguments(add)
+
+    query = commands.add_parser("query", help="find the indexed tracks that sound most like a file")
+    query.add_argument("audio_file")
+    query.add_argument("-k", type=int, default=10, help="number of neighbours (default: 10)")
+    query.add_argument("--json", action="store_true", help="print the neighbours as JSON")
+
+    commands.add_parser("compact", help="fold the journal into the descriptor table")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        options = {"stream": args.stream, "analysis_sr": args.analysis_sr, "resampler": args.resampler,
+                   "decoder": args.decoder, "pitch_method": args.pitch_method, "quality": args.quality}
+        # Without feature options, an existing index keeps the ones it was created with
+        if (Path(args.index) / DESCRIPTOR_TABLE_NAME).exists() and options == {
+                name: add.get_default(name) for name in options}:
+            options = None
+        try:
+            index = TrackIndex(args.index, settings=options, weights=dict(args.weight) or None)
+        except ValueError as e:
+            parser.error(str(e))
+        counts = add_tracks(index, args.sources, args.workers, cache_dir=args.cache_dir,
+                            segment_workers=args.segment_workers, **index.settings["features"])
+        sys.exit(1 if counts["failed"] else 0)
+
+    if not (Path(args.index) / DESCRIPTOR_TABLE_NAME).exists():
+        parser.error(f"no index in {args.index}; build one with the add command first")
+    try:
+        index = TrackIndex(args.index)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.command == "compact":
+        index.compact()
+        print(f"Compacted {len(index)} tracks in {index.index_dir}")
+    else:
+        neighbours = find_similar(index, args.audio_file, args.k, **index.settings["features"])
+        if args.json:
+            print(json.dumps(neighbours, indent=2))
+        else:
+            for rank, neighbour in enumerate(neighbours, 1):
+                print(f"{rank:>3}. {neighbour['similarity']:.3f}  {neighbour['track']}")
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Track Similarity - N-way comparison of tracks from fixed-length descriptors
+Reduces every track to a short descriptor vector (chroma profile, spectral
+statistics, tempo, intensity arc, consonance), keeps the descriptors in a
+table so they are computed once per track, and derives the full N x N
+similarity matrix in a single vectorized step
+"""
+
+import os
+import sys
+import json
+import argparse
+import multiprocessing
+from pathlib import Path
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from emotional_cadence import smooth_intensity, intensity_thirds
+from spectral_analysis import calculate_consonance
+from workers import WORKER_ENVIRONMENT, default_workers
+
+# Bump whenever the descriptor is computed differently, so stale descriptors are never reused
+DESCRIPTOR_VERSION = 1
+
+# Shared features a descriptor is built from
+DESCRIPTOR_FEATURES = ("chroma", "spectral_centroid", "spectral_rolloff", "spectral_bandwidth", "rms", "beat_track")
+
+# Descriptor layout: (group, number of values). Values are in units where a
+# difference of 1 is a large difference (octaves for frequencies and tempo,
+# 20 dB for loudness), so groups can be compared without per-corpus scaling
+DESCRIPTOR_GROUPS = (
+    ("chroma", 12),      # Mean chromagram, C..B
+    ("spectral", 6),     # Mean and spread in octaves of centroid, rolloff and bandwidth
+    ("tempo", 1),        # log2 BPM
+    ("intensity", 4),    # Early/mid/late intensity relative to the mean, and log10 mean RMS
+    ("consonance", 1),   # log2 consonance score
+)
+DESCRIPTOR_SIZE = sum(size for _, size in DESCRIPTOR_GROUPS)
+
+DESCRIPTOR_TABLE_NAME = "descriptors.npz"
+
+def track_descriptor(features):
+    """
+    Fixed-length descriptor of one track from its FeatureStore
+
+    Returns:
+        np.ndarray: DESCRIPTOR_SIZE float32 values laid out as DESCRIPTOR_GROUPS
+    """
+    chroma = features.chroma
+    tempo, _ = features.beat_track
+    spectral = []
+    for timeline in (features.spectral_centroid, features.spectral_rolloff, features.spectral_bandwidth):
+        octaves = np.log2(np.maximum(timeline, 1.0))
+        spectral += [np.mean(octaves), np.std(octaves)]
+
+    rms = features.rms
+    thirds = np.array(intensity_thirds(smooth_intensity(rms)))
+    mean_rms = np.mean(rms)
+
+    return np.concatenate([
+        np.mean(chroma, axis=1),
+        spectral,
+        [np.log2(max(float(np.atleast_1d(tempo)[0]), 1.0))],
+        thirds / (np.mean(thirds) + 1e-10),
+        [np.log10(mean_rms + 1e-10)],
+        [np.log2(calculate_consonance(chroma) + 1e-10)]
+    ]).astype(np.float32)
+
+def describe_track(audio_path, cache_dir=None, stream=False, analysis_sr=None, resampler="hq", decoder="auto",
+                   pitch_method=None, quality="standard", segment_workers=1):
+    """
+    Descriptor of one track, loaded from the FeatureCache when it has one
+
+    Meant to run in a worker process; errors are returned rather than raised
+    so one unreadable file never stops a collection.
+
+    Returns:
+        tuple: (descriptor or None, error message or None)
+    """
+    from feature_options import build_feature_store
+    try:
+        features = build_feature_store(audio_path, cache_dir, stream, analysis_sr, resampler, decoder,
+                                       wanted=DESCRIPTOR_FEATURES, pitch_method=pitch_method, quality=quality,
+                                       segment_workers=segment_workers)
+        name = f"descriptor_v{DESCRIPTOR_VERSION}"
+        if features.cache is not None:
+            descriptor = features.cache.load(features.cache_key, name)
+            if descriptor is not None:
+                return np.array(descriptor), None
+        descriptor = track_descriptor(features)
+        if features.cache is not None:
+            features.cache.save(features.cache_key, name, descriptor)
+        return descriptor, None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+def file_stamp(audio_path):
+    """Size and modification time of a file, used to tell whether a stored descriptor is stale"""
+    stat = os.stat(audio_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def load_descriptor_table(table_path, settings=None):
+    """
+    Descriptors stored by save_descriptor_table
+
+    An absent table, one written by another DESCRIPTOR_VERSION or with
+    other settings is treated as empty.
+
+    Returns:
+        dict: Track path -> (size, mtime_ns, descriptor)
+    """
+    if not Path(table_path).exists():
+        return {}
+    with np.load(table_path) as table:
+        if int(table["version"]) != DESCRIPTOR_VERSION:
+            return {}
+        if settings is not None and json.loads(str(table["settings"])) != settings:
+            return {}
+        return {
+            str(path): (int(size), int(mtime), descriptor)
+            for path, size, mtime, descriptor in zip(table["paths"], table["sizes"], table["mtimes"],
+                                                     table["descriptors"])
+        }
+
+def save_descriptor_table(table_path, table, settings=None):
+    """Atomically write a descriptor table (track path -> (size, mtime_ns, descriptor))"""
+    paths = list(table)
+    partial_path = Path(table_path).with_suffix(".partial.npz")
+    np.savez(
+        partial_path,
+        version=np.array(DESCRIPTOR_VERSION),
+        settings=np.array(json.dumps(settings or {}, sort_keys=True)),
+        paths=np.array(paths, dtype=str),
+        sizes=np.array([table[p][0] for p in paths], dtype=np.int64),
+        mtimes=np.array([table[p][1] for p in paths], dtype=np.int64),
+        descriptors=np.array([table[p][2] for p in paths], dtype=np.float32).reshape(len(paths), DESCRIPTOR_SIZE)
+    )
+    os.replace(partial_path, table_path)
+
+def descriptor_settings(options):
+    """The feature store options that change a descriptor, recorded with the tables that store it"""
+    return {name: value for name, value in options.items() if name not in ("cache_dir", "segment_workers")}
+
+def describe_tracks(tracks, table_path=None, workers=None, **options):
+    """
+    Descriptors of many tracks, reusing every one already in the table
+
+    A stored descriptor is reused while its file keeps the same size and
+    modification time. The others are computed across a pool of worker
+    processes and added to the table.
+
+    Args:
+        tracks: Audio file paths
+        table_path: Descriptor table to read and update (optional)
+        workers: Worker processes (default: available cores; 1 computes in
+            this process)
+        options: Feature store options passed to describe_track (cache_dir,
+            stream, analysis_sr, resampler, decoder, pitch_method, quality,
+            segment_workers); all but cache_dir and segment_workers, which
+            do not change a descriptor, are recorded with the table
+
+    Returns:
+        tuple: (tracks that have a descriptor, their descriptors as an
+        (N, DESCRIPTOR_SIZE) array, {track: error} for failures)
+    """
+    settings = descriptor_settings(options)
+    table = load_descriptor_table(table_path, settings) if table_path else {}
+    failed = {track: "FileNotFoundError: no such file" for track in tracks if not os.path.isfile(track)}
+    todo = [track for track in tracks
+            if track not in failed and table.get(track, (None, None))[:2] != file_stamp(track)]
+    print(f"{len(tracks) - len(todo) - len(failed)} descriptors reused, {len(todo)} to compute")
+
+    if todo:
+        workers = workers or default_workers()
+        if workers == 1:
+            results = map(partial(describe_track, **options), todo)
+        else:
+            for name, value in WORKER_ENVIRONMENT.items():
+                os.environ.setdefault(name, value)
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            results = pool.map(partial(describe_track, **options), todo, chunksize=4)
+        try:
+            for count, (track, (descriptor, error)) in enumerate(zip(todo, results), 1):
+                if error:
+                    print(f"✗ {track}: {error}")
+                    failed[track] = error
+                    continue
+                table[track] = (*file_stamp(track), descriptor)
+                if count % 100 == 0:
+                    print(f"[{count}/{len(todo)}] descriptors computed")
+        finally:
+            if workers != 1:
+                pool.shutdown()
+            if table_path:
+                save_descriptor_table(table_path, table, settings)
+
+    described = [track for track in tracks if track in table and track not in failed]
+    descriptors = np.array([table[track][2] for track in described], dtype=np.float32)
+    return described, descriptors.reshape(len(described), DESCRIPTOR_SIZE), failed
+
+def weight_descriptors(descriptors, weights=None):
+    """
+    Scale descriptors so each group counts with its weight
+
+    Every group is divided by the square root of its size, so with equal
+    weights the twelve chroma values count as much as the single tempo
+    value.
+
+    Args:
+        descriptors: (N, DESCRIPTOR_SIZE) array
+        weights: Optional {group: weight}; missing groups weigh 1
+    """
+    weights = weights or {}
+    unknown = set(weights) - {group for group, _ in DESCRIPTOR_GROUPS}
+    if unknown:
+        raise ValueError(f"Unknown descriptor groups {sorted(unknown)}")
+    scale = np.concatenate([
+        np.full(size, weights.get(group, 1.0) / np.sqrt(size), dtype=np.float32)
+        for group, size in DESCRIPTOR_GROUPS
+    ])
+    return np.asarray(descriptors, dtype=np.float32) * scale
+
+def similarity_matrix(descriptors, weights=None):
+    """
+    N x N similarity of descriptors: 1 / (1 + weighted Euclidean distance)
+
+    Distances come from one matrix product (|a|^2 + |b|^2 - 2ab), so 5,000
+    tracks take a fraction of a second. Identical tracks score 1.
+
+    Returns:
+        np.ndarray: Symmetric (N, N) float32 matrix with ones on the diagonal
+    """
+    X = weight_descriptors(descriptors, weights)
+    squared = np.einsum("ij,ij->i", X, X)
+    distance = squared[:, None] + squared[None, :] - 2 * (X @ X.T)
+    np.maximum(distance, 0, out=distance)
+    np.sqrt(distance, out=distance)
+    similarity = 1 / (1 + distance)
+    np.fill_diagonal(similarity, 1)
+    return similarity
+
+def nearest_tracks(similarity, k=5):
+    """
+    Indices of the k most similar other tracks for every track, best first
+
+    Returns:
+        np.ndarray: (N, min(k, N - 1)) indices
+    """
+    n = len(similarity)
+    k = min(k, n - 1)
+    if k <= 0:
+        return np.empty((n, 0), dtype=int)
+    others = similarity.copy()
+    np.fill_diagonal(others, -np.inf)
+    top = np.argpartition(-others, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(others, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+def compare_collection(sources, output_dir="similarity_output", workers=None, weights=None, top=5, **options):
+    """
+    Similarity matrix of every track found in sources
+
+    Descriptors are kept in descriptors.npz in output_dir, so a rerun only
+    describes new or changed tracks. Writes similarity.npz (tracks,
+    descriptors and the N x N matrix) and similarity_report.json (the top
+    most similar tracks of each track).
+
+    Args:
+        sources: Directories, list files and/or audio files (as in batch_analysis.py)
+        output_dir: Directory for the table, matrix and report
+        workers: Worker processes for computing descriptors
+        weights: Optional {group: weight} over DESCRIPTOR_GROUPS
+        top: Neighbours listed per track in the report
+        options: Feature store options passed to describe_track
+
+    Returns:
+        dict: The similarity report
+    """
+    from batch_analysis import find_tracks
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    tracks = find_tracks(sources)
+    print(f"Found {len(tracks)} tracks")
+    tracks, descriptors, failed = describe_tracks(tracks, output_path / DESCRIPTOR_TABLE_NAME, workers, **options)
+
+    similarity = similarity_matrix(descriptors, weights)
+    neighbours = nearest_tracks(similarity, top)
+
+    matrix_path = output_path / "similarity.npz"
+    np.savez(matrix_path, tracks=np.array(tracks, dtype=str), descriptors=descriptors, similarity=similarity)
+
+    report = {
+        "num_tracks": len(tracks),
+        "weights": {group: (weights or {}).get(group, 1.0) for group, _ in DESCRIPTOR_GROUPS},
+        "nearest": {
+            track: [{"track": tracks[j], "similarity": float(similarity[i, j])} for j in neighbours[i]]
+            for i, track in enumerate(tracks)
+        },
+        "failed": failed,
+        "output_files": {"matrix": str(matrix_path)}
+    }
+    report_path = output_path / "similarity_report.json"
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved similarity matrix: {matrix_path}")
+    print(f"Saved similarity report: {report_path}")
+    return report
+
+def parse_weight(text):
+    """'group=weight' -> (group, float)"""
+    group, _, value = text.partition("=")
+    try:
+        return group, float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid weight '{text}', expected e.g. chroma=2")
+
+if __name__ == "__main__":
+    from feature_options import add_feature_arguments
+
+    parser = argparse.ArgumentParser(description="N x N similarity matrix of a collection of tracks")
+    parser.add_argument("sources", nargs="+", help="audio directories, text files listing tracks, or audio files")
+    parser.add_argument("-o", "--output-dir", default="similarity_output")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes for new descriptors (default: available cores)")
+    parser.add_argument("--top", type=int, default=5, help="most similar tracks listed per track (default: 5)")
+    parser.add_argument("--weight", type=parse_weight, action="append", default=[],
+                        help="weight of a descriptor group, e.g. chroma=2 (groups: "
+                             + ", ".join(group for group, _ in DESCRIPTOR_GROUPS) + ")")
+    add_feature_arguments(parser)
+    args = parser.parse_args()
+
+    report = compare_collection(args.sources, args.output_dir, args.workers, dict(args.weight), args.top,
+                                cache_dir=args.cache_dir, stream=args.stream, analysis_sr=args.analysis_sr,
+                                resampler=args.resampler, decoder=args.decoder, pitch_method=args.pitch_method,
+                                quality=args.quality, segment_workers=args.segment_workers)
+    sys.exit(1 if report["failed"] else 0)
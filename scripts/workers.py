@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Workers - Sizing and environment of the analysis worker processes
+Shared by every module that spreads work over a process pool (batch runs,
+collections, long-track segments and pYIN chunks)
+"""
+
+import os
+
+# Each worker already saturates one core; letting every worker's BLAS/FFT
+# library start its own thread pool oversubscribes the machine and stops
+# throughput from scaling with the number of workers. Workers are spawned
+# rather than forked so they pick these up when their libraries load.
+WORKER_ENVIRONMENT = {
+    "OMP_NUM_THREADS": "1",
+    "OPENBLAS_NUM_THREADS": "1",
+    "MKL_NUM_THREADS": "1",
+    "NUMBA_NUM_THREADS": "1",
+    "MPLBACKEND": "Agg",
+}
+
+def default_workers():
+    """Number of cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1